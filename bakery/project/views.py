@@ -323,6 +323,15 @@ def rfiles(p, build_id):
                             fontaineFonts=f, build=b, tree=tree)
 
 
+def slowest_checks(test_result, limit=10):
+    """ Checks that took most of the time, over all fonts """
+    checks = [dict(font=font, **t) for font, x in test_result.items()
+              for status in ['success', 'error', 'failure']
+              for t in x.get(status, [])]
+    checks.sort(key=lambda t: t.get('duration', 0), reverse=True)
+    return checks[:limit]
+
+
 @project.route('/<int:project_id>/build/<int:build_id>/tests', methods=['GET'])
 @login_required
 @project_required
@@ -342,6 +351,7 @@ def rtests(p, build_id):
         'all_fixed': sum([len(x['fixed']) for x in test_result.values()]),
         'all_success': sum([len(x['success']) for x in test_result.values()]),
         'fix_asap': [dict(font=y, **t) for t in x['failure'] for y, x in test_result.items() if 'required' in t['tags']],
+        'slowest': slowest_checks(test_result),
     }
     return render_template('project/rtests.html', project=p,
                            tests=test_result, build=b, summary=summary)
@@ -0,0 +1,212 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Run shell command and copy its output to build log.
+
+Both pipes are read as soon as they have data, with `select.poll` (or
+`select.select` where poll is missing), so a tool writing a lot to one
+pipe never blocks on it while we wait for the other. Output is written
+to log in chunks of whole lines, stderr lines get 'Error: ' prefix.
+
+Command is killed with all its children when it runs longer than
+`timeout` seconds or when `cancel` event is set. It runs in its own
+session started by `setsid` program: `preexec_fn` is not safe in
+threads of bake worker, child may hang on a lock held by other thread
+at the moment of fork.
+
+Example:
+
+    result = run_command("ttx -q Font.ttf", cwd=_out, log=log, timeout=600)
+    print(result.returncode, result.duration, result.stdout_size)
+
+"""
+from __future__ import print_function
+import errno
+import os
+import select
+import signal
+import subprocess
+import threading
+import time
+from distutils.spawn import find_executable
+
+CHUNK_SIZE = 64 * 1024
+# how often timeout and cancel event are checked, seconds
+POLL_INTERVAL = 0.5
+# how often exit of command with closed output is checked, seconds
+WAIT_INTERVAL = 0.05
+
+SETSID = find_executable('setsid')
+# without `setsid` program, children are started one at a time
+_popen_lock = threading.Lock()
+
+
+class CommandResult(object):
+    """ Exit code, duration in seconds and output volume in bytes of one
+    command, `status` is 'exited', 'timeout' or 'cancelled' """
+
+    def __init__(self, command):
+        self.command = command
+        self.returncode = None
+        self.status = 'exited'
+        self.duration = 0.0
+        self.stdout_size = 0
+        self.stderr_size = 0
+
+    def summary(self):
+        if self.status != 'exited':
+            result = self.status
+        else:
+            result = 'exit code %s' % self.returncode
+        return '%s in %.1fs, output %s bytes, errors %s bytes\n' % (
+            result, self.duration, self.stdout_size, self.stderr_size)
+
+
+class LineBuffer(object):
+    """ Collects output and gives it back as whole lines """
+
+    def __init__(self):
+        self.data = ''
+
+    def feed(self, data):
+        self.data += data
+        end = self.data.rfind('\n') + 1
+        lines, self.data = self.data[:end], self.data[end:]
+        return lines
+
+    def rest(self):
+        data, self.data = self.data, ''
+        if data and not data.endswith('\n'):
+            data += '\n'
+        return data
+
+
+class Poller(object):
+    """ Readable file descriptors, `select.poll` with `select.select`
+    fallback """
+
+    def __init__(self, fds):
+        self.fds = set(fds)
+        self.poll = select.poll() if hasattr(select, 'poll') else None
+        if self.poll:
+            for fd in fds:
+                self.poll.register(fd, select.POLLIN | select.POLLPRI)
+
+    def unregister(self, fd):
+        self.fds.discard(fd)
+        if self.poll:
+            self.poll.unregister(fd)
+
+    def ready(self, timeout):
+        try:
+            if self.poll:
+                return [fd for fd, event in self.poll.poll(timeout * 1000)]
+            return select.select(list(self.fds), [], [], timeout)[0]
+        except (select.error, IOError, OSError) as ex:
+            if ex.args[0] == errno.EINTR:
+                return []
+            raise
+
+
+def kill(process):
+    """ Kill shell and commands it started """
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def start_command(command, cwd):
+    """ Start shell command as leader of new process group """
+    kwargs = dict(cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                  close_fds=True)
+    if SETSID:
+        return subprocess.Popen([SETSID, '/bin/sh', '-c', command], **kwargs)
+    with _popen_lock:
+        return subprocess.Popen(command, shell=True, preexec_fn=os.setsid,
+                                **kwargs)
+
+
+def run_command(command, cwd, log, timeout=None, cancel=None):
+    """ Run shell command, copy its output to log and return
+    `CommandResult`.
+
+        :param command: shell command to run, required
+        :param cwd: current working dir, required
+        :param log: logging object with .write() method, required
+        :param timeout: seconds to wait for command, None to wait forever
+        :param cancel: optional `threading.Event`, command is killed when
+                       it is set
+    """
+    result = CommandResult(command)
+    start = time.time()
+    # own process group, so timeout kills children of shell too
+    p = start_command(command, cwd)
+    streams = {
+        p.stdout.fileno(): ('stdout', LineBuffer(), ''),
+        p.stderr.fileno(): ('stderr', LineBuffer(), 'Error: '),
+    }
+
+    def write(name, data, prefix):
+        if not data:
+            return
+        if name == 'stderr':
+            # print the error on the worker console
+            print(data, end='')
+        log.write(data, prefix=prefix)
+
+    def stopped():
+        """ 'cancelled' or 'timeout' when command has to be killed """
+        if cancel is not None and cancel.is_set():
+            return 'cancelled'
+        if timeout and time.time() - start > timeout:
+            return 'timeout'
+
+    poller = Poller(streams)
+    finished = False
+    try:
+        while poller.fds:
+            result.status = stopped() or result.status
+            if result.status != 'exited':
+                break
+            for fd in poller.ready(POLL_INTERVAL):
+                name, buf, prefix = streams[fd]
+                data = os.read(fd, CHUNK_SIZE)
+                if not data:
+                    poller.unregister(fd)
+                    write(name, buf.rest(), prefix)
+                    continue
+                setattr(result, '%s_size' % name,
+                        getattr(result, '%s_size' % name) + len(data))
+                write(name, buf.feed(data), prefix)
+        for fd in poller.fds:
+            name, buf, prefix = streams[fd]
+            write(name, buf.rest(), prefix)
+        # command may close its output and keep running, it is waited
+        # for with the same timeout and cancel event
+        while result.status == 'exited' and p.poll() is None:
+            result.status = stopped() or result.status
+            time.sleep(WAIT_INTERVAL)
+        finished = result.status == 'exited'
+    finally:
+        if not finished:
+            kill(p)
+        p.stdout.close()
+        p.stderr.close()
+        result.returncode = p.wait()
+        result.duration = time.time() - start
+    return result
@@ -0,0 +1,167 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Build as a graph of tasks. Every task starts as soon as all its
+dependencies are done, at most `jobs` tasks run at once in threads of
+the bake worker. Tasks mostly wait for external tools, so threads are
+enough to keep all cores busy.
+
+Each task gets its own log which prefixes every line with task name,
+so output of tasks running at the same time stays readable.
+
+When a task fails, no new tasks are started, commands of running tasks
+are cancelled (see `TaskLog.cancel`) and the first error is raised
+again.
+
+Example:
+
+    graph = TaskGraph()
+    graph.add('ttf:A', partial(ufo2ttf, 'A'))
+    graph.add('hint:A', partial(autohint, 'A'), ['ttf:A'])
+    graph.add('metadata', genmetadata, ['hint:A'])
+    graph.run(log, jobs=4)
+
+"""
+import sys
+import threading
+import traceback
+from Queue import Queue
+
+
+class TaskLog(object):
+    """ Log of one task, writes whole lines to build log with task name
+    after `prefix`, so log page still sees '### ' and 'Error: '.
+    `cancel` event is set when build fails, `tasks.run` kills commands
+    of task then """
+
+    def __init__(self, log, name, cancel=None):
+        self.log = log
+        self.name = name
+        self.cancel = cancel
+        self.buffer = ''
+        self.prefix = ''
+
+    def write(self, data, prefix=''):
+        if not data:
+            return
+        if prefix != self.prefix:
+            self.flush()
+            self.prefix = prefix
+        lines = (self.buffer + data).split('\n')
+        self.buffer = lines.pop()
+        for line in lines:
+            self.log.write('[%s] %s\n' % (self.name, line), prefix=prefix)
+
+    def flush(self):
+        if self.buffer:
+            self.log.write('[%s] %s\n' % (self.name, self.buffer),
+                           prefix=self.prefix)
+            self.buffer = ''
+
+
+class Task(object):
+
+    def __init__(self, name, func, deps):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+
+
+class TaskGraph(object):
+    """ Tasks with dependencies, added in any order of names but every
+    dependency must be added before task that needs it """
+
+    def __init__(self):
+        self.tasks = []
+        self.names = {}
+
+    def add(self, name, func, deps=()):
+        """ Add task `func(log)`, return its name to use in `deps` of
+        other tasks """
+        if name in self.names:
+            raise ValueError('Task %s is already added' % name)
+        for dep in deps:
+            if dep not in self.names:
+                raise ValueError('Task %s depends on unknown task %s' % (name, dep))
+        task = Task(name, func, deps)
+        self.names[name] = task
+        self.tasks.append(task)
+        return name
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def run(self, log, jobs=1):
+        """ Run all tasks, `log` is build log shared by all tasks """
+        waiting = dict((x.name, set(x.deps)) for x in self.tasks)
+        dependents = dict((x.name, []) for x in self.tasks)
+        for task in self.tasks:
+            for dep in task.deps:
+                dependents[dep].append(task.name)
+
+        ready = Queue()
+        done = Queue()
+        cancel = threading.Event()
+        running = 0
+        for task in self.tasks:
+            if not task.deps:
+                ready.put(task)
+                running += 1
+
+        def worker():
+            while True:
+                task = ready.get()
+                if task is None:
+                    break
+                task_log = TaskLog(log, task.name, cancel)
+                try:
+                    task.func(task_log)
+                    error = None
+                except Exception:
+                    error = sys.exc_info()
+                    task_log.write(traceback.format_exc(), prefix='Error: ')
+                task_log.flush()
+                done.put((task, error))
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(max(1, min(jobs, len(self.tasks))))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        error = None
+        while running:
+            task, task_error = done.get()
+            running -= 1
+            if task_error:
+                error = error or task_error
+                cancel.set()
+            if error:
+                # wait for running tasks, but start nothing new
+                continue
+            for name in dependents[task.name]:
+                waiting[name].discard(task.name)
+                if not waiting[name]:
+                    ready.put(self.names[name])
+                    running += 1
+
+        for thread in threads:
+            ready.put(None)
+        for thread in threads:
+            thread.join()
+        if error:
+            raise error[0], error[1], error[2]
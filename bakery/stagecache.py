@@ -0,0 +1,264 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Cache of build stage outputs, so rebuilding a revision or a revision
+with one changed UFO runs ufo2ttf, ttfautohint, ttx and subsetting only
+for fonts that changed.
+
+Stage is keyed by sha256 of its name, parameters, versions of tools it
+runs and contents of its input files (or UFO trees). Output files are
+kept once in content-addressed store:
+
+    <root>/objects/ab/abcdef...   output file, named by sha256 of content
+    <root>/stages/12/1234....json list of output hashes for stage key
+
+On hit, outputs are copied back to the build folder. Hardlinks are not
+used, because later stages and fixers rewrite fonts in place and would
+change the stored copy together with the build file.
+
+Example:
+
+    cache = StageCache(os.path.join(DATA_ROOT, 'cache', 'stages'))
+    cache.run('ttfautohint', partial(autohint_font, _out, name, params), log,
+              inputs=[ttf], outputs=[ttf], params=[params],
+              tools=['ttfautohint --version'])
+    log.write(cache.stats())
+
+"""
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from checker.cache import hash_tree, update_with_file
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def tool_version(command):
+    """ Output of version command, run once per process. Empty if tool
+    is missing, so key still changes when it gets installed """
+    with _versions_lock:
+        if command not in _versions:
+            try:
+                p = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT, close_fds=True)
+                _versions[command] = p.communicate()[0]
+            except OSError:
+                _versions[command] = ''
+        return _versions[command]
+
+
+def hash_file(path):
+    h = hashlib.sha256()
+    update_with_file(h, path)
+    return h.hexdigest()
+
+
+class StageCache(object):
+    """ Size bounded on-disk cache of stage outputs.
+
+        :param root: folder to keep cached outputs
+        :param max_size: maximum size of stored files in megabytes,
+                         least recently used files are removed first
+    """
+
+    def __init__(self, root, max_size=1024):
+        self.root = root
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0.0
+        self.lock = threading.Lock()
+
+    def key(self, stage, inputs, params=(), tools=()):
+        h = hashlib.sha256()
+        h.update(stage.encode('utf-8'))
+        h.update(json.dumps(list(params)).encode('utf-8'))
+        for command in tools:
+            h.update(tool_version(command))
+        for path in inputs:
+            h.update(os.path.basename(path.rstrip('/')).encode('utf-8'))
+            if os.path.isdir(path):
+                hash_tree(h, path)
+            else:
+                update_with_file(h, path)
+        return h.hexdigest()
+
+    def object_filename(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def stage_filename(self, key):
+        return os.path.join(self.root, 'stages', key[:2], '%s.json' % key)
+
+    def tmp_filename(self, filename):
+        # stages of one build run in threads of one process
+        return '%s.%s.%s.tmp' % (filename, os.getpid(), threading.current_thread().ident)
+
+    def write_file(self, filename, copy_from=None, data=None):
+        """ Write file atomically, readers never see half written file """
+        folder = os.path.dirname(filename)
+        try:
+            os.makedirs(folder)
+        except OSError:
+            # other stage may have made it in the meantime
+            if not os.path.isdir(folder):
+                raise
+        tmp = self.tmp_filename(filename)
+        if copy_from:
+            shutil.copyfile(copy_from, tmp)
+        else:
+            with open(tmp, 'w') as f:
+                f.write(data)
+        os.rename(tmp, filename)
+
+    def load(self, key):
+        """ Return stage entry if it and all its output files exist """
+        filename = self.stage_filename(key)
+        try:
+            with open(filename) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        for digest in entry['outputs']:
+            if digest and not os.path.exists(self.object_filename(digest)):
+                return None
+        return entry
+
+    def restore(self, entry, outputs):
+        for digest, path in zip(entry['outputs'], outputs):
+            if not digest:
+                continue
+            obj = self.object_filename(digest)
+            tmp = self.tmp_filename(path)
+            shutil.copyfile(obj, tmp)
+            os.rename(tmp, path)
+            # mark as recently used
+            try:
+                os.utime(obj, None)
+            except OSError:
+                pass
+
+    def store(self, key, stage, outputs, seconds):
+        digests = []
+        for path in outputs:
+            if not os.path.isfile(path):
+                # stage may not make all files, e.g. no .otf from ufo2ttf
+                digests.append(None)
+                continue
+            digest = hash_file(path)
+            obj = self.object_filename(digest)
+            if not os.path.exists(obj):
+                self.write_file(obj, copy_from=path)
+            digests.append(digest)
+        entry = {'stage': stage, 'outputs': digests, 'seconds': seconds}
+        self.write_file(self.stage_filename(key), data=json.dumps(entry))
+
+    def run(self, stage, func, log, inputs, outputs, params=(), tools=()):
+        """ Restore outputs of stage from cache, or call `func(log)` and
+        store its outputs. `outputs` are paths stage writes, in the same
+        order every time """
+        try:
+            key = self.key(stage, inputs, params, tools)
+            entry = self.load(key)
+        except (IOError, OSError):
+            key = entry = None
+        if entry is not None:
+            try:
+                self.restore(entry, outputs)
+            except (IOError, OSError):
+                entry = None
+        if entry is not None:
+            with self.lock:
+                self.hits += 1
+                self.saved += entry['seconds']
+            log.write('Stage cache hit: %s, saved %.1fs\n' % (stage, entry['seconds']))
+            return
+
+        start = time.time()
+        func(log)
+        seconds = time.time() - start
+        with self.lock:
+            self.misses += 1
+        log.write('Stage cache miss: %s, took %.1fs\n' % (stage, seconds))
+        if key is None:
+            return
+        try:
+            self.store(key, stage, outputs, seconds)
+        except (IOError, OSError) as ex:
+            # cache is optional, stage just runs again next time
+            log.write('Stage cache not saved: %s\n' % ex, prefix='Error: ')
+
+    def files(self, folder):
+        """ (mtime, size, path) of every file in cache folder """
+        entries = []
+        for root, dirs, files in os.walk(os.path.join(self.root, folder)):
+            for name in files:
+                fullpath = os.path.join(root, name)
+                try:
+                    st = os.stat(fullpath)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, fullpath))
+        return entries
+
+    def evict(self):
+        """ Remove least recently used output files until cache fits
+        max_size, then stage entries which lost any of their outputs """
+        objects = self.files('objects')
+        stages = self.files('stages')
+        total = sum(x[1] for x in objects + stages)
+
+        limit = self.max_size * 1024 * 1024
+        objects.sort()
+        removed = False
+        for mtime, size, fullpath in objects:
+            if total <= limit:
+                break
+            try:
+                os.remove(fullpath)
+                removed = True
+            except OSError:
+                pass
+            total -= size
+        if not removed:
+            return
+
+        for mtime, size, fullpath in stages:
+            if fullpath.endswith('.tmp'):
+                # written by running stage right now
+                continue
+            try:
+                with open(fullpath) as f:
+                    entry = json.load(f)
+                if all(os.path.exists(self.object_filename(x))
+                       for x in entry['outputs'] if x):
+                    continue
+            except (IOError, OSError, ValueError, KeyError, TypeError):
+                pass
+            try:
+                os.remove(fullpath)
+            except OSError:
+                pass
+
+    def stats(self):
+        return 'Stage cache: %s hits, %s misses, saved %.1fs\n' % (
+            self.hits, self.misses, self.saved)
@@ -21,11 +21,18 @@ import sys
 import glob
 import subprocess
 import codecs
+import multiprocessing
+import shutil
+import tarfile
+import tempfile
+from functools import partial
 from flask.ext.rq import job
 import plistlib
-from .utils import RedisFd
+from .utils import RedisFd, project_fontaine
+from .runner import run_command
 import re
 import yaml
+import fontTools
 from fontTools import ttLib
 
 
@@ -34,42 +41,50 @@ sys.path.append(ROOT)
 DATA_ROOT = os.path.join(ROOT, 'data')
 
 
-def run(command, cwd, log):
+def command_timeout():
+    """ Seconds one build command may run, BAKERY_COMMAND_TIMEOUT, no
+    limit by default """
+    try:
+        return int(os.environ.get('BAKERY_COMMAND_TIMEOUT', 0)) or None
+    except ValueError:
+        return None
+
+
+def run(command, cwd, log, timeout=None, cancel=None):
     """ Wrapper for subprocess.Popen with custom logging support.
 
         :param command: shell command to run, required
         :param cwd: - current working dir, required
         :param log: - logging object with .write() method, required
+        :param timeout: - seconds to wait, BAKERY_COMMAND_TIMEOUT by default
+        :param cancel: - `threading.Event` to kill command, by default
+                         the one of build task log
 
+    Return `CommandResult` with exit code, duration and output size.
     """
     # print the command on the worker console
     print("[%s]:%s" % (cwd, command))
     # log the command
     log.write('\n$ %s\n' % command)
-    # Start the command
-    p = subprocess.Popen(command, shell=True, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
-    while True:
-        # Read output and errors
-        stdout = p.stdout.readline()
-        stderr = p.stderr.readline()
-        # Log output
-        log.write(stdout)
-        # Log error
-        if stderr:
-            # print the error on the worker console
-            print(stderr, end='')
-            # log error
-            log.write(stderr, prefix='Error: ')
-        # If no output and process no longer running, stop
-        if not stdout and not stderr and p.poll() is not None:
-            break
+    if cancel is None:
+        cancel = getattr(log, 'cancel', None)
+    result = run_command(command, cwd, log, timeout=timeout or command_timeout(),
+                         cancel=cancel)
+    log.write(result.summary())
+    if result.status != 'exited':
+        msg = 'Fatal: Command %s after %.1fs \n' % (
+            'timed out' if result.status == 'timeout' else 'cancelled',
+            result.duration)
+        log.write(msg)
+        raise StandardError(msg)
     # if the command did not exit cleanly (with returncode 0)
-    if p.returncode:
-        msg = 'Fatal: Exited with return code %s \n' % p.returncode
+    if result.returncode:
+        msg = 'Fatal: Exited with return code %s \n' % result.returncode
         # Log the exit status
         log.write(msg)
         # Raise an error on the worker
         raise StandardError(msg)
+    return result
 
 
 def prun(command, cwd, log=None):
@@ -152,7 +167,7 @@ def project_git_sync(project):
     db.session.commit()
 
 
-def copy_ufo_files(project, build, log):
+def copy_ufo_files(project, build, log, convert=True):
     config = project.config
 
     param = {'login': project.login, 'id': project.id,
@@ -214,15 +229,23 @@ def copy_ufo_files(project, build, log):
             # Write _out fontinfo.plist
             plistlib.writePlist(_out_ufoFontInfo, _out_ufoPlist)
 
-    scripts_folder = os.path.join(ROOT, 'scripts')
-    log.write('Convert UFOs to TTFs (ufo2ttf.py)\n', prefix='### ')
+    if convert:
+        for name in ufo_names(_out_src):
+            ufo2ttf_font(_out, _out_src, name, log)
 
-    os.chdir(_out_src)
-    for name in glob.glob("*.ufo"):
-        name = name[:-4]  # cut .ufo
-        cmd = "python ufo2ttf.py '{out_src}{name}.ufo' '{out}{name}.ttf' '{out_src}{name}.otf'".format(
-            out_src=_out_src, name=name, out=_out)
-        run(cmd, cwd=scripts_folder, log=log)
+
+def ufo_names(_out_src):
+    """ Names of fonts in build sources folder, without .ufo """
+    return sorted(os.path.basename(x)[:-4]  # cut .ufo
+                  for x in glob.glob(os.path.join(_out_src, '*.ufo')))
+
+
+def ufo2ttf_font(_out, _out_src, name, log):
+    scripts_folder = os.path.join(ROOT, 'scripts')
+    log.write('Convert UFO to TTF (ufo2ttf.py)\n', prefix='### ')
+    cmd = "python ufo2ttf.py '{out_src}{name}.ufo' '{out}{name}.ttf' '{out_src}{name}.otf'".format(
+        out_src=_out_src, name=name, out=_out)
+    run(cmd, cwd=scripts_folder, log=log)
 
 
 def copy_ttx_files(project, build, log):
@@ -292,9 +315,10 @@ def copy_ttx_files(project, build, log):
             run("mv '{0}.ttf' '../{0}.ttf'".format(_out_ttx_name), _out_src, log=log)
 
 
-def copy_and_rename_process(project, build, log):
+def copy_and_rename_process(project, build, log, convert=True):
     """
-    Setup UFOs for building
+    Setup UFOs for building, `convert` is False when UFOs are converted
+    to TTFs later by build tasks
     """
     config = project.config
 
@@ -306,7 +330,7 @@ def copy_and_rename_process(project, build, log):
     _out = os.path.join(DATA_ROOT, '%(login)s/%(id)s.out/%(build)s.%(revision)s/' % param)
 
     if project.source_files_type == 'ufo':
-        copy_ufo_files(project, build, log)
+        copy_ufo_files(project, build, log, convert=convert)
     else:
         copy_ttx_files(project, build, log)
 
@@ -383,12 +407,15 @@ def ttfautohint_process(project, build, log):
     if config['state'].get('ttfautohint', None):
         log.write('Autohint TTFs (ttfautohint)\n', prefix='### ')
         params = config['state']['ttfautohint']
-        os.chdir(_out)
-        for name in glob.glob("*.ttf"):
-            name = name[:-4]  # cut .ttf
-            run("mv '{name}.ttf' '{name}.autohint.ttf'".format(name=name), cwd=_out, log=log)
-            run("ttfautohint {params} '{name}.autohint.ttf' '{name}.ttf'".format(params=params, name=name), cwd=_out, log=log)
-            run("rm '{name}.autohint.ttf'".format(name=name), cwd=_out, log=log)
+        for name in glob.glob(os.path.join(_out, '*.ttf')):
+            name = os.path.basename(name)[:-4]  # cut .ttf
+            autohint_font(_out, name, params, log)
+
+
+def autohint_font(_out, name, params, log):
+    run("mv '{name}.ttf' '{name}.autohint.ttf'".format(name=name), cwd=_out, log=log)
+    run("ttfautohint {params} '{name}.autohint.ttf' '{name}.ttf'".format(params=params, name=name), cwd=_out, log=log)
+    run("rm '{name}.autohint.ttf'".format(name=name), cwd=_out, log=log)
 
 
 def ttx_process(project, build, log):
@@ -404,28 +431,33 @@ def ttx_process(project, build, log):
 
     log.write('Compact TTFs with ttx\n', prefix='### ')
 
-    os.chdir(_out_src)
-    for name in glob.glob("*.ufo"):
-        name = name[:-4]  # cut .ufo
-        filename = os.path.join(_out, name)
-        # convert the ttf to a ttx file - this may fail
-        cmd = "ttx -i -q '%s.ttf'" % filename
-        run(cmd, cwd=_out, log=log)
-        # move the original ttf to the side
-        cmd = "mv '%s.ttf' '%s.ttf.orig'" % (filename, filename)
-        run(cmd, cwd=_out, log=log)
-        # convert the ttx back to a ttf file - this may fail
-        cmd = "ttx -i -q '%s.ttx'" % filename
-        run(cmd, cwd=_out, log=log)
-        # compare filesizes TODO print analysis of this :)
-        cmd = "ls -l '%s.ttf'*" % filename
-        run(cmd, cwd=_out, log=log)
-        # remove the original (duplicate) ttf
-        cmd = "rm  '%s.ttf.orig'" % filename
-        run(cmd, cwd=_out, log=log)
-        # move ttx files to src
-        cmd = "mv '%s.ttx' %s" % (filename, _out_src)
-        run(cmd, cwd=_out, log=log)
+    for name in ufo_names(_out_src):
+        ttx_font(_out, _out_src, name, log)
+
+
+def ttx_font(_out, _out_src, name, log):
+    filename = os.path.join(_out, name)
+    # convert the ttf to a ttx file - this may fail
+    cmd = "ttx -i -q '%s.ttf'" % filename
+    run(cmd, cwd=_out, log=log)
+    # move the original ttf to the side
+    cmd = "mv '%s.ttf' '%s.ttf.orig'" % (filename, filename)
+    run(cmd, cwd=_out, log=log)
+    # convert the ttx back to a ttf file - this may fail
+    cmd = "ttx -i -q '%s.ttx'" % filename
+    run(cmd, cwd=_out, log=log)
+    # compare filesizes TODO print analysis of this :)
+    cmd = "ls -l '%s.ttf'*" % filename
+    run(cmd, cwd=_out, log=log)
+    # remove the original (duplicate) ttf
+    cmd = "rm  '%s.ttf.orig'" % filename
+    run(cmd, cwd=_out, log=log)
+    # move ttx files to src
+    cmd = "mv '%s.ttx' %s" % (filename, _out_src)
+    run(cmd, cwd=_out, log=log)
+
+
+from checker.subsetter import subset_filename, subset_font
 
 
 def subset_process(project, build, log):
@@ -437,43 +469,13 @@ def subset_process(project, build, log):
     _out = os.path.join(DATA_ROOT, '%(login)s/%(id)s.out/%(build)s.%(revision)s/' % param)
     _out_src = os.path.join(DATA_ROOT, '%(login)s/%(id)s.out/%(build)s.%(revision)s/sources/' % param)
 
-    log.write('Subset TTFs (subset.py)\n', prefix='### ')
-
-    for subset in config['state']['subset']:
-        os.chdir(_out_src)
-        for name in glob.glob("*.ufo"):
-            name = name[:-4]  # cut .ufo
-            # python ~/googlefontdirectory/tools/subset/subset.py \
-            #   --null --nmr --roundtrip --script --subset=$subset \
-            #   $font.ttf $font.$subset >> $font.$subset.log \
-            # 2>> $font.$subset.log; \
-            cmd = str("%(wd)s/venv/bin/python %(wd)s/scripts/subset.py" + \
-                 " --subset=%(subset)s" + \
-                 " --null --nmr --roundtrip --script" + \
-                 " '%(out)s.ttf'" + \
-                 " '%(out)s.%(subset)s'") % {
-                    'subset':subset,
-                    'out': os.path.join(_out, name),
-                    'name': name,
-                    'wd': ROOT
-                    }
-            run(cmd, cwd=_out, log=log)
-            cmd = str("%(wd)s/venv/bin/python %(wd)s/scripts/subset.py" + \
-                 " --subset=%(subset)s" + \
-                 " --null --nmr --roundtrip --script --opentype-features" + \
-                 " '%(out)s.ttf'" + \
-                 " '%(out)s.%(subset)s-opentype'") % {
-                    'subset':subset,
-                    'out': os.path.join(_out, name),
-                    'name': name,
-                    'wd': ROOT
-                    }
-            run(cmd, cwd=_out, log=log)
-    os.chdir(_out)
-    files = glob.glob('*+latin*')
-    for filename in files:
-        newfilename = filename.replace('+latin', '')
-        run("mv '%s' '%s'" % (filename, newfilename), cwd=_out, log=log)
+    log.write('Subset TTFs (checker.subsetter)\n', prefix='### ')
+
+    # every font is parsed once for all subsets, files are named without
+    # '+latin' part: 'latin-ext+latin' subset is written to Font.latin-ext
+    for name in ufo_names(_out_src):
+        subset_font(os.path.join(_out, '%s.ttf' % name),
+                    config['state']['subset'], log=log)
 
 
 def generate_metadata_process(project, build, log):
@@ -493,50 +495,152 @@ def generate_metadata_process(project, build, log):
 
 def fontaine_process(project, build, log):
     """
-    Run pyFontaine on ttf files
+    Compute charset coverage of ttf files and store it as build artifact
     """
-    param = {'login': project.login, 'id': project.id,
-                'revision': build.revision, 'build': build.id}
+    log.write('Charset coverage (checker/coverage.py)\n', prefix='### ')
+    fonts = project_fontaine(project, build)
+    log.write('%s fonts checked\n' % len(fonts or []))
 
-    _out = os.path.join(DATA_ROOT, '%(login)s/%(id)s.out/%(build)s.%(revision)s/' % param)
 
-    log.write('pyFontaine (fontaine/main.py)\n', prefix='### ')
-    os.chdir(_out)
-    files = glob.glob('*.ttf')
-    for file in files:
-        cmd = "python %s/venv/bin/pyfontaine --text '%s' >> 'sources/fontaine.txt'" % (
-            ROOT, file)
-        run(cmd, cwd=_out, log=log)
-    # TODO also save the totals for the dashboard....
-    #   log.write('Running Fontaine on Results\n', prefix='### ')
-    #   fonts = utils.project_fontaine(project)
-    #   project.config['state']['fontaine'] = fonts
-    #   project.save_state()
-
-
-from checker import run_set
+from checker.parallel import run_sets
+from checker.cache import ResultCache
 # register yaml serializer for tests result objects.
-from checker.base import BakeryTestCase
+from checker.base import TestRecord, serialize_testcase
 
 
 def repr_testcase(dumper, data):
-    def method_doc(doc):
-        if type(doc) == type(None):
-            return 'None'
+    return dumper.represent_mapping(u'tag:yaml.org,2002:map',
+                                    serialize_testcase(data))
+
+yaml.SafeDumper.add_representer(TestRecord, repr_testcase)
+
+
+def checker_cache():
+    """ Results cache shared by all projects, CHECKER_CACHE_SIZE megabytes """
+    try:
+        max_size = int(os.environ.get('CHECKER_CACHE_SIZE', 256))
+    except ValueError:
+        max_size = 256
+    return ResultCache(os.path.join(DATA_ROOT, 'cache', 'checker'), max_size)
+
+
+def git_lines(command, cwd):
+    """ Run git command and return its output lines, or None if command
+    failed. Unlike `prun` it doesn't mix errors into output """
+    p = subprocess.Popen(command, shell=True, cwd=cwd, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE, close_fds=True)
+    stdout, stderr = p.communicate()
+    if p.returncode:
+        return None
+    return [x for x in stdout.splitlines() if x.strip()]
+
+
+def tested_ancestor(_in, _out_folder, revision, depth=100):
+    """ Return name of the nearest ancestor revision of `revision` that
+    already has upstream tests results in `_out_folder` """
+    tested = [x[:-5] for x in os.listdir(_out_folder) if x.endswith('.yaml')]
+    if not tested:
+        return
+    ancestors = git_lines("git rev-list --max-count=%s %s" % (depth, revision), _in)
+    # skip revision itself
+    for commit in (ancestors or [])[1:]:
+        for name in tested:
+            if commit.startswith(name):
+                return name
+
+
+def upstream_check(_in, path):
+    """ Return (key, path, target) test set for file path relative to
+    repository root, or None if there is nothing to test """
+    parts = path.split('/')
+    for i, part in enumerate(parts):
+        if part.lower().endswith('.ufo'):
+            ufo = '/'.join(parts[:i + 1])
+            return ufo, os.path.join(_in, ufo), 'upstream'
+    if os.path.splitext(path)[1].lower() == '.ttx':
+        return path, os.path.join(_in, path), 'upstream-ttx'
+    if os.path.basename(path).lower() == 'metadata.json':
+        return path, os.path.join(_in, path), 'metadata'
+
+
+def export_revision(_in, revision, folder):
+    """ Write files of git `revision` to `folder`. Working tree of `_in`
+    is not touched, so bake and tests of other revisions can use it at
+    the same time """
+    p = subprocess.Popen(['git', 'archive', '--format=tar', revision], cwd=_in,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                         close_fds=True)
+    error = None
+    try:
+        tar = tarfile.open(fileobj=p.stdout, mode='r|')
+        tar.extractall(folder)
+        tar.close()
+    except tarfile.TarError as ex:
+        error = ex
+    stderr = p.communicate()[1]
+    if p.returncode or error:
+        raise StandardError('Revision %s is not exported: %s'
+                            % (revision, stderr.strip() or error))
+
+
+def upstream_changed_checks(_in, tree, ancestor, revision):
+    """ Test sets for files changed since `ancestor` revision, `tree` is
+    folder with files of `revision`. Return (checks, removed) where
+    removed are keys of test sets whose files are gone, or None if git
+    can't tell what changed """
+    # without renames detection a moved file shows up as removed path
+    # and added path, so results of the old path are dropped
+    changed = git_lines("git diff --no-renames --name-only %s %s" % (ancestor, revision), _in)
+    if changed is None:
+        return
+    checks = {}
+    removed = set()
+    for path in changed:
+        check = upstream_check(tree, path)
+        if not check:
+            continue
+        if os.path.exists(os.path.join(tree, check[0])):
+            checks[check[0]] = check
         else:
-            return " ".join(doc.encode('utf-8', 'xmlcharrefreplace').split())
+            removed.add(check[0])
+    return checks.values(), removed
 
-    return dumper.represent_mapping(u'tag:yaml.org,2002:map', {
-        'methodDoc': method_doc(data._testMethodDoc),
-        'tool': data.tool,
-        'name': data.name,
-        'methodName': data._testMethodName,
-        'targets': data.targets,
-        'tags': getattr(data, data._testMethodName).tags,
-        'err_msg': getattr(data, '_err_msg', '')
-        })
 
-yaml.SafeDumper.add_multi_representer(BakeryTestCase, repr_testcase)
+def revision_tests(_in, tree, _out_folder, revision):
+    """ Run upstream tests sets on files of `revision` in `tree` folder,
+    reusing results of the nearest tested ancestor """
+    result = {}
+    changes = None
+    ancestor = tested_ancestor(_in, _out_folder, revision)
+    if ancestor:
+        changes = upstream_changed_checks(_in, tree, ancestor, revision)
+
+    if changes is not None:
+        checks, removed = changes
+        checks = list(checks)
+        result = yaml.safe_load(open(os.path.join(_out_folder, '%s.yaml' % ancestor), 'r')) or {}
+        for key in removed:
+            result.pop(key, None)
+    else:
+        checks = []
+        for root, dirs, files in os.walk(tree):
+            for f in files:
+                fullpath = os.path.join(root, f)
+                key = os.path.relpath(fullpath, tree)
+                if os.path.splitext(fullpath)[1].lower() in ['.ttx', ]:
+                    checks.append((key, fullpath, 'upstream-ttx'))
+                if f.lower() == 'metadata.json':
+                    checks.append((key, fullpath, 'metadata'))
+            for d in dirs:
+                fullpath = os.path.join(root, d)
+                if os.path.splitext(fullpath)[1].lower() == '.ufo':
+                    checks.append((os.path.relpath(fullpath, tree), fullpath, 'upstream'))
+
+    # bulk tests look at whole tree, any file may change their result
+    checks.append(('Properties tests', tree, 'upstream-bulk'))
+
+    result.update(run_sets(checks, cache=checker_cache()))
+    return result
 
 
 def upstream_revision_tests(project, revision):
@@ -546,6 +650,13 @@ def upstream_revision_tests(project, revision):
     particular case. Because data and
     set of folders are changing during font development process.
 
+    If one of ancestor revisions is already tested, only UFOs, TTX and
+    METADATA.json files changed since that revision are tested again,
+    the rest of results are carried forward.
+
+    Files of revision are tested in a temporary copy made by
+    `export_revision`, the project repository stays on revision of bake.
+
     :param project: Project instance
     :param revision: Git revision
     :param force: force to make tests again
@@ -563,38 +674,12 @@ def upstream_revision_tests(project, revision):
     if not os.path.exists(_out_folder):
         os.makedirs(_out_folder)
 
-    result = {}
-    os.chdir(_in)
-    prun("git checkout %s" % revision, cwd=_in)
-
-    ufo_dirs = []
-    ttx_files = []
-    metadata_files = []
-    l = len(_in)
-    for root, dirs, files in os.walk(_in):
-        for f in files:
-            fullpath = os.path.join(root, f)
-            if os.path.splitext(fullpath)[1].lower() in ['.ttx', ]:
-                ttx_files.append(fullpath[l:])
-            if f.lower() == 'metadata.json':
-                metadata_files.append(fullpath[l:])
-        for d in dirs:
-            fullpath = os.path.join(root, d)
-            if os.path.splitext(fullpath)[1].lower() == '.ufo':
-                ufo_dirs.append(fullpath[l:])
-
-    for font in ufo_dirs:
-        if os.path.exists(os.path.join(_in, font)):
-            result[font] = run_set(os.path.join(_in, font), 'upstream')
-
-    for metadata_path in metadata_files:
-        result[metadata_path] = run_set(metadata_path, 'metadata')
-
-    for font in ttx_files:
-        if os.path.exists(os.path.join(_in, font)):
-            result[font] = run_set(os.path.join(_in, font), 'upstream-ttx')
-
-    result['Properties tests'] = run_set(_in, 'upstream-bulk')
+    tree = tempfile.mkdtemp(prefix='tree.', dir=_out_folder)
+    try:
+        export_revision(_in, revision, tree)
+        result = revision_tests(_in, tree, _out_folder, revision)
+    finally:
+        shutil.rmtree(tree, ignore_errors=True)
 
     l = codecs.open(_out_yaml, mode='w', encoding="utf-8")
     l.write(yaml.safe_dump(result))
@@ -603,7 +688,7 @@ def upstream_revision_tests(project, revision):
     return yaml.safe_load(open(_out_yaml, 'r'))
 
 
-def result_tests(project, build):
+def result_tests(project, build, log=None):
     param = {'login': project.login, 'id': project.id,
                 'revision': build.revision, 'build': build.id}
 
@@ -613,10 +698,12 @@ def result_tests(project, build):
     if os.path.exists(_out_yaml):
         return yaml.safe_load(open(_out_yaml, 'r'))
 
-    result = {}
-    os.chdir(_out_src)
-    for font in glob.glob("*.ttf"):
-        result[font] = run_set(os.path.join(_out_src, font), 'result')
+    cache = checker_cache()
+    fonts = [os.path.basename(x) for x in glob.glob(os.path.join(_out_src, '*.ttf'))]
+    result = run_sets([(font, os.path.join(_out_src, font), 'result')
+                       for font in fonts], cache=cache)
+    if log:
+        log.write(cache.stats())
 
     # Comment during debug
     l = open(_out_yaml, 'w')
@@ -657,6 +744,107 @@ def discover_dashboard(project, build, log):
     run(cmd, cwd=_out_src, log=log)
 
 
+from .scheduler import TaskGraph
+from .stagecache import StageCache
+
+
+def stage_cache():
+    """ Build stages cache shared by all projects, BAKERY_STAGE_CACHE_SIZE
+    megabytes """
+    try:
+        max_size = int(os.environ.get('BAKERY_STAGE_CACHE_SIZE', 1024))
+    except ValueError:
+        max_size = 1024
+    return StageCache(os.path.join(DATA_ROOT, 'cache', 'stages'), max_size)
+
+
+def bake_jobs():
+    """ Number of build tasks running at once, BAKERY_JOBS or number of CPUs """
+    try:
+        return int(os.environ.get('BAKERY_JOBS', 0)) or multiprocessing.cpu_count()
+    except ValueError:
+        return multiprocessing.cpu_count()
+
+
+def cached_stage(cache, stage, func, inputs, outputs, params=(), tools=()):
+    """ Task running `func(log)` through stage cache, if there is one """
+    if cache is None:
+        return func
+    return partial(cache.run, stage, func, inputs=inputs, outputs=outputs,
+                   params=params, tools=tools)
+
+
+def bake_graph(project, build, cache=None):
+    """ Build tasks after UFOs or TTXs are copied by
+    `copy_and_rename_process(..., convert=False)`. Each font goes
+    through ufo2ttf, ttfautohint, ttx and subsetting on its own, family
+    tasks wait for all fonts. Font stages are restored from `cache`
+    `StageCache` when their inputs did not change """
+    config = project.config
+
+    param = {'login': project.login, 'id': project.id,
+             'revision': build.revision, 'build': build.id}
+
+    _out = os.path.join(DATA_ROOT, '%(login)s/%(id)s.out/%(build)s.%(revision)s/' % param)
+    _out_src = os.path.join(DATA_ROOT, '%(login)s/%(id)s.out/%(build)s.%(revision)s/sources/' % param)
+
+    ufos = ufo_names(_out_src)
+    # fonts converted from TTX sources are already in _out
+    fonts = sorted(set(ufos) | set(os.path.basename(x)[:-4]  # cut .ttf
+                                   for x in glob.glob(os.path.join(_out, '*.ttf'))))
+    params = config['state'].get('ttfautohint', None)
+
+    subsets = config['state'].get('subset', [])
+    # scripts and modules doing the work are part of stage inputs
+    ufo2ttf_script = os.path.join(ROOT, 'scripts', 'ufo2ttf.py')
+    subsetter_modules = [os.path.join(ROOT, 'checker', 'subsetter.py'),
+                         os.path.join(ROOT, 'checker', 'tools.py')]
+
+    graph = TaskGraph()
+    font_tasks = []
+    for name in fonts:
+        ufo = os.path.join(_out_src, '%s.ufo' % name)
+        ttf = os.path.join(_out, '%s.ttf' % name)
+        deps = []
+        if name in ufos:
+            task = cached_stage(cache, 'ufo2ttf', partial(ufo2ttf_font, _out, _out_src, name),
+                                inputs=[ufo, ufo2ttf_script],
+                                outputs=[ttf, os.path.join(_out_src, '%s.otf' % name)],
+                                tools=['fontforge -version'])
+            deps = [graph.add('ufo2ttf:%s' % name, task)]
+        if params:
+            task = cached_stage(cache, 'ttfautohint', partial(autohint_font, _out, name, params),
+                                inputs=[ttf], outputs=[ttf], params=[params],
+                                tools=['ttfautohint --version'])
+            deps = [graph.add('ttfautohint:%s' % name, task, deps)]
+        if name in ufos:
+            task = cached_stage(cache, 'ttx', partial(ttx_font, _out, _out_src, name),
+                                inputs=[ttf],
+                                outputs=[ttf, os.path.join(_out_src, '%s.ttx' % name)],
+                                # `ttx` on PATH may come from other fontTools
+                                # than the one bakery imports
+                                tools=['ttx --version'])
+            deps = [graph.add('ttx:%s' % name, task, deps)]
+            task = cached_stage(cache, 'subset', partial(subset_font, ttf, subsets),
+                                inputs=[ttf] + subsetter_modules,
+                                outputs=[subset_filename(ttf, subset, variant)
+                                         for subset in subsets
+                                         for variant in (False, True)],
+                                params=[subsets, fontTools.version])
+            deps = [graph.add('subset:%s' % name, task, deps)]
+        font_tasks.extend(deps)
+
+    metadata = graph.add('metadata', partial(generate_metadata_process, project, build),
+                         font_tasks)
+    fontaine = graph.add('fontaine', partial(fontaine_process, project, build),
+                         font_tasks)
+    tests = graph.add('result_tests', partial(result_tests, project, build), [metadata])
+    # fixes change fonts, so coverage must be computed before
+    graph.add('result_fixes', lambda log: result_fixes(project, build),
+              [tests, fontaine])
+    return graph
+
+
 @job
 def process_project(project, build, revision, force_sync=False):
     """
@@ -694,17 +882,15 @@ def process_project(project, build, revision, force_sync=False):
         try:
             run("git checkout %s" % revision, cwd=_in, log=log)
             log.write('Bake Begins!\n', prefix='### ')
-            copy_and_rename_process(project, build, log)
-            ttfautohint_process(project, build, log)
-            ttx_process(project, build, log)
-            subset_process(project, build, log)
-            generate_metadata_process(project, build, log)
-            fontaine_process(project, build, log)
+            copy_and_rename_process(project, build, log, convert=False)
+            # per font ufo2ttf, ttfautohint, ttx and subset, then
+            # metadata, charset coverage, result_tests and fixes.
             # result_tests doesn't needed here, but since it is anyway
             # background task make cache file for future use
-            result_tests(project, build)
-            # apply fixes
-            result_fixes(project, build)
+            cache = stage_cache()
+            bake_graph(project, build, cache).run(log, jobs=bake_jobs())
+            log.write(cache.stats())
+            cache.evict()
             # discover_dashboard(project, build, log)
             log.write('Bake Succeeded!\n', prefix='### ')
         finally:
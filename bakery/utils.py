@@ -20,6 +20,7 @@ from datetime import datetime
 import os
 import glob
 import io
+import threading
 from flask import current_app
 import itsdangerous
 from collections import OrderedDict
@@ -88,10 +89,16 @@ class RedisFd(object):
     def __init__(self, name, mode='a'):
         self.fd = open(name, mode)
         self.fd.write("Start: Start of log\n")  # end of log
+        # build tasks write from several threads
+        self.lock = threading.Lock()
 
     def write(self, data, prefix=''):
-        self.fd.write("%s%s" % (prefix, data))
-        self.fd.flush()
+        # prefix goes to every line, log page checks each line for it
+        if prefix:
+            data = ''.join(prefix + line for line in data.splitlines(True))
+        with self.lock:
+            self.fd.write(data)
+            self.fd.flush()
 
     def close(self):
         self.fd.write("End: End of log\n")  # end of log
@@ -99,56 +106,48 @@ class RedisFd(object):
 
 
 def project_fontaine(project, build):
-    from fontaine.font import Font
+    """ Charset coverage of build fonts. It is computed once by the
+    build and stored next to the build folder as
+    `$(build).$(revision).coverage.yaml` with per font details and
+    family averages. Return list of per font info dictionaries """
+    import yaml
+    from checker.coverage import family_coverage
 
     param = {'login': project.login, 'id': project.id,
         'revision': build.revision, 'build': build.id}
 
     _out = os.path.join(DATA_ROOT, '%(login)s/%(id)s.out/%(build)s.%(revision)s/' % param)
+    _out_yaml = os.path.join(DATA_ROOT, '%(login)s/%(id)s.out/%(build)s.%(revision)s.coverage.yaml' % param)
+
+    if os.path.exists(_out_yaml):
+        return yaml.safe_load(open(_out_yaml, 'r'))['fonts']
 
     # Its very likely that _out exists, but just in case:
-    if os.path.exists(_out):
-        os.chdir(_out)
-    else:
+    if not os.path.exists(_out):
         # This is very unlikely, but should it happen, just return
         return
 
-    # Run pyFontaine on all the TTF fonts
-    fonts = {}
-    for filename in glob.glob("*.ttf"):
-        fontaine = Font(filename)
-        fonts[filename] = fontaine
-
-    # Make a plain dictionary, unlike the fancy data structures used by pyFontaine :)
-    family = {}
-    for fontfilename, fontaine in fonts.iteritems():
-        # Use the font file name as a key to a dictionary of char sets
-        family[fontfilename] = {}
-        for charset, coverage, percentcomplete, missingchars in fontaine.get_orthographies():
-            # Use each char set name as a key to a dictionary of this font's coverage details
-            charsetname = charset.common_name
-            family[fontfilename][charsetname] = {}
-            family[fontfilename][charsetname]['coverage'] = coverage  # unsupport, fragmentary, partial, full
-            family[fontfilename][charsetname]['percentcomplete'] = percentcomplete  # int
-            family[fontfilename][charsetname]['missingchars'] = missingchars  # list of ord numbers
-            # Use the char set name as a key to a list of the family's average coverage
-            if not charsetname in family:
-                family[charsetname] = []
-            # Append the char set percentage of each font file to the list
-            family[charsetname].append(percentcomplete)  # [10, 32, 40, 40] etc
-            # And finally, if the list now has all the font files, make it the mean average percentage
-            if len(family[charsetname]) == len(fonts.items()):
-                family[charsetname] = sum(family[charsetname]) / len(fonts.items())
-    # Make a plain dictionary with just the bits we want on the dashboard
+    # Coverage of all charsets by all TTF fonts: file name to charset name
+    # to details, and charset name to average percent complete
+    fonts = []
+    family = family_coverage(sorted(glob.glob(os.path.join(_out, '*.ttf'))), fonts)
+    fonts = [x.info() for x in fonts]
+
+    # Make a plain dictionary with just the bits we want on the dashboard,
+    # `latin` subset is used when pyFontaine orthographies are not available
     totals = {}
-    totals['gwf'] = family.get('GWF latin', None)
+    totals['gwf'] = family.get('GWF latin', family.get('latin'))
     totals['al3'] = family.get('Adobe Latin 3', None)
     # Store it in the $(id).state.yaml file
     project.config['local']['charsets'] = totals
     project.save_state()
 
-    # fonts.itervalues() emits <fontaine.font.Font instance at 0x106123c68> objects that we return for the rfiles.html template
-    return fonts.itervalues()
+    # written at once, so a page view never reads a partial file
+    tmp = '%s.%s.tmp' % (_out_yaml, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(yaml.safe_dump({'family': family, 'fonts': fonts}))
+    os.rename(tmp, _out_yaml)
+    return fonts
 
 
 def sortFont(fonts):
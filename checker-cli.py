@@ -17,11 +17,16 @@
 # See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
 
 import argparse, os
+import fnmatch
+import glob
+import json
+import time
 import unittest
 import sys
 
 from checker.base import make_suite, run_suite, tests_report
 from checker import run_set
+from checker.parallel import CheckerPool
 
 def run_set1(path):
     """ Return tests results for .ttf font in parameter """
@@ -29,27 +34,129 @@ def run_set1(path):
     return run_suite(make_suite(path, 'result'))
 
 
+# files checked by target when folder is given in command line
+TARGET_FILES = {
+    'result': ['*.ttf'],
+    'upstream': ['*.ufo'],
+    'upstream-ttx': ['*.ttx'],
+    'metadata': ['METADATA.json'],
+}
+
+
+def collect_files(paths, target):
+    """ Expand glob patterns and folders into list of files to check
+    with target. Files given explicitly are always checked """
+    patterns = TARGET_FILES.get(target, ['*'])
+    match = lambda name: any(fnmatch.fnmatch(name, x) for x in patterns)
+    files = []
+    for path in paths:
+        for x in sorted(glob.glob(path)) or [path]:
+            if not os.path.isdir(x) or x.lower().endswith('.ufo'):
+                files.append(x)
+                continue
+            for root, dirs, names in os.walk(x):
+                dirs.sort()
+                # UFO fonts are folders, don't look inside them
+                for name in [d for d in dirs if match(d)]:
+                    files.append(os.path.join(root, name))
+                    dirs.remove(name)
+                files.extend(os.path.join(root, name)
+                             for name in sorted(names) if match(name))
+    return files
+
+
+def summarize(results, started):
+    """ Totals over results of all checked files """
+    return {
+        'files': len(results),
+        'passed': len([x for x in results if x.get('passed')]),
+        'failed': len([x for x in results if not x.get('passed')]),
+        'success': sum(len(x.get('success', [])) for x in results),
+        'failure': sum(len(x.get('failure', [])) for x in results),
+        'error': sum(len(x.get('error', [])) for x in results),
+        'duration': round(time.time() - started, 3)
+    }
+
+
+def profile_sets(files, target, folder):
+    """ Check files in current process under cProfile and write
+    statistics to `folder/<target>.pstats`. Returns file name """
+    import cProfile
+    profiler = cProfile.Profile()
+    for x in files:
+        profiler.runcall(run_set, x, target)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    filename = os.path.join(folder, '%s.pstats' % target)
+    profiler.dump_stats(filename)
+    return filename
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('action',
         help="Action or target test suite",
-        choices=['list', 'result', 'upstream', 'upstream-ttx', 'metadata'],)
-    parser.add_argument('file', nargs="*", help="Test files, can be a list")
+        choices=['list', 'serve', 'result', 'upstream', 'upstream-ttx', 'metadata'],)
+    parser.add_argument('file', nargs="*",
+        help="Test files, folders or glob patterns, can be a list")
     parser.add_argument('--verbose', '-v', action='count', help="Verbosity level", default=1)
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+        help="Number of parallel workers, CHECKER_JOBS or CPU count by default")
+    parser.add_argument('--threads', type=int, default=None,
+        help="Number of threads checking files inside one process (with --jobs=1)")
+    parser.add_argument('--fail-fast', action='store_true',
+        help="Run required tests first and stop on first failed one")
+    parser.add_argument('--timeout', type=int, default=None,
+        help="Seconds one file (or test class with --sandbox) may be checked, "
+             "CHECKER_TIMEOUT or 300 by default")
+    parser.add_argument('--sandbox', action='store_true',
+        help="With --jobs=1 and without --threads run each test class in "
+             "its own process")
+    parser.add_argument('--socket', default=None,
+        help="Unix socket of checker daemon: `serve` listens on it, other "
+             "actions send files to it if it is running. CHECKER_SOCKET "
+             "by default")
+    parser.add_argument('--profile', metavar='FOLDER', default=None,
+        help="Check files in one process under cProfile and write "
+             "FOLDER/<target>.pstats")
 
     args = parser.parse_args()
     if args.action == 'list':
         tests_report()
         sys.exit()
 
-    if not args.file:
+    if args.action == 'serve':
+        from checker.server import serve, default_socket
+        serve(args.socket or default_socket(), jobs=args.jobs)
+        sys.exit()
+
+    files = collect_files(args.file, args.action)
+    if not files:
         print("Missing files to test")
         sys.exit(1)
 
-    for x in args.file:
-        print(x)
-        run_set(x, 'metadata')
-        # s = make_suite(x, args.action)
-        # runner = unittest.TextTestRunner(verbosity=args.verbose)
-        # # run_suite(s)
-        # runner.run(s)
+    if args.profile:
+        import pstats
+        filename = profile_sets(files, args.action, args.profile)
+        print("Profile written to %s" % filename)
+        if args.verbose > 1:
+            pstats.Stats(filename).sort_stats('cumulative').print_stats(30)
+        sys.exit()
+
+    try:
+        pool = CheckerPool(jobs=args.jobs, threads=args.threads,
+                           fail_fast=args.fail_fast, timeout=args.timeout,
+                           sandbox=args.sandbox, address=args.socket)
+    except ValueError as ex:
+        parser.error(str(ex))
+    # one JSON object per line as soon as file is checked, summary last
+    started = time.time()
+    results = []
+    for x, result in pool.imap([(x, x, args.action) for x in files]):
+        results.append(result)
+        print(json.dumps({'path': x, 'target': args.action, 'result': result}))
+        sys.stdout.flush()
+
+    summary = summarize(results, started)
+    print(json.dumps({'summary': summary}))
+    sys.exit(1 if summary['failed'] else 0)
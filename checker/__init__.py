@@ -16,11 +16,14 @@
 # See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
 
 from .base import *
-import tests
 
-def run_set(path, target=None):
-    """ Return tests results for font file, target """
+def run_set(path, target=None, fail_fast=False, sandbox=None):
+    """ Return tests results for font file, target. With `fail_fast`
+    `required` tests run first and checking stops on first of them that
+    fails, other tests are listed in `skipped`. `sandbox` is optional
+    `Sandbox` to run each test class in a child process """
     import os
     assert os.path.exists(path)
     assert target
-    return run_suite(make_suite(path, target))
+    return run_suite(make_suite(path, target, fail_fast=fail_fast),
+                     sandbox=sandbox)
@@ -15,22 +15,41 @@
 #
 # See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
 
+import multiprocessing
+import os
+import resource
+import threading
+import time
 import unittest
+from collections import OrderedDict
 from itertools import chain
 
+from .registry import load_manifest, load_modules
+
 
 class TestRegistry(object):
-    """ Singleton class to collect all available tests """
+    """ Singleton class to collect all available tests.
+
+    Tests modules are imported on demand: `list(target)` imports only
+    modules that have tests for this target according to the manifest
+    in `checker.registry`, and returns classes from target index.
+    """
     tests = []
+    index = {}
 
     @classmethod
     def register(cls, test):
         if not test in TestRegistry.tests:
             TestRegistry.tests.append(test)
+            for target in getattr(test, 'targets', []):
+                TestRegistry.index.setdefault(target, []).append(test)
 
     @classmethod
-    def list(cls):
-        return TestRegistry.tests
+    def list(cls, target=None):
+        load_modules(target)
+        if target is None:
+            return TestRegistry.tests
+        return TestRegistry.index.get(target, [])
 
 
 class MetaTest(type):
@@ -49,53 +68,398 @@ class MetaTest(type):
         return newbornclass
 
 
+def close_fixture(obj):
+    """ Release resources held by parsed font object, if it supports it """
+    close = getattr(obj, 'close', None)
+    if callable(close):
+        try:
+            close()
+        except Exception:
+            pass
+
+
+class FixtureCache(object):
+    """ LRU cache for parsed objects (TTFont, fontforge font, METADATA.json
+    dictionary, etc.) shared by all tests in suite. Objects are keyed by
+    fixture name, path and file modification time, so each file is parsed
+    once per `run_suite` call instead of once per test method.
+
+    Example:
+
+        font = fixtures.get('ttfont', '/path/font.ttf', ttLib.TTFont)
+
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, name, path):
+        path = os.path.abspath(path)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        return (name, path, mtime)
+
+    def get(self, name, path, loader):
+        key = self.key(name, path)
+        with self.lock:
+            if key in self.items:
+                value = self.items.pop(key)
+                self.items[key] = value
+                return value
+
+        # parse outside of the lock, other threads can use cache meanwhile
+        value = loader(path)
+
+        evicted = []
+        with self.lock:
+            if key in self.items:
+                # another thread was faster
+                evicted.append(value)
+                value = self.items.pop(key)
+            self.items[key] = value
+            while len(self.items) > self.maxsize:
+                evicted.append(self.items.popitem(last=False)[1])
+        for x in evicted:
+            close_fixture(x)
+        return value
+
+    def clear(self):
+        with self.lock:
+            items, self.items = self.items, OrderedDict()
+        for value in items.values():
+            close_fixture(value)
+
+
+def env_int(name, default=0):
+    """ Read integer setting from environment """
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def usage():
+    """ Wall clock time, CPU time and peak resident memory (kilobytes)
+    of current process """
+    r = resource.getrusage(resource.RUSAGE_SELF)
+    return time.time(), r.ru_utime + r.ru_stime, r.ru_maxrss
+
+
+def elapsed(start):
+    """ Resources spent since `start = usage()`.
+
+    CPU time is counted for the whole process and `memory` is how much its
+    peak resident memory grew, so with several threads checking files at
+    once both values include work of other threads.
+    """
+    end = usage()
+    return {
+        'duration': round(end[0] - start[0], 4),
+        'cpu': round(end[1] - start[1], 4),
+        'memory': end[2] - start[2]
+    }
+
+
 class BakeryTestCase(unittest.TestCase):
     __metaclass__ = MetaTest
     # because we don't want to register this base class as test case
     __abstract__ = True
+    # `make_suite` set both values on each test instance
+    path = '.'
+    fixtures = None
+
+    def fixture(self, name, loader, path=None):
+        """ Return object made by `loader(path)`, parsed only once for
+        whole suite. `path` is tested file path by default """
+        path = path or self.path
+        if self.fixtures is None:
+            return loader(path)
+        return self.fixtures.get(name, path, loader)
+
+    def run(self, result=None):
+        # measure `setUp` separately, fixtures parsing usually happens there
+        setUp = self.setUp
+
+        def timed_setUp():
+            start = usage()
+            try:
+                setUp()
+            except Exception:
+                self._setupFailed = True
+                raise
+            finally:
+                self._setupUsage = elapsed(start)
+
+        self.setUp = timed_setUp
+        return super(BakeryTestCase, self).run(result)
+
+
+class TestRecord(object):
+    """ Compact outcome of single test. It doesn't keep references to the
+    test instance, its fixtures or traceback frames, so parsed fonts
+    can be released as soon as test is finished """
+    __slots__ = ('methodName', 'methodDoc', 'className', 'name', 'tool',
+                 'targets', 'tags', 'status', 'message', 'duration', 'cpu',
+                 'memory', 'setup')
+
+    def __init__(self, test, status, message='', duration=0, cpu=0,
+                 memory=0):
+        self.methodName = test._testMethodName
+        self.methodDoc = test._testMethodDoc
+        self.className = test.__class__.__name__
+        self.name = getattr(test, 'name', test.__class__.__module__)
+        self.tool = getattr(test, 'tool', '')
+        self.targets = list(getattr(test, 'targets', []))
+        self.tags = list(getattr(getattr(test, self.methodName), 'tags', []))
+        self.status = status
+        self.message = message
+        self.duration = duration
+        self.cpu = cpu
+        self.memory = memory
+        # `elapsed` dictionary for `setUp`, included in values above
+        self.setup = getattr(test, '_setupUsage', None)
+
+    def __repr__(self):
+        return '<TestRecord %s.%s: %s>' % (self.className, self.methodName,
+                                          self.status)
+
+
+def release_test(test):
+    """ Drop everything `setUp` and `make_suite` attached to test instance,
+    fixtures themselves are closed by `run_suite` """
+    for name in list(vars(test)):
+        if not name.startswith('_'):
+            delattr(test, name)
+
+
+def is_required(test):
+    return 'required' in getattr(getattr(test, test._testMethodName), 'tags', [])
 
 
 class BakeryTestResult(unittest.TestResult):
+    """ With `fail_fast` result stops the run on first failed or broken
+    `required` test, and remembers classes which `setUp` raised, so
+    `FailFastSuite` skips their remaining tests """
 
     def __init__(self, stream=None, descriptions=None, verbosity=None,
-                    success_list=None, error_list=None, failure_list=None):
+                    success_list=None, error_list=None, failure_list=None,
+                    skip_list=None, fail_fast=False):
         self.sl = success_list
         self.el = error_list
         self.fl = failure_list
+        self.skl = skip_list
+        self.fail_fast = fail_fast
+        self.broken = set()
+        self._started = {}
         super(BakeryTestResult, self).__init__(self)
 
     def startTest(self, test):
         super(BakeryTestResult, self).startTest(test)
+        self._started[id(test)] = usage()
+
+    def stopTest(self, test):
+        super(BakeryTestResult, self).stopTest(test)
+        self._started.pop(id(test), None)
+        release_test(test)
+
+    def _record(self, test, status, err=None):
+        message = ''
+        if err is not None:
+            message = getattr(err[1], 'message', '')
+        spent = elapsed(self._started.get(id(test)) or usage())
+        return TestRecord(test, status, message, **spent)
 
     def addSuccess(self, test):
         super(BakeryTestResult, self).addSuccess(test)
         if hasattr(self.sl, 'append'):
-            self.sl.append(test)
+            self.sl.append(self._record(test, 'success'))
 
     def addError(self, test, err):
         super(BakeryTestResult, self).addError(test, err)
-        _err_type, _err_exception, _err_tb = err
-        test._err = err
-        test._err_msg = _err_exception.message
         if hasattr(self.el, 'append'):
-            self.el.append(test)
+            self.el.append(self._record(test, 'error', err))
+        if getattr(test, '_setupFailed', False):
+            self.broken.add(test.__class__)
+        self._check_required(test)
 
     def addFailure(self, test, err):
         super(BakeryTestResult, self).addFailure(test, err)
-        _err_type, _err_exception, _err_tb = err
-        test._err = err
-        test._err_msg = _err_exception.message
         if hasattr(self.fl, 'append'):
-            self.fl.append(test)
+            self.fl.append(self._record(test, 'failure', err))
+        self._check_required(test)
+
+    def addSkip(self, test, reason):
+        super(BakeryTestResult, self).addSkip(test, reason)
+        if hasattr(self.skl, 'append'):
+            self.skl.append(TestRecord(test, 'skipped', reason))
+
+    def _check_required(self, test):
+        if self.fail_fast and is_required(test):
+            self.stop()
+
+    def addRecord(self, record):
+        """ Add `TestRecord` made in other process """
+        lists = {'success': self.sl, 'error': self.el, 'failure': self.fl,
+                 'skipped': self.skl}
+        if hasattr(lists.get(record.status), 'append'):
+            lists[record.status].append(record)
+        self.testsRun += 1
+        if self.fail_fast and record.status in ('error', 'failure') \
+                and 'required' in record.tags:
+            self.stop()
+
+
+class FailFastSuite(unittest.TestSuite):
+    """ Flat suite for verdict-only checks. `make_suite` puts `required`
+    tests first; the run stops on first required failure and tests that
+    were not run are reported to `addSkip` """
+
+    def run(self, result):
+        for test in self:
+            if result.shouldStop:
+                reason = 'required test failed'
+            elif test.__class__ in getattr(result, 'broken', ()):
+                reason = 'setUp failed'
+            else:
+                test(result)
+                continue
+            result.startTest(test)
+            result.addSkip(test, reason)
+            result.stopTest(test)
+        return result
+
+
+def flatten(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for x in flatten(test):
+                yield x
+        else:
+            yield test
+
+
+def group_by_class(suite):
+    """ Split suite into lists of consecutive tests of the same class """
+    groups = []
+    for test in flatten(suite):
+        if groups and groups[-1][0].__class__ is test.__class__:
+            groups[-1].append(test)
+        else:
+            groups.append([test])
+    return groups
+
+
+def sandboxed(conn, tests, fail_fast, memory_limit):
+    """ Body of sandbox process: run tests, send records back """
+    if memory_limit:
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    lists = dict((x, []) for x in ['success', 'error', 'failure', 'skipped'])
+    result = BakeryTestResult(success_list=lists['success'],
+                              error_list=lists['error'],
+                              failure_list=lists['failure'],
+                              skip_list=lists['skipped'],
+                              fail_fast=fail_fast)
+    suite = FailFastSuite(tests) if fail_fast else unittest.TestSuite(tests)
+    suite.run(result)
+    conn.send([x for value in lists.values() for x in value])
+    conn.close()
+
+
+class Sandbox(object):
+    """ Runs each test class of a suite in a forked child process, so
+    segfault, hang or memory blow up in backend library costs only tests
+    of this class, which are reported as errors.
+
+        :param timeout: seconds each class may run, CHECKER_TIMEOUT
+                        or 300 by default. 0 means no limit
+        :param memory_limit: address space limit for child process in
+                             megabytes, CHECKER_MEMORY_LIMIT or no limit
+
+    Children are forked from current process with all tests modules and
+    backends already imported, so starting them is cheap. Fixtures are
+    parsed once per class. Fork of a process with running threads may
+    inherit locks those threads hold, so sandbox refuses to run when
+    current process has other threads.
+
+    Example:
+
+        run_suite(make_suite(path, 'result'), sandbox=Sandbox(timeout=60))
+
+    """
+
+    def __init__(self, timeout=None, memory_limit=None):
+        if timeout is None:
+            timeout = env_int('CHECKER_TIMEOUT', 300)
+        if memory_limit is None:
+            memory_limit = env_int('CHECKER_MEMORY_LIMIT')
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+
+    def run(self, suite, result):
+        for tests in group_by_class(suite):
+            if result.shouldStop:
+                for test in tests:
+                    result.addSkip(test, 'required test failed')
+                    release_test(test)
+                continue
+            for record in self.run_tests(tests, getattr(result, 'fail_fast', False)):
+                result.addRecord(record)
+            for test in tests:
+                release_test(test)
+        return result
+
+    def run_tests(self, tests, fail_fast=False):
+        """ Run tests in child process and return their records """
+        if threading.active_count() > 1:
+            raise RuntimeError('Sandbox forks tests processes, it can not '
+                               'be used while other threads are running')
+        conn, child_conn = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=sandboxed,
+            args=(child_conn, tests, fail_fast, self.memory_limit))
+        process.daemon = True
+        process.start()
+        child_conn.close()
+
+        records = None
+        timed_out = False
+        try:
+            if conn.poll(self.timeout or None):
+                records = conn.recv()
+            else:
+                timed_out = True
+        except (EOFError, IOError, OSError):
+            pass
+        finally:
+            conn.close()
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+        if records is not None:
+            return records
+        if timed_out:
+            message = 'Timeout, tests did not finish in %s seconds' % self.timeout
+        else:
+            message = 'Tests process exited with code %s' % process.exitcode
+        return [TestRecord(test, 'error', message) for test in tests]
 
 
 class BakeryTestRunner(unittest.TextTestRunner):
     def __init__(self, descriptions=True, verbosity=1, resultclass=None,
-                    success_list=None, error_list=None, failure_list=None):
+                    success_list=None, error_list=None, failure_list=None,
+                    skip_list=None, fail_fast=False):
 
         self.sl = success_list
         self.el = error_list
         self.fl = failure_list
+        self.skl = skip_list
+        self.fail_fast = fail_fast
 
         self.results = []
         self.descriptions = descriptions
@@ -106,7 +470,8 @@ class BakeryTestRunner(unittest.TextTestRunner):
 
     def _makeResult(self):
         return self.resultclass(self.stream, self.descriptions,
-                                 self.verbosity, self.sl, self.el, self.fl)
+                                 self.verbosity, self.sl, self.el, self.fl,
+                                 skip_list=self.skl, fail_fast=self.fail_fast)
 
     def run(self, test):
         "Run the given test case or test suite."
@@ -142,41 +507,71 @@ class tags(object):
         return f
 
 
-def make_suite(path, definedTarget):
+def make_suite(path, definedTarget, fixtures=None, fail_fast=False):
     """ path - is full path to file,
-        definedTarget is filter to only select small subset of tests
+        definedTarget is filter to only select small subset of tests,
+        fixtures is `FixtureCache` shared by tests, new one by default,
+        fail_fast makes `FailFastSuite` with `required` tests first
+
+        Path and fixtures are bound to test instances, not to test classes,
+        so suites for different files can run in threads at the same time.
     """
     suite = unittest.TestSuite()
-    for TestCase in TestRegistry.list():
-        if definedTarget in TestCase.targets:
-            TestCase.path = path
-            if getattr(TestCase, 'tool', '').lower() == 'fontforge':
-                if path.lower().endswith('.ufo'):
-                    # dev branch of fontforge python library has a bug
-                    # when opening ufo fonts, so we ignore all fontforge tests
-                    # for UFO
-                    import fontforge
-                    if int(fontforge.version()) > int('20140402'):
-                        continue
-            suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(TestCase))
-
+    suite.fixtures = fixtures or FixtureCache()
+    for TestCase in TestRegistry.list(definedTarget):
+        if getattr(TestCase, 'tool', '').lower() == 'fontforge':
+            if path.lower().endswith('.ufo'):
+                # dev branch of fontforge python library has a bug
+                # when opening ufo fonts, so we ignore all fontforge tests
+                # for UFO
+                import fontforge
+                if int(fontforge.version()) > int('20140402'):
+                    continue
+        tests = unittest.defaultTestLoader.loadTestsFromTestCase(TestCase)
+        for test in tests:
+            test.path = path
+            test.fixtures = suite.fixtures
+        suite.addTest(tests)
+
+    if fail_fast:
+        # sort is stable, so order inside both groups is kept
+        ordered = sorted(chain.from_iterable(suite),
+                         key=lambda x: not is_required(x))
+        fixtures = suite.fixtures
+        suite = FailFastSuite(ordered)
+        suite.fixtures = fixtures
     return suite
 
 
-def run_suite(suite):
+def run_suite(suite, sandbox=None):
+    """ Run suite made by `make_suite`. `skipped` list has tests that
+    skipped themselves or were not run by `FailFastSuite`. With `Sandbox`
+    instance each test class runs in its own child process """
     result = {
         'success': [],
         'error': [],
-        'failure': []
+        'failure': [],
+        'skipped': []
     }
+    fail_fast = isinstance(suite, FailFastSuite)
     runner = BakeryTestRunner(resultclass=BakeryTestResult,
                                success_list=result['success'],
                                error_list=result['error'],
-                               failure_list=result['failure'])
-    runner.run(suite)
-    result['sum'] = sum(map(len, [result[x] for x in result.keys()]))
-
-    check = lambda x: 'required' in getattr(x, x._testMethodName).tags
+                               failure_list=result['failure'],
+                               skip_list=result['skipped'],
+                               fail_fast=fail_fast)
+    try:
+        if sandbox is not None:
+            runner.run(lambda result: sandbox.run(suite, result))
+        else:
+            runner.run(suite)
+    finally:
+        # fixtures are valid only during `run_suite` call
+        if getattr(suite, 'fixtures', None) is not None:
+            suite.fixtures.clear()
+    result['sum'] = sum(map(len, [result[x] for x in ['success', 'error', 'failure']]))
+
+    check = lambda x: 'required' in x.tags
     # assume that `error` test are important even if they are broken
     if not any([check(i) for i in chain(result.get('failure', []), result.get('error', []))]):
         result['passed'] = True
@@ -187,15 +582,50 @@ def run_suite(suite):
     return result
 
 
+def serialize_testcase(record):
+    """ Plain dictionary with `TestRecord` content. This is the form tests
+    results are stored in YAML files and passed between processes """
+    def method_doc(doc):
+        if type(doc) == type(None):
+            return 'None'
+        else:
+            return " ".join(doc.encode('utf-8', 'xmlcharrefreplace').split())
+
+    return {
+        'methodDoc': method_doc(record.methodDoc),
+        'tool': record.tool,
+        'name': record.name,
+        'methodName': record.methodName,
+        'className': record.className,
+        'targets': record.targets,
+        'tags': record.tags,
+        'err_msg': record.message,
+        'duration': record.duration,
+        'cpu': record.cpu,
+        'memory': record.memory,
+        'setup': record.setup
+    }
+
+
+def serialize_result(result):
+    """ Convert `run_suite` result into dictionary that contains only
+    plain python objects """
+    data = {}
+    for key, value in result.items():
+        if isinstance(value, list):
+            data[key] = [serialize_testcase(x) for x in value]
+        else:
+            data[key] = value
+    return data
+
+
 def tests_report():
-    """ Small helper to make test report """
-    f = lambda x: True if x.startswith('test') else False
-    m = []
-    for x in TestRegistry.list():
-        m.extend([getattr(x, i) for i in filter(f, dir(x))])
-
-    for i in m:
-        print("%s,\"%s\",\"%s\"" % (
-            str(i).replace('<unbound method ', '').replace('>', ''),
-            ", ".join(i.tags),
-            " ".join(unicode(i.__doc__).replace("\n", '').replace('"', "'").split())))
+    """ Small helper to make test report. Reads tests manifest, so
+    tests modules and their backends are not imported """
+    for x in load_manifest()['tests']:
+        for i in x['tests']:
+            line = u"%s.%s,\"%s\",\"%s\"" % (
+                x['class'], i['methodName'],
+                ", ".join(i['tags']),
+                " ".join(unicode(i['doc']).replace("\n", '').replace('"', "'").split()))
+            print(line.encode('utf-8'))
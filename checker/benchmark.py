@@ -0,0 +1,279 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Checker benchmark. Runs every target over synthetic corpus from
+`checker.corpus` (Latin, Latin-ext, Cyrillic and CJK sized families),
+records time and peak memory per target, per family and per test, and
+compares them with stored baseline.
+
+Each (family, target) pair is checked in a separate process forked
+after all tests modules are imported, so imports are not measured.
+Pages inherited from parent count in RSS of forked child, so peak RSS
+is reported as growth over RSS the child had right after fork: memory
+this pair needs on top of loaded modules. Family names index is built
+before timing starts.
+
+Network is never used: catalogues answer from local dumps only
+(CHECKER_OFFLINE=1) with an empty answers cache in a temporary folder,
+so cached answers of earlier runs are not measured, and any other
+request gets an empty 404 response.
+
+Usage:
+
+    python -m checker.benchmark --save        # store baseline
+    python -m checker.benchmark               # compare with baseline
+
+Exit code is 1 when some value is worse than baseline by more than
+`--threshold`.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from .base import serialize_result
+from .cache import CHECKER_ROOT
+from .corpus import make_corpus
+from .familynames import load_index
+from .registry import load_modules
+
+TARGETS = ['result', 'upstream', 'upstream-ttx', 'metadata', 'upstream-bulk']
+
+TARGET_FILES = {
+    'result': '*.ttf',
+    'upstream': '*.ufo',
+    'upstream-ttx': '*.ttx',
+    'metadata': 'METADATA.json',
+}
+
+DEFAULT_BASELINE = os.path.join(CHECKER_ROOT, 'benchmark-baseline.json')
+DEFAULT_CORPUS = os.path.join(tempfile.gettempdir(), 'fontbakery-corpus')
+
+# differences smaller than this many seconds are noise
+MIN_TIME = 0.05
+
+# settings `offline` changes for the time of measurement
+OFFLINE_ENV = ('CHECKER_OFFLINE', 'CHECKER_CATALOGUE_CACHE')
+
+
+class OfflineResponse(object):
+    status_code = 404
+    text = u''
+
+    def json(self):
+        return {}
+
+
+@contextmanager
+def offline():
+    """ Answer catalogue lookups from local dumps with empty cache, and
+    replace other network calls made by tests with empty 404 response """
+    import requests
+    saved = requests.get, requests.post
+    saved_env = dict((x, os.environ.get(x)) for x in OFFLINE_ENV)
+    cache = tempfile.mkdtemp(prefix='fontbakery-benchmark-')
+    os.environ['CHECKER_OFFLINE'] = '1'
+    os.environ['CHECKER_CATALOGUE_CACHE'] = cache
+    requests.get = requests.post = lambda *args, **kwargs: OfflineResponse()
+    try:
+        yield
+    finally:
+        requests.get, requests.post = saved
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(cache, ignore_errors=True)
+
+
+def target_files(folder, target):
+    if target == 'upstream-bulk':
+        return [folder]
+    return sorted(glob.glob(os.path.join(folder, TARGET_FILES[target])))
+
+
+def current_rss():
+    """ Resident memory of current process in kilobytes, 0 if unknown """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() // 1024
+    except (IOError, OSError, IndexError, ValueError):
+        return 0
+
+
+def measure_child(conn, paths, target):
+    from . import run_set
+    # peak RSS of child starts from RSS of parent at fork
+    inherited = current_rss()
+    r = resource.getrusage(resource.RUSAGE_SELF)
+    started, cpu = time.time(), r.ru_utime + r.ru_stime
+    tests = {}
+    with offline():
+        for path in paths:
+            result = serialize_result(run_set(path, target))
+            for status in ['success', 'failure', 'error']:
+                for x in result[status]:
+                    name = '%s.%s' % (x['className'], x['methodName'])
+                    tests[name] = tests.get(name, 0) + x['duration']
+    r = resource.getrusage(resource.RUSAGE_SELF)
+    conn.send({
+        'wall': time.time() - started,
+        'cpu': r.ru_utime + r.ru_stime - cpu,
+        'peak_rss': max(0, r.ru_maxrss - inherited),
+        'tests': tests
+    })
+    conn.close()
+
+
+def measure(paths, target):
+    """ Check paths in a fresh child process, return its timings """
+    conn, child_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=measure_child,
+                                      args=(child_conn, paths, target))
+    process.start()
+    child_conn.close()
+    try:
+        result = conn.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        raise RuntimeError('Checker process for %s exited with code %s'
+                           % (target, process.exitcode))
+    return result
+
+
+def run_benchmark(corpus=DEFAULT_CORPUS, targets=TARGETS, repeat=1):
+    """ Return benchmark report: values by target, by family/target and
+    by target:test. Best of `repeat` runs is taken """
+    families = make_corpus(corpus)
+    load_modules()
+    # children are forked with index in memory, so its build or load
+    # is not measured
+    load_index()
+    report = {'targets': {}, 'families': {}, 'tests': {}}
+    for target in targets:
+        total = report['targets'][target] = {'wall': 0, 'cpu': 0, 'peak_rss': 0}
+        for family in sorted(families):
+            paths = target_files(families[family], target)
+            if not paths:
+                continue
+            runs = [measure(paths, target) for i in range(repeat)]
+            best = min(runs, key=lambda x: x['wall'])
+            report['families']['%s/%s' % (family, target)] = {
+                'wall': round(best['wall'], 4),
+                'cpu': round(best['cpu'], 4),
+                'peak_rss': best['peak_rss']
+            }
+            total['wall'] += best['wall']
+            total['cpu'] += best['cpu']
+            total['peak_rss'] = max(total['peak_rss'], best['peak_rss'])
+            for name, duration in best['tests'].items():
+                key = '%s:%s' % (target, name)
+                report['tests'][key] = round(report['tests'].get(key, 0) + duration, 4)
+        total['wall'] = round(total['wall'], 4)
+        total['cpu'] = round(total['cpu'], 4)
+    return report
+
+
+def worse(current, baseline, threshold, floor):
+    return current > baseline * (1 + threshold) and current - baseline > floor
+
+
+def compare(report, baseline, threshold=0.25):
+    """ List of regressions of report against baseline """
+    regressions = []
+    for section in ['targets', 'families']:
+        for key, values in sorted(report[section].items()):
+            base = baseline.get(section, {}).get(key)
+            if not base:
+                continue
+            if worse(values['wall'], base['wall'], threshold, MIN_TIME):
+                regressions.append('%s: time %.3fs -> %.3fs'
+                                   % (key, base['wall'], values['wall']))
+            # peak RSS is in kilobytes, ignore changes under 10 MB
+            if worse(values['peak_rss'], base['peak_rss'], threshold, 10240):
+                regressions.append('%s: peak RSS %d KB -> %d KB'
+                                   % (key, base['peak_rss'], values['peak_rss']))
+    for key, duration in sorted(report['tests'].items()):
+        base = baseline.get('tests', {}).get(key)
+        if base is not None and worse(duration, base, threshold, MIN_TIME):
+            regressions.append('%s: time %.3fs -> %.3fs' % (key, base, duration))
+    return regressions
+
+
+def print_report(report, stream=sys.stdout):
+    stream.write('%-30s %10s %10s %12s\n' % ('', 'time, s', 'cpu, s', 'peak RSS, KB'))
+    for section in ['targets', 'families']:
+        for key, values in sorted(report[section].items()):
+            stream.write('%-30s %10.3f %10.3f %12d\n' % (
+                key, values['wall'], values['cpu'], values['peak_rss']))
+        stream.write('\n')
+    stream.write('Slowest tests:\n')
+    slowest = sorted(report['tests'].items(), key=lambda x: x[1], reverse=True)
+    for key, duration in slowest[:15]:
+        stream.write('  %8.3f %s\n' % (duration, key))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Checker benchmark')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS,
+        help="Folder with synthetic fonts, made on first run")
+    parser.add_argument('--target', action='append', choices=TARGETS,
+        help="Target to measure, can be repeated. All targets by default")
+    parser.add_argument('--repeat', type=int, default=1,
+        help="Take best of this number of runs")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+        help="Baseline JSON file")
+    parser.add_argument('--save', action='store_true',
+        help="Store results as new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25,
+        help="Allowed slowdown against baseline, 0.25 is 25%%")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.corpus, args.target or TARGETS, args.repeat)
+    print_report(report)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print('Baseline saved to %s' % args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline in %s, run with --save to create it' % args.baseline)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.threshold)
+    for x in regressions:
+        print('REGRESSION %s' % x)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Persistent cache for serialized tests sets results. Results are keyed by
+sha256 of tested file (or UFO tree), target and source of checker (every
+module under `checker/`, tests import many of them) with data files
+tests read, so new build of unchanged font is not checked again, and any
+edit of checker invalidates all cached results.
+
+Results of `UNCACHED_TARGETS` depend on answers of other sites and are
+never cached.
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+
+CHECKER_ROOT = os.path.dirname(os.path.abspath(__file__))
+# catalogue dumps read by metadata tests and family names index
+SCRAPE_DATAROOT = os.path.join(CHECKER_ROOT, '..', 'scripts', 'scrapes', 'json')
+CHUNK_SIZE = 1024 * 1024
+
+# metadata tests ask foundry catalogues over network, their results
+# change without any change of tested file
+UNCACHED_TARGETS = ('metadata',)
+
+_tests_hash = None
+
+
+def update_with_file(h, path):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+
+
+def checker_files():
+    """ Checker modules and data files tests read, in stable order """
+    files = []
+    for root, dirs, names in os.walk(CHECKER_ROOT):
+        dirs[:] = sorted(x for x in dirs if not x.startswith(('.', '__')))
+        files += [os.path.join(root, x) for x in sorted(names) if x.endswith('.py')]
+    files += sorted(glob.glob(os.path.join(SCRAPE_DATAROOT, '*.json')))
+    return files
+
+
+def tests_hash():
+    """ Hash of checker sources and data, computed once per process """
+    global _tests_hash
+    if _tests_hash is None:
+        h = hashlib.sha256()
+        for filename in checker_files():
+            h.update(os.path.relpath(filename, CHECKER_ROOT).encode('utf-8'))
+            update_with_file(h, filename)
+        _tests_hash = h.hexdigest()
+    return _tests_hash
+
+
+def hash_tree(h, path):
+    """ Add all files in folder to hash, in stable order """
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(x for x in dirs if x != '.git')
+        for name in sorted(files):
+            fullpath = os.path.join(root, name)
+            h.update(os.path.relpath(fullpath, path).encode('utf-8'))
+            update_with_file(h, fullpath)
+
+
+def hash_inputs(path):
+    """ sha256 of everything tests can look at for given path.
+
+    Tests for single font also check its neighbours: METADATA.json, menu
+    and subset files with the same name and presence of license files. So
+    for a file the hash includes it, contents of files sharing its name or
+    METADATA.json, and names with sizes of all other files in its folder.
+    """
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        hash_tree(h, path)
+        return h.hexdigest()
+
+    update_with_file(h, path)
+    folder = os.path.dirname(os.path.abspath(path))
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for name in sorted(os.listdir(folder)):
+        fullpath = os.path.join(folder, name)
+        if not os.path.isfile(fullpath):
+            continue
+        h.update(name.encode('utf-8'))
+        if name.startswith(stem + '.') or name == 'METADATA.json':
+            update_with_file(h, fullpath)
+        else:
+            h.update(str(os.path.getsize(fullpath)).encode('utf-8'))
+    return h.hexdigest()
+
+
+class ResultCache(object):
+    """ Size bounded on-disk cache of tests sets results.
+
+        :param root: folder to keep cached results
+        :param max_size: maximum size of cache in megabytes,
+                         least recently used results are removed first
+
+    Example:
+
+        cache = ResultCache('/path/to/cache')
+        result = cache.get('/path/Font-Regular.ttf', 'result')
+        if result is None:
+            result = check(...)
+            cache.set('/path/Font-Regular.ttf', 'result', result)
+        print(cache.stats())
+
+    """
+
+    def __init__(self, root, max_size=256):
+        self.root = root
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, path, target):
+        h = hashlib.sha256()
+        h.update(hash_inputs(path).encode('utf-8'))
+        h.update(target.encode('utf-8'))
+        h.update(tests_hash().encode('utf-8'))
+        return h.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.root, key[:2], '%s.json' % key)
+
+    def cacheable(self, target):
+        return target.split('/')[0] not in UNCACHED_TARGETS
+
+    def get(self, path, target):
+        """ Return cached result or None """
+        if not self.cacheable(target):
+            self.misses += 1
+            return None
+        try:
+            key = self.key(path, target)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        return self.load(key)
+
+    def set(self, path, target, result):
+        if not self.cacheable(target):
+            return
+        try:
+            key = self.key(path, target)
+        except (IOError, OSError):
+            return
+        self.store(key, result)
+
+    def load(self, key):
+        filename = self.filename(key)
+        try:
+            with open(filename) as f:
+                result = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        # mark as recently used
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return result
+
+    def store(self, key, result):
+        filename = self.filename(key)
+        folder = os.path.dirname(filename)
+        try:
+            os.makedirs(folder)
+        except OSError:
+            # other bake may have made it in the meantime
+            if not os.path.isdir(folder):
+                raise
+        # write to temporary file first, parallel readers should never
+        # see half written result; bake tasks store from threads of one
+        # process
+        tmp = '%s.%s.%s.tmp' % (filename, os.getpid(),
+                                threading.current_thread().ident)
+        with open(tmp, 'w') as f:
+            json.dump(result, f)
+        os.rename(tmp, filename)
+
+    def evict(self):
+        """ Remove least recently used results until cache fits max_size """
+        if not os.path.exists(self.root):
+            return
+        entries = []
+        total = 0
+        for root, dirs, files in os.walk(self.root):
+            for name in files:
+                fullpath = os.path.join(root, name)
+                try:
+                    st = os.stat(fullpath)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, fullpath))
+                total += st.st_size
+
+        limit = self.max_size * 1024 * 1024
+        entries.sort()
+        for mtime, size, fullpath in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(fullpath)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        return 'Checker cache: %s hits, %s misses\n' % (self.hits, self.misses)
@@ -0,0 +1,283 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Lookups of family name in catalogues of other foundries, used by
+`MetadataTest`.
+
+All sites are asked at once from a thread pool, each with its own
+timeout, and answers are cached on disk for CHECKER_CATALOGUE_TTL
+seconds (one day by default) keyed by site and family name. Sites with
+a local dump in `scripts/scrapes/json` are never asked over network.
+
+Every lookup answers True (name is taken), False (name is free) or None
+(site did not answer).
+
+Settings from environment:
+
+    CHECKER_OFFLINE=1         answer from local dumps only, None for others
+    CHECKER_CATALOGUE_URL     send all requests to this server instead,
+                              `http://www.myfonts.com/search/?q=x` becomes
+                              `<url>/www.myfonts.com/search/?q=x`
+    CHECKER_CATALOGUE_TIMEOUT default timeout of one request, seconds
+    CHECKER_CATALOGUE_TTL     cache lifetime, seconds, 0 disables cache
+    CHECKER_CATALOGUE_CACHE   cache folder, system temporary by default
+
+Example:
+
+    from checker.catalogue import RULES, lookup_all
+    answers = lookup_all('Oswald', RULES)
+    # {'myfonts.com': False, 'terminaldesign.com': False, 'veer.com': None, ...}
+
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import urlparse
+from multiprocessing.pool import ThreadPool
+
+import html5lib
+import requests
+
+from .base import env_int
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCRAPE_DATAROOT = os.path.join(ROOT, 'scripts', 'scrapes', 'json')
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_TTL = 24 * 60 * 60
+
+
+def scraped(filename):
+    return {'dump': filename}
+
+
+RULES = {
+    'myfonts.com': {
+        'url': 'http://www.myfonts.com/search/name:{}/fonts/',
+        'checkText': 'I&rsquo;ve got nothing'
+    },
+    'daltonmaag.com': {
+        'url': 'http://www.daltonmaag.com/search.html?term={}',
+        'checkText': 'No product families matched your search term'
+    },
+    'fontsmith.com': {
+        'url': 'http://www.fontsmith.com/support/search-results.cfm',
+        'checkText': "Showing no search results for",
+        'method': 'post',
+        'keywordParam': 'search'
+    },
+    'fontbureau.com': {
+        'url': 'http://www.fontbureau.com/search/?q={}',
+        'checkText': '<h5>Font results</h5> <div class="rule"></div> '
+                     '<span class="note">(No results)</span>'
+    },
+    'houseind.com': {
+        'url': 'http://www.houseind.com/search/?search={}',
+        'checkText': '<ul id="related-fonts"> <li class="first">No results.</li> </ul>'
+    },
+    'veer.com': {
+        'url': 'http://search.veer.com/json/?keyword={}&producttype=TYP&segment=DEF',
+        'parser': 'veer'
+    },
+    'fonts.com': {
+        # catalogue is listed by first letter of family name
+        'url': 'http://www.fonts.com/browse/font-lists?part={initial}',
+        'parser': 'fontscom'
+    },
+    'fontshop.com': {
+        'url': 'http://www.fontshop.com/service/familiesService.php?dataType=json&searchltr={initial}',
+        'parser': 'fontshop'
+    },
+    'terminaldesign.com': scraped('terminaldesign.json'),
+    'typography.com': scraped('typography.json'),
+    'europatype.com': scraped('europatype.json'),
+    'boldmonday.com': scraped('boldmonday.json'),
+    'commercialtype.com': scraped('commercialtype.json'),
+    'swisstypefaces.com': scraped('swisstypefaces.json'),
+    'grillitype.com': scraped('grillitype.json'),
+    'letterror.com': scraped('letterror.json'),
+    'teff.nl': scraped('teff.json'),
+    'nouvellenoire.ch': scraped('nouvellenoire.json'),
+    'typedifferent.com': scraped('typedifferent.json'),
+    'optimo.ch': scraped('optimo.json'),
+}
+
+
+def is_offline():
+    return bool(env_int('CHECKER_OFFLINE'))
+
+
+def rebase(url, base):
+    """ Point url to stand-in server, keeping host as first path part """
+    parts = urlparse.urlsplit(url)
+    rest = urlparse.urlunsplit(('', '', parts.path, parts.query, ''))
+    return '%s/%s%s' % (base.rstrip('/'), parts.netloc, rest)
+
+
+def parse_text(rule, name, response):
+    if response.status_code == 302:  # 302 Moved Temporarily
+        return False
+    if response.status_code != 200:
+        return None
+    return rule['checkText'] not in re.sub(r'\s+', ' ', response.text)
+
+
+def parse_veer(rule, name, response):
+    if response.status_code != 200:
+        return None
+    return bool(response.json()['TotalCount']['type'])
+
+
+def parse_fontscom(rule, name, response):
+    if response.status_code != 200:
+        return None
+    tree = html5lib.treebuilders.getTreeBuilder("lxml")
+    parser = html5lib.HTMLParser(tree=tree, namespaceHTMLElements=False)
+    doc = parser.parse(response.text)
+    titles = doc.xpath('//ul/li/a[@class="product productpopper"]/text()')
+    return name.lower() in [unicode(x).lower() for x in titles]
+
+
+def parse_fontshop(rule, name, response):
+    if response.status_code != 200:
+        return None
+    return name.lower() in [x['name'].lower() for x in response.json()]
+
+
+PARSERS = {
+    'text': parse_text,
+    'veer': parse_veer,
+    'fontscom': parse_fontscom,
+    'fontshop': parse_fontshop,
+}
+
+
+def load_dump(filename):
+    with open(os.path.join(SCRAPE_DATAROOT, filename)) as f:
+        return json.load(f)
+
+
+def lookup_dump(rule, name):
+    try:
+        catalogue = load_dump(rule['dump'])
+    except (OSError, IOError):
+        return None
+    return name.lower() in [x['title'].lower() for x in catalogue]
+
+
+def lookup_site(rule, name, timeout=None):
+    """ Ask site if family name exists in its catalogue """
+    url = rule['url'].format(name, initial=name[:1])
+    base = os.environ.get('CHECKER_CATALOGUE_URL')
+    if base:
+        url = rebase(url, base)
+    timeout = rule.get('timeout') or timeout or \
+        env_int('CHECKER_CATALOGUE_TIMEOUT', DEFAULT_TIMEOUT)
+    try:
+        if rule.get('method') == 'post':
+            data = {rule['keywordParam']: name}
+            response = requests.post(url, allow_redirects=False, data=data,
+                                     timeout=timeout)
+        else:
+            response = requests.get(url, allow_redirects=False,
+                                    timeout=timeout)
+    except requests.RequestException:
+        return None
+    try:
+        return PARSERS[rule.get('parser', 'text')](rule, name, response)
+    except Exception:
+        # page layout changed, answer is unknown
+        return None
+
+
+class AnswerCache(object):
+    """ Answers of catalogues on disk, one small JSON file per
+    (site, family name) """
+
+    def __init__(self, folder=None, ttl=None):
+        self.folder = folder or os.environ.get('CHECKER_CATALOGUE_CACHE') or \
+            os.path.join(tempfile.gettempdir(), 'fontbakery-catalogue')
+        self.ttl = env_int('CHECKER_CATALOGUE_TTL', DEFAULT_TTL) if ttl is None else ttl
+
+    def filename(self, site, name):
+        key = hashlib.sha1(('%s\0%s' % (site, name.lower())).encode('utf-8'))
+        return os.path.join(self.folder, '%s.json' % key.hexdigest())
+
+    def get(self, site, name):
+        if not self.ttl:
+            return None
+        try:
+            with open(self.filename(site, name)) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if time.time() - data.get('time', 0) > self.ttl:
+            return None
+        return data.get('exists')
+
+    def set(self, site, name, exists):
+        if not self.ttl or exists is None:
+            return
+        filename = self.filename(site, name)
+        tmp = '%s.%s.tmp' % (filename, os.getpid())
+        try:
+            if not os.path.exists(self.folder):
+                os.makedirs(self.folder)
+            with open(tmp, 'w') as f:
+                json.dump({'site': site, 'name': name, 'exists': exists,
+                           'time': time.time()}, f)
+            os.rename(tmp, filename)
+        except (IOError, OSError):
+            # cache is optional, site will be asked again next time
+            pass
+
+
+def lookup(site, rule, name, cache=None, offline=False):
+    """ Answer for one site, see module docstring """
+    if 'dump' in rule:
+        return lookup_dump(rule, name)
+    if cache is not None:
+        exists = cache.get(site, name)
+        if exists is not None:
+            return exists
+    if offline:
+        return None
+    exists = lookup_site(rule, name)
+    if cache is not None:
+        cache.set(site, name, exists)
+    return exists
+
+
+def lookup_all(name, rules=RULES, cache=None, offline=None):
+    """ Ask all sites from rules concurrently, return dictionary of
+    answers by site """
+    if cache is None:
+        cache = AnswerCache()
+    if offline is None:
+        offline = is_offline()
+    sites = sorted(rules)
+    pool = ThreadPool(max(1, min(len(sites), 16)))
+    try:
+        answers = pool.map(lambda x: lookup(x, rules[x], name, cache, offline),
+                           sites)
+    finally:
+        pool.close()
+        pool.join()
+    return dict(zip(sites, answers))
@@ -0,0 +1,530 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Synthetic font families for benchmarks and scaling tests. Every family
+is written as TTF, TTX and UFO sources with METADATA.json and license
+file, the same layout bakery builds and checks, so checker, fixer and
+scripts can run over it.
+
+Glyph count (1 to 65535), number of encoded glyphs, number of styles,
+size of name table and set of optional tables are configurable, see
+`make_family`. Glyphs are simple rectangles with sizes derived from
+glyph index, so the same arguments always produce byte-identical fonts.
+
+Example:
+
+    from checker.corpus import make_corpus, make_family, charset
+    families = make_corpus('/tmp/corpus')
+    # {'Latin': '/tmp/corpus/Latin', 'LatinExt': ..., 'Cyrillic': ..., 'CJK': ...}
+
+    make_family('/tmp/Big', 'Big', charset('bmp'), glyphs=65535, styles=4,
+                names=500, tables=['gasp', 'kern', 'DSIG'])
+
+"""
+import json
+import os
+import plistlib
+from StringIO import StringIO
+
+from fontTools.ttLib import TTFont, newTable
+from fontTools.ttLib.tables import ttProgram
+from fontTools.ttLib.tables._c_m_a_p import cmap_format_4
+from fontTools.ttLib.tables._g_l_y_f import Glyph, GlyphCoordinates
+from fontTools.ttLib.tables._n_a_m_e import NameRecord
+
+# fixed corpus of increasing size: name and unicode ranges
+CORPUS = [
+    ('Latin', [(0x20, 0x7E), (0xA0, 0xFF)]),
+    ('LatinExt', [(0x20, 0x7E), (0xA0, 0x24F), (0x1E00, 0x1EFF)]),
+    ('Cyrillic', [(0x20, 0x7E), (0xA0, 0xFF), (0x400, 0x52F)]),
+    ('CJK', [(0x20, 0x7E), (0x3000, 0x303F), (0x4E00, 0x9FFF)]),
+]
+
+CHARSETS = {
+    'latin': CORPUS[0][1],
+    'latin-ext': CORPUS[1][1],
+    'cyrillic': CORPUS[2][1],
+    'cjk': CORPUS[3][1],
+    # everything cmap format 4 can map, without surrogates
+    'bmp': [(0x20, 0x7E), (0xA0, 0xD7FF), (0xE000, 0xFFFD)],
+}
+
+MAX_GLYPHS = 65535
+
+# order styles are added to family when only their number is given
+STYLES = ['Regular', 'Bold', 'Italic', 'BoldItalic', 'Light', 'LightItalic',
+          'Medium', 'MediumItalic', 'Black', 'BlackItalic', 'Thin',
+          'ThinItalic', 'SemiBold', 'SemiBoldItalic', 'ExtraBold',
+          'ExtraBoldItalic', 'ExtraLight', 'ExtraLightItalic']
+
+WEIGHTS = {'Thin': 100, 'ExtraLight': 200, 'Light': 300, 'Regular': 400,
+           'Medium': 500, 'SemiBold': 600, 'Bold': 700, 'ExtraBold': 800,
+           'Black': 900}
+
+FORMATS = ('ttf', 'ttx', 'ufo')
+
+UPM = 1000
+ASCENT = 1000
+DESCENT = -300
+
+COPYRIGHT = 'Copyright (c) 2014, Font Bakery Authors (fonts@example.com)'
+
+# small tables are easier to describe in TTX than to fill attribute by
+# attribute, glyph related tables are made in code because of their size
+HEADER_TTX = """<?xml version="1.0" encoding="UTF-8"?>
+<ttFont sfntVersion="\\x00\\x01\\x00\\x00" ttLibVersion="2.4">
+  <head>
+    <tableVersion value="1.0"/>
+    <fontRevision value="1.0"/>
+    <checkSumAdjustment value="0x0"/>
+    <magicNumber value="0x5f0f3cf5"/>
+    <flags value="00000000 00001011"/>
+    <unitsPerEm value="%(upm)d"/>
+    <created value="Wed Jan  1 00:00:00 2014"/>
+    <modified value="Wed Jan  1 00:00:00 2014"/>
+    <xMin value="0"/>
+    <yMin value="0"/>
+    <xMax value="0"/>
+    <yMax value="0"/>
+    <macStyle value="00000000 000000%(macStyle)s"/>
+    <lowestRecPPEM value="8"/>
+    <fontDirectionHint value="2"/>
+    <indexToLocFormat value="1"/>
+    <glyphDataFormat value="0"/>
+  </head>
+  <hhea>
+    <tableVersion value="0x00010000"/>
+    <ascent value="%(ascent)d"/>
+    <descent value="%(descent)d"/>
+    <lineGap value="0"/>
+    <advanceWidthMax value="0"/>
+    <minLeftSideBearing value="0"/>
+    <minRightSideBearing value="0"/>
+    <xMaxExtent value="0"/>
+    <caretSlopeRise value="1"/>
+    <caretSlopeRun value="0"/>
+    <caretOffset value="0"/>
+    <reserved0 value="0"/>
+    <reserved1 value="0"/>
+    <reserved2 value="0"/>
+    <reserved3 value="0"/>
+    <metricDataFormat value="0"/>
+    <numberOfHMetrics value="0"/>
+  </hhea>
+  <maxp>
+    <tableVersion value="0x10000"/>
+    <numGlyphs value="0"/>
+    <maxPoints value="0"/>
+    <maxContours value="0"/>
+    <maxCompositePoints value="0"/>
+    <maxCompositeContours value="0"/>
+    <maxZones value="2"/>
+    <maxTwilightPoints value="0"/>
+    <maxStorage value="0"/>
+    <maxFunctionDefs value="0"/>
+    <maxInstructionDefs value="0"/>
+    <maxStackElements value="0"/>
+    <maxSizeOfInstructions value="0"/>
+    <maxComponentElements value="0"/>
+    <maxComponentDepth value="0"/>
+  </maxp>
+  <OS_2>
+    <version value="3"/>
+    <xAvgCharWidth value="500"/>
+    <usWeightClass value="%(weight)d"/>
+    <usWidthClass value="5"/>
+    <fsType value="00000000 00000000"/>
+    <ySubscriptXSize value="650"/>
+    <ySubscriptYSize value="600"/>
+    <ySubscriptXOffset value="0"/>
+    <ySubscriptYOffset value="75"/>
+    <ySuperscriptXSize value="650"/>
+    <ySuperscriptYSize value="600"/>
+    <ySuperscriptXOffset value="0"/>
+    <ySuperscriptYOffset value="350"/>
+    <yStrikeoutSize value="50"/>
+    <yStrikeoutPosition value="300"/>
+    <sFamilyClass value="0"/>
+    <panose>
+      <bFamilyType value="2"/>
+      <bSerifStyle value="0"/>
+      <bWeight value="5"/>
+      <bProportion value="0"/>
+      <bContrast value="0"/>
+      <bStrokeVariation value="0"/>
+      <bArmStyle value="0"/>
+      <bLetterForm value="0"/>
+      <bMidline value="0"/>
+      <bXHeight value="0"/>
+    </panose>
+    <ulUnicodeRange1 value="00000000 00000000 00000000 00000001"/>
+    <ulUnicodeRange2 value="00000000 00000000 00000000 00000000"/>
+    <ulUnicodeRange3 value="00000000 00000000 00000000 00000000"/>
+    <ulUnicodeRange4 value="00000000 00000000 00000000 00000000"/>
+    <achVendID value="BAKE"/>
+    <fsSelection value="00000000 0%(fsSelection)s"/>
+    <usFirstCharIndex value="32"/>
+    <usLastCharIndex value="65535"/>
+    <sTypoAscender value="%(ascent)d"/>
+    <sTypoDescender value="%(descent)d"/>
+    <sTypoLineGap value="0"/>
+    <usWinAscent value="%(ascent)d"/>
+    <usWinDescent value="%(win_descent)d"/>
+    <ulCodePageRange1 value="00000000 00000000 00000000 00000001"/>
+    <ulCodePageRange2 value="00000000 00000000 00000000 00000000"/>
+    <sxHeight value="500"/>
+    <sCapHeight value="700"/>
+    <usDefaultChar value="0"/>
+    <usBreakChar value="32"/>
+    <usMaxContex value="0"/>
+  </OS_2>
+  <post>
+    <formatType value="3.0"/>
+    <italicAngle value="%(italicAngle)s"/>
+    <underlinePosition value="-100"/>
+    <underlineThickness value="50"/>
+    <isFixedPitch value="0"/>
+    <minMemType42 value="0"/>
+    <maxMemType42 value="0"/>
+    <minMemType1 value="0"/>
+    <maxMemType1 value="0"/>
+  </post>
+%(tables)s</ttFont>
+"""
+
+# optional tables, `kern` is made from glyph names in `kern_ttx`
+OPTIONAL_TABLES = {
+    'gasp': """  <gasp>
+    <gaspRange rangeMaxPPEM="65535" rangeGaspBehavior="15"/>
+  </gasp>
+""",
+    'DSIG': """  <DSIG>
+    <tableHeader flag="0x1" numSigs="0" version="1"/>
+  </DSIG>
+""",
+    'cvt ': """  <cvt>
+    <cv index="0" value="0"/>
+  </cvt>
+""",
+    'kern': None,
+}
+
+DEFAULT_TABLES = ('gasp',)
+
+LICENSES = {
+    'OFL': ('OFL.txt', 'This Font Software is licensed under the SIL Open '
+                       'Font License, Version 1.1.'),
+    'Apache2': ('LICENSE.txt', 'Licensed under the Apache License, '
+                               'Version 2.0.'),
+    'UFL': ('UFL.txt', 'This Font Software is licensed under the Ubuntu '
+                       'Font Licence, Version 1.0.'),
+}
+
+
+def glyph_name(codepoint):
+    if codepoint == 0x20:
+        return 'space'
+    if codepoint > 0xFFFF:
+        return 'u%05X' % codepoint
+    return 'uni%04X' % codepoint
+
+
+def codepoints(ranges):
+    result = []
+    for first, last in ranges:
+        result.extend(range(first, last + 1))
+    return result
+
+
+def charset(name):
+    """ Code points of named charset, see `CHARSETS` """
+    return codepoints(CHARSETS[name])
+
+
+def style_names(count):
+    """ First `count` styles of `STYLES` """
+    if not 0 < count <= len(STYLES):
+        raise ValueError('Number of styles should be from 1 to %s' % len(STYLES))
+    return STYLES[:count]
+
+
+def style_info(style):
+    """ Return (weight, bold, italic) for style name like 'BoldItalic' """
+    italic = style.endswith('Italic')
+    weight = WEIGHTS.get(style[:-len('Italic')] if italic else style) or 400
+    return weight, weight >= 700, italic
+
+
+def kern_ttx(order, pairs=64):
+    """ kern table with pairs between first glyphs of font """
+    glyphs = order[1:int(pairs ** 0.5) + 2]
+    lines = ['  <kern>', '    <version value="0"/>', '    <kernsubtable coverage="1" format="0">']
+    for left in glyphs:
+        for right in glyphs:
+            lines.append('      <pair l="%s" r="%s" v="-20"/>' % (left, right))
+    lines.extend(['    </kernsubtable>', '  </kern>', ''])
+    return '\n'.join(lines)
+
+
+def glyph_box(index):
+    """ Bounding box and advance width of glyph with index """
+    xmin = 50
+    xmax = 400 + index % 97
+    ymin = DESCENT + index % 211
+    ymax = ASCENT - index % 307
+    return xmin, ymin, xmax, ymax, xmax + 50
+
+
+def rectangle(xmin, ymin, xmax, ymax):
+    glyph = Glyph()
+    glyph.numberOfContours = 1
+    glyph.coordinates = GlyphCoordinates([(xmin, ymin), (xmin, ymax),
+                                          (xmax, ymax), (xmax, ymin)])
+    glyph.endPtsOfContours = [3]
+    glyph.flags = [1, 1, 1, 1]
+    glyph.program = ttProgram.Program()
+    glyph.program.fromBytecode([])
+    return glyph
+
+
+def name_table(family, style, extra=0):
+    """ Name table with usual records plus `extra` synthetic ones """
+    table = newTable('name')
+    table.names = []
+    fullname = '%s %s' % (family, style)
+    psname = '%s-%s' % (family, style)
+    values = {0: COPYRIGHT, 1: family, 2: style, 3: '1.000;BAKE;%s' % psname,
+              4: fullname, 5: 'Version 1.000', 6: psname}
+    for i in range(extra):
+        values[256 + i] = 'Synthetic name record %d of %s' % (i, fullname)
+    for name_id, value in sorted(values.items()):
+        for platform, encoding, language in [(1, 0, 0), (3, 1, 0x409)]:
+            record = NameRecord()
+            record.nameID = name_id
+            record.platformID = platform
+            record.platEncID = encoding
+            record.langID = language
+            if platform == 3:
+                record.string = value.encode('utf-16-be')
+            else:
+                record.string = value.encode('ascii')
+            table.names.append(record)
+    return table
+
+
+def build_font(family, style, unicodes, glyphs=None, names=0,
+               tables=DEFAULT_TABLES):
+    """ Return `TTFont` with rectangle glyphs.
+
+        :param unicodes: code points to map, one glyph each
+        :param glyphs: total number of glyphs including .notdef, glyphs
+                       over mapped ones are unencoded. If it is smaller,
+                       only first unicodes are mapped
+        :param names: number of extra name table records
+        :param tables: optional tables, see `OPTIONAL_TABLES`
+    """
+    if glyphs is None:
+        glyphs = len(unicodes) + 1
+    if not 0 < glyphs <= MAX_GLYPHS:
+        raise ValueError('Number of glyphs should be from 1 to %s' % MAX_GLYPHS)
+    unicodes = unicodes[:glyphs - 1]
+    order = ['.notdef'] + [glyph_name(x) for x in unicodes]
+    order += ['glyph%05d' % i for i in range(len(order), glyphs)]
+
+    unknown = set(tables) - set(OPTIONAL_TABLES)
+    if unknown:
+        raise ValueError('Unknown tables: %s' % ', '.join(sorted(unknown)))
+    weight, bold, italic = style_info(style)
+    font = TTFont()
+    font.importXML(StringIO(HEADER_TTX % {
+        'upm': UPM, 'ascent': ASCENT, 'descent': DESCENT,
+        'win_descent': -DESCENT, 'weight': weight,
+        'macStyle': '%d%d' % (italic, bold),
+        # REGULAR, BOLD and ITALIC bits
+        'fsSelection': '%d%d0000%d' % (not (bold or italic), bold, italic),
+        'italicAngle': '-12.0' if italic else '0.0',
+        'tables': ''.join(kern_ttx(order) if x == 'kern' else OPTIONAL_TABLES[x]
+                          for x in sorted(tables))}))
+
+    font.setGlyphOrder(order)
+
+    glyf = font['glyf'] = newTable('glyf')
+    glyf.glyphOrder = order
+    glyf.glyphs = {}
+    hmtx = font['hmtx'] = newTable('hmtx')
+    hmtx.metrics = {}
+    for index, name in enumerate(order):
+        xmin, ymin, xmax, ymax, advance = glyph_box(index)
+        if name == 'space':
+            glyf.glyphs[name] = Glyph()
+            hmtx.metrics[name] = (advance, 0)
+            continue
+        glyf.glyphs[name] = rectangle(xmin, ymin, xmax, ymax)
+        hmtx.metrics[name] = (advance, xmin)
+    font['loca'] = newTable('loca')
+
+    cmap = font['cmap'] = newTable('cmap')
+    cmap.tableVersion = 0
+    cmap.tables = []
+    for platform, encoding in [(0, 3), (3, 1)]:
+        subtable = cmap_format_4(4)
+        subtable.platformID = platform
+        subtable.platEncID = encoding
+        subtable.language = 0
+        subtable.cmap = dict((x, glyph_name(x)) for x in unicodes if x <= 0xFFFF)
+        cmap.tables.append(subtable)
+
+    font['name'] = name_table(family, style, names)
+    # compile once, so bounding boxes and maxp values are recalculated
+    return reload_font(font)
+
+
+def reload_font(font):
+    data = StringIO()
+    font.save(data)
+    data.seek(0)
+    return TTFont(data)
+
+
+def glif_filename(name):
+    """ UFO file name for glyph, safe on case insensitive file systems """
+    name = ''.join(x + '_' if x.isupper() else x for x in name)
+    if name.startswith('.'):
+        name = '_' + name[1:]
+    return '%s.glif' % name
+
+
+def write_ufo(font, path):
+    """ Write UFO 2 sources of font made by `build_font` """
+    glyphs_dir = os.path.join(path, 'glyphs')
+    if not os.path.exists(glyphs_dir):
+        os.makedirs(glyphs_dir)
+    plistlib.writePlist({'creator': 'org.fontbakery.corpus', 'formatVersion': 2},
+                        os.path.join(path, 'metainfo.plist'))
+    names = dict((x.nameID, x.string) for x in font['name'].names
+                 if x.platformID == 1)
+    plistlib.writePlist({
+        'familyName': names[1],
+        'styleName': names[2],
+        'copyright': names[0],
+        'unitsPerEm': UPM,
+        'ascender': ASCENT,
+        'descender': DESCENT,
+        'postscriptFontName': names[6],
+        'openTypeOS2WeightClass': font['OS/2'].usWeightClass,
+    }, os.path.join(path, 'fontinfo.plist'))
+
+    reverse = {}
+    for codepoint, name in font['cmap'].getcmap(3, 1).cmap.items():
+        reverse[name] = codepoint
+    glyf = font['glyf']
+    contents = {}
+    for name in font.getGlyphOrder():
+        filename = glif_filename(name)
+        contents[name] = filename
+        glyph = glyf[name]
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<glyph name="%s" format="1">' % name,
+                 '  <advance width="%d"/>' % font['hmtx'][name][0]]
+        if name in reverse:
+            lines.append('  <unicode hex="%04X"/>' % reverse[name])
+        if glyph.numberOfContours > 0:
+            lines.append('  <outline>')
+            lines.append('    <contour>')
+            for x, y in glyph.coordinates:
+                lines.append('      <point x="%d" y="%d" type="line"/>' % (x, y))
+            lines.append('    </contour>')
+            lines.append('  </outline>')
+        lines.append('</glyph>')
+        with open(os.path.join(glyphs_dir, filename), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+    plistlib.writePlist(contents, os.path.join(glyphs_dir, 'contents.plist'))
+
+
+def write_metadata(folder, family, fonts, license='OFL'):
+    """ METADATA.json in the format `scripts/genmetadata.py` makes """
+    metadata = {
+        'name': family,
+        'designer': 'Font Bakery',
+        'license': license or '',
+        'visibility': 'Sandbox',
+        'category': 'sans-serif',
+        'size': sum(os.path.getsize(os.path.join(folder, x['filename']))
+                    for x in fonts
+                    if os.path.exists(os.path.join(folder, x['filename']))),
+        'fonts': fonts,
+        'subsets': ['menu', 'latin'],
+        'dateAdded': '2014-01-01'
+    }
+    with open(os.path.join(folder, 'METADATA.json'), 'w') as f:
+        json.dump(metadata, f, indent=2, sort_keys=True)
+
+
+def make_family(folder, family, unicodes, styles=('Regular',), glyphs=None,
+                names=0, tables=DEFAULT_TABLES, formats=FORMATS, license='OFL',
+                metadata=True):
+    """ Write family into folder.
+
+        :param styles: list of style names or number of styles, see `STYLES`
+        :param glyphs, names, tables: font options, see `build_font`
+        :param formats: any of 'ttf', 'ttx' and 'ufo'
+        :param license: 'OFL', 'Apache2', 'UFL' or None for no license file
+        :param metadata: write METADATA.json
+    """
+    if isinstance(styles, int):
+        styles = style_names(styles)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    fonts = []
+    for style in styles:
+        font = build_font(family, style, unicodes, glyphs, names, tables)
+        psname = '%s-%s' % (family, style)
+        filename = '%s.ttf' % psname
+        if 'ttf' in formats:
+            font.save(os.path.join(folder, filename))
+        if 'ttx' in formats:
+            font.saveXML(os.path.join(folder, '%s.ttx' % psname))
+        if 'ufo' in formats:
+            write_ufo(font, os.path.join(folder, '%s.ufo' % psname))
+        fonts.append({
+            'name': family,
+            'postScriptName': psname,
+            'fullName': '%s %s' % (family, style),
+            'style': 'italic' if style_info(style)[2] else 'normal',
+            'weight': font['OS/2'].usWeightClass,
+            'filename': filename,
+            'copyright': COPYRIGHT
+        })
+    if metadata:
+        write_metadata(folder, family, fonts, license)
+    if license:
+        filename, text = LICENSES[license]
+        with open(os.path.join(folder, filename), 'w') as f:
+            f.write('%s\n\n%s\n' % (COPYRIGHT, text))
+    return folder
+
+
+def make_corpus(folder, corpus=CORPUS):
+    """ Write fixed benchmark corpus, families that already exist are
+    kept. Returns dictionary with folder of each family """
+    families = {}
+    for family, ranges in corpus:
+        path = os.path.join(folder, family)
+        if not os.path.exists(os.path.join(path, 'METADATA.json')):
+            make_family(path, family, codepoints(ranges))
+        families[family] = path
+    return families
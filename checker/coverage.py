@@ -0,0 +1,276 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Character set coverage of fonts.
+
+Cmap of a font is read once into a bitset of all Unicode code points.
+Character sets (subsets from `checker.tools` and pyFontaine orthographies
+when pyFontaine is installed) are compiled once per process into one
+array of code points with offsets. Coverage of all charsets is then one
+NumPy lookup of every code point in the font bitset, and counts per
+charset are summed with `np.add.reduceat`.
+
+Example:
+
+    from checker.coverage import font_coverage, family_coverage
+    for charset, support, percent, missing in font_coverage('Font-Regular.ttf').get_orthographies():
+        print(charset.common_name, support, percent)
+
+    family = family_coverage(glob.glob('out/*.ttf'))
+    # {'Font-Regular.ttf': {'latin': {'coverage': 'full', 'percentcomplete': 100,
+    #                                 'missingchars': []}, ...},
+    #  'latin': 100, ...}
+
+"""
+import os
+import threading
+
+import numpy as np
+from fontTools import ttLib
+
+from .tools import SUBSETS
+
+# size of bitset, all Unicode code points
+MAX_CODEPOINT = 0x110000
+
+SUPPORT_FULL = 'full'
+SUPPORT_PARTIAL = 'partial'
+SUPPORT_FRAGMENTARY = 'fragmentary'
+SUPPORT_UNSUPPORTED = 'unsupported'
+
+# charsets of `checker.tools` only used to build other subsets
+HELPER_SUBSETS = ('empty-set', 'quotes')
+
+# Private Use Area of Basic Multilingual Plane
+PRIVATE_USE = (0xe000, 0xf8ff)
+
+# `FontCoverage` attributes saved by `FontCoverage.info`
+INFO_FIELDS = ('filename', 'common_name', 'sub_family', 'unique_id',
+               'full_name', 'version', 'postscript_name', 'copyright',
+               'vendor', 'designer', 'vendor_url', 'designer_url', 'license',
+               'license_url', 'weight', 'is_fixed_width', 'has_fixed_sizes',
+               'style_flags')
+
+_charsets = None
+_lock = threading.Lock()
+
+
+class Charset(object):
+    """ Named set of code points """
+
+    def __init__(self, common_name, codepoints):
+        self.common_name = common_name
+        self.codepoints = codepoints
+
+    def __repr__(self):
+        return '<Charset %s>' % self.common_name
+
+
+class CharsetTable(object):
+    """ Charsets compiled to arrays: code points of all charsets in one
+    sorted-per-charset int32 array, charset `i` is
+    codes[offsets[i]:offsets[i + 1]] """
+
+    def __init__(self, charsets):
+        self.charsets = []
+        arrays = []
+        for charset in charsets:
+            codes = np.unique(np.array(charset.codepoints, dtype=np.int32))
+            codes = codes[(codes >= 0) & (codes < MAX_CODEPOINT)]
+            if not len(codes):
+                continue
+            self.charsets.append(charset)
+            arrays.append(codes)
+        self.sizes = np.array([len(x) for x in arrays], dtype=np.int64)
+        self.offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(self.sizes)
+        self.codes = np.concatenate(arrays) if arrays else np.array([], dtype=np.int32)
+
+    def coverage(self, bitset):
+        """ Return (percents, missing) for all charsets: int array with
+        percent complete of each charset and list with arrays of missing
+        code points """
+        present = bitset[self.codes]
+        if not len(self.charsets):
+            return np.array([], dtype=np.int64), []
+        counts = np.add.reduceat(present.astype(np.int64), self.offsets[:-1])
+        percents = counts * 100 // self.sizes
+        missing = np.split(self.codes[~present],
+                           np.cumsum(self.sizes - counts)[:-1])
+        return percents, missing
+
+
+def tools_charsets():
+    charsets = []
+    for name, subset in sorted(SUBSETS.items()):
+        if name in HELPER_SUBSETS:
+            continue
+        codes = subset.codes
+        # subsets keep private use glyphs of fonts that have them (logo,
+        # version number), fonts are not required to have them
+        private = (codes >= PRIVATE_USE[0]) & (codes <= PRIVATE_USE[1])
+        charsets.append(Charset(name, codes[~private]))
+    return charsets
+
+
+def fontaine_charsets():
+    """ Orthographies of pyFontaine, empty list without it """
+    try:
+        from fontaine.cmap import library
+    except ImportError:
+        return []
+    charsets = []
+    for charmap in getattr(library, 'charmaps', None) or getattr(library, 'charsets', []):
+        glyphs = charmap.glyphs
+        if callable(glyphs):
+            glyphs = glyphs()
+        codepoints = [x for x in glyphs if isinstance(x, (int, long))]
+        charsets.append(Charset(charmap.common_name, codepoints))
+    return charsets
+
+
+def charset_table():
+    """ Compiled `CharsetTable` of all known charsets, made once per process """
+    global _charsets
+    with _lock:
+        if _charsets is None:
+            _charsets = CharsetTable(tools_charsets() + fontaine_charsets())
+    return _charsets
+
+
+def cmap_bitset(font):
+    """ Boolean array indexed by code point, True for code points mapped
+    by any Unicode cmap subtable """
+    bitset = np.zeros(MAX_CODEPOINT, dtype=bool)
+    if 'cmap' not in font:
+        return bitset
+    for table in font['cmap'].tables:
+        if table.platformID == 0 or (table.platformID == 3 and table.platEncID in (1, 10)):
+            codes = np.fromiter(table.cmap.keys(), dtype=np.int64, count=len(table.cmap))
+            bitset[codes[codes < MAX_CODEPOINT]] = True
+    return bitset
+
+
+def support_level(percent):
+    if percent == 100:
+        return SUPPORT_FULL
+    if percent >= 50:
+        return SUPPORT_PARTIAL
+    if percent > 0:
+        return SUPPORT_FRAGMENTARY
+    return SUPPORT_UNSUPPORTED
+
+
+def name_record(font, nameID):
+    if 'name' not in font:
+        return ''
+    for record in font['name'].names:
+        if record.nameID != nameID:
+            continue
+        if isinstance(record.string, unicode):
+            return record.string
+        if record.platformID == 3 or record.platformID == 0:
+            return record.string.decode('utf-16-be', 'ignore')
+        return record.string.decode('latin-1')
+    return ''
+
+
+class FontCoverage(object):
+    """ Coverage of all charsets by one font with basic font info, has
+    `get_orthographies()` like pyFontaine `Font` """
+
+    def __init__(self, font, table=None, filename=''):
+        table = table or charset_table()
+        self.table = table
+        self.filename = filename
+        self.percents, self.missing = table.coverage(cmap_bitset(font))
+
+        self.common_name = name_record(font, 1)
+        self.sub_family = name_record(font, 2)
+        self.unique_id = name_record(font, 3)
+        self.full_name = name_record(font, 4)
+        self.version = name_record(font, 5)
+        self.postscript_name = name_record(font, 6)
+        self.copyright = name_record(font, 0)
+        self.vendor = name_record(font, 8)
+        self.designer = name_record(font, 9)
+        self.vendor_url = name_record(font, 11)
+        self.designer_url = name_record(font, 12)
+        self.license = name_record(font, 13)
+        self.license_url = name_record(font, 14)
+        self.weight = font['OS/2'].usWeightClass if 'OS/2' in font else None
+        self.is_fixed_width = bool(font['post'].isFixedPitch) if 'post' in font else False
+        self.has_fixed_sizes = 'EBLC' in font
+        self.style_flags = font['head'].macStyle if 'head' in font else 0
+
+    def get_orthographies(self):
+        """ List of (charset, support level, percent complete, missing
+        code points) for all charsets """
+        return [(charset, support_level(int(percent)), int(percent),
+                 missing.tolist())
+                for charset, percent, missing
+                in zip(self.table.charsets, self.percents, self.missing)]
+
+    def info(self):
+        """ Plain dictionary with font info and `orthographies` list of
+        [charset name, support level, percent complete, missing code
+        points], to store as build artifact """
+        info = dict((x, getattr(self, x)) for x in INFO_FIELDS)
+        info['orthographies'] = [[charset.common_name, support, percent, missing]
+                                 for charset, support, percent, missing
+                                 in self.get_orthographies()]
+        return info
+
+    def charset(self, name):
+        """ (percent complete, missing code points) of charset by name """
+        for charset, percent, missing in zip(self.table.charsets, self.percents,
+                                             self.missing):
+            if charset.common_name == name:
+                return int(percent), missing.tolist()
+        raise KeyError(name)
+
+
+def font_coverage(font):
+    """ `FontCoverage` for path or fontTools TTFont object """
+    if isinstance(font, ttLib.TTFont):
+        return FontCoverage(font)
+    return FontCoverage(ttLib.TTFont(font, lazy=True),
+                        filename=os.path.basename(font))
+
+
+def family_coverage(paths, fonts=None):
+    """ Coverage dictionary of family in format stored by bakery: file
+    name to charset name to details, and charset name to average
+    percent complete over all fonts. `fonts` is optional list to collect
+    `FontCoverage` objects in """
+    family = {}
+    percents = {}
+    for path in paths:
+        coverage = font_coverage(path)
+        if fonts is not None:
+            fonts.append(coverage)
+        details = family[os.path.basename(path)] = {}
+        for charset, support, percent, missing in coverage.get_orthographies():
+            details[charset.common_name] = {
+                'coverage': support,  # unsupported, fragmentary, partial, full
+                'percentcomplete': percent,
+                'missingchars': missing  # list of ord numbers
+            }
+            percents.setdefault(charset.common_name, []).append(percent)
+    for name, values in percents.items():
+        family[name] = sum(values) / len(values)
+    return family
@@ -0,0 +1,358 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Index of known family names for exact and near-match (edit distance)
+search without network calls.
+
+Names are normalized (case, accents, spaces and punctuation removed), so
+"Px Grotesk", "px-grotesk" and "PX GROTESK" are the same key. Keys are
+kept sorted for exact search, and every key is listed under each of its
+trigrams. Strings within edit distance k share all but at most 3k
+trigrams, so only keys with enough common trigrams are compared with
+Levenshtein distance, all candidates at once with NumPy. Very short names fall back to a scan of keys of
+similar length.
+
+Index is stored as one NumPy .npz file: keys as int32 code points with
+offsets, so candidates are compared as matrix rows without decoding,
+trigrams as sorted int64 array with offsets into int32 postings array.
+Index of `scripts/scrapes/json` dumps is built on first use and cached
+in CHECKER_MANIFEST_DIR (system temporary folder by default) until dumps
+change.
+
+Example:
+
+    from checker.familynames import load_index
+    for distance, name, source in load_index().search('Osvald'):
+        print(distance, name, source)
+
+Command line:
+
+    python -m checker.familynames Osvald Oswald --distance 2
+    python -m checker.familynames --build names.npz --source names.txt
+
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import unicodedata
+from bisect import bisect_left
+from itertools import chain
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCRAPE_DATAROOT = os.path.join(ROOT, 'scripts', 'scrapes', 'json')
+# bump when index format changes
+INDEX_VERSION = 1
+# code point used to pad names before splitting into trigrams
+PAD = 0
+
+_index = None
+_lock = threading.Lock()
+
+
+def normalize(name):
+    """ Key of family name: lowercase letters and digits without accents """
+    if isinstance(name, str):
+        name = name.decode('utf-8')
+    name = unicodedata.normalize('NFKD', name)
+    return u''.join(c for c in name
+                    if c.isalnum() and not unicodedata.combining(c)).lower()
+
+
+def trigrams(key):
+    """ Distinct trigrams of key packed into int64 values """
+    codes = [PAD, PAD] + [ord(c) for c in key] + [PAD, PAD]
+    return sorted(set((codes[i] << 42) | (codes[i + 1] << 21) | codes[i + 2]
+                      for i in range(len(codes) - 2)))
+
+
+def distances(key, codes, lengths, limit):
+    """ Edit distances between key and each row of `codes` matrix of
+    code points (rows are `lengths` long, padded with -1), capped at
+    `limit + 1`. Levenshtein table is filled for all rows at once, one
+    table row per character of key """
+    count, width = codes.shape
+    columns = np.arange(width + 1)
+    previous = np.tile(columns, (count, 1))
+    for i, c in enumerate(key, 1):
+        cost = (codes != ord(c)).astype(np.int64)
+        current = np.empty_like(previous)
+        current[:, 0] = i
+        current[:, 1:] = np.minimum(previous[:, 1:] + 1, previous[:, :-1] + cost)
+        # insertions: current[j] = min(current[j], current[j - 1] + 1)
+        current = np.minimum.accumulate(current - columns, axis=1) + columns
+        previous = current
+    result = previous[np.arange(count), lengths]
+    return np.minimum(result, limit + 1)
+
+
+class PackedStrings(object):
+    """ Read only list of unicode strings stored as one array with
+    offsets: int32 code points or uint8 UTF-8 bytes. Strings are decoded
+    on access """
+
+    def __init__(self, codes, offsets):
+        self.codes = codes
+        self.offsets = offsets
+
+    @classmethod
+    def pack(cls, strings, dtype=np.int32):
+        if dtype == np.uint8:
+            data = [np.frombuffer(x.encode('utf-8'), dtype=np.uint8) for x in strings]
+        else:
+            data = [np.array([ord(c) for c in x], dtype=dtype) for x in strings]
+        offsets = np.zeros(len(data) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(x) for x in data])
+        codes = np.concatenate(data) if data else np.array([], dtype=dtype)
+        return cls(codes, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        chunk = self.codes[self.offsets[i]:self.offsets[i + 1]]
+        if self.codes.dtype == np.uint8:
+            return chunk.tostring().decode('utf-8')
+        return chunk.astype('<u4').tostring().decode('utf-32-le')
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def matrix(self, ids):
+        """ Code points of strings `ids` as rows of matrix padded with -1 """
+        starts = self.offsets[ids]
+        lengths = self.offsets[ids + 1] - starts
+        width = int(lengths.max()) if len(ids) else 0
+        positions = starts[:, None] + np.arange(width)
+        inside = np.arange(width) < lengths[:, None]
+        codes = np.full((len(ids), width), -1, dtype=np.int32)
+        codes[inside] = self.codes[positions[inside]]
+        return codes, lengths
+
+
+class NameIndex(object):
+    """ Exact and edit distance search over family names.
+
+        keys - `PackedStrings` with sorted normalized names
+        labels - `PackedStrings` with UTF-8 JSON list of [name, source]
+                 pairs for each key
+        grams, offsets, postings - trigram index: keys with trigram
+                                   grams[i] are postings[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, keys, labels, grams, offsets, postings):
+        self.keys = keys
+        self.labels = labels
+        self.grams = grams
+        self.offsets = offsets
+        self.postings = postings
+        self.lengths = keys.lengths()
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, entries):
+        """ Make index from (name, source) pairs """
+        labels = {}
+        for name, source in entries:
+            key = normalize(name)
+            if key and [name, source] not in labels.setdefault(key, []):
+                labels[key].append([name, source])
+        keys = sorted(labels)
+
+        grams = [trigrams(x) for x in keys]
+        ids = np.repeat(np.arange(len(keys), dtype=np.int32), [len(x) for x in grams])
+        grams = np.fromiter(chain.from_iterable(grams), dtype=np.int64, count=len(ids))
+        order = np.argsort(grams, kind='mergesort')
+        grams, postings = grams[order], ids[order]
+        grams, starts = np.unique(grams, return_index=True)
+        offsets = np.append(starts, len(postings)).astype(np.int64)
+        return cls(PackedStrings.pack(keys),
+                   PackedStrings.pack([json.dumps(labels[x]) for x in keys],
+                                      dtype=np.uint8),
+                   grams, offsets, postings)
+
+    def save(self, filename):
+        # np.savez adds .npz to names without it
+        with open(filename, 'wb') as f:
+            np.savez(f, version=np.array([INDEX_VERSION]),
+                     key_codes=self.keys.codes, key_offsets=self.keys.offsets,
+                     label_codes=self.labels.codes,
+                     label_offsets=self.labels.offsets, grams=self.grams,
+                     offsets=self.offsets, postings=self.postings)
+
+    @classmethod
+    def load(cls, filename):
+        """ Read index saved by `save`, raises ValueError if format differs """
+        with np.load(filename) as data:
+            if int(data['version'][0]) != INDEX_VERSION:
+                raise ValueError('Index format version mismatch')
+            return cls(PackedStrings(data['key_codes'], data['key_offsets']),
+                       PackedStrings(data['label_codes'], data['label_offsets']),
+                       data['grams'], data['offsets'], data['postings'])
+
+    def label(self, i):
+        return [tuple(x) for x in json.loads(self.labels[i])]
+
+    def exact(self, name):
+        """ List of (name, source) with the same normalized name """
+        key = normalize(name)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.label(i)
+        return []
+
+    def postings_of(self, gram):
+        i = np.searchsorted(self.grams, gram)
+        if i < len(self.grams) and self.grams[i] == gram:
+            return self.postings[self.offsets[i]:self.offsets[i + 1]]
+        return self.postings[:0]
+
+    def candidates(self, key, distance):
+        """ Ids of keys that may be within edit distance of key """
+        grams = trigrams(key)
+        threshold = len(grams) - 3 * distance
+        if threshold <= 0:
+            # short name, any key of similar length can be close
+            return np.nonzero(np.abs(self.lengths - len(key)) <= distance)[0]
+        # every postings list is sorted. Key with `threshold` common
+        # trigrams is in at least one of `len(grams) - threshold + 1`
+        # shortest lists, other lists are only searched for it
+        lists = sorted((self.postings_of(x) for x in grams), key=len)
+        rare = lists[:len(grams) - threshold + 1]
+        ids = np.unique(np.concatenate(rare))
+        counts = np.zeros(len(ids), dtype=np.int32)
+        for postings in lists:
+            if not len(postings):
+                continue
+            found = np.minimum(np.searchsorted(postings, ids), len(postings) - 1)
+            counts += postings[found] == ids
+        ids = ids[counts >= threshold]
+        return ids[np.abs(self.lengths[ids] - len(key)) <= distance]
+
+    def search(self, name, distance=1, limit=None):
+        """ List of (distance, name, source) for names within edit distance
+        of normalized name, closest first """
+        key = normalize(name)
+        if not key:
+            return []
+        ids = self.candidates(key, distance).astype(np.int64)
+        if not len(ids):
+            return []
+        codes, lengths = self.keys.matrix(ids)
+        found = distances(key, codes, lengths, distance)
+        result = []
+        for i, d in zip(ids[found <= distance], found[found <= distance]):
+            result.extend((int(d), x[0], x[1]) for x in self.label(i))
+        result.sort()
+        return result[:limit] if limit else result
+
+
+def read_source(filename):
+    """ (name, source) pairs from scrapy JSON dump (list of {"title": ...})
+    or text file with one name per line, source is file name """
+    source = os.path.splitext(os.path.basename(filename))[0]
+    with open(filename) as f:
+        if filename.endswith('.json'):
+            names = [x['title'] for x in json.load(f)]
+        else:
+            names = [x.strip().decode('utf-8') for x in f]
+    return [(x, source) for x in names if x]
+
+
+def default_sources():
+    return sorted(glob.glob(os.path.join(SCRAPE_DATAROOT, '*.json')))
+
+
+def build_index(sources=None):
+    sources = default_sources() if sources is None else sources
+    entries = []
+    for filename in sources:
+        entries.extend(read_source(filename))
+    return NameIndex.build(entries)
+
+
+def sources_hash(sources):
+    sha = hashlib.sha1()
+    for filename in sources:
+        sha.update(os.path.basename(filename))
+        with open(filename, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def index_filename(sources):
+    folder = os.environ.get('CHECKER_MANIFEST_DIR') or tempfile.gettempdir()
+    return os.path.join(folder, 'fontbakery-familynames-%s-%s.npz'
+                        % (INDEX_VERSION, sources_hash(sources)[:16]))
+
+
+def load_index():
+    """ Return index of scraped catalogues, built once per dumps version """
+    global _index
+    with _lock:
+        if _index is None:
+            sources = default_sources()
+            filename = index_filename(sources)
+            try:
+                _index = NameIndex.load(filename)
+            except (IOError, OSError, ValueError, KeyError):
+                _index = build_index(sources)
+                tmp = '%s.%s.tmp' % (filename, os.getpid())
+                try:
+                    _index.save(tmp)
+                    os.rename(tmp, filename)
+                except (IOError, OSError):
+                    # index is only a cache, can be built again next time
+                    pass
+    return _index
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Search family names index')
+    parser.add_argument('names', nargs='*', help="Family names to look for")
+    parser.add_argument('--distance', type=int, default=1,
+        help="Maximal edit distance of normalized names")
+    parser.add_argument('--source', action='append',
+        help="Scrapy JSON dump or text file with one name per line, can be "
+             "repeated. Scraped catalogues by default")
+    parser.add_argument('--index', help="Read index from .npz file")
+    parser.add_argument('--build', metavar='FILE', help="Save index to .npz file")
+    args = parser.parse_args(argv)
+
+    if args.index:
+        index = NameIndex.load(args.index)
+    elif args.source or args.build:
+        index = build_index(args.source)
+    else:
+        index = load_index()
+    if args.build:
+        index.save(args.build)
+        print('%s names saved to %s' % (len(index), args.build))
+    for name in args.names:
+        for distance, found, source in index.search(name, args.distance):
+            print(('%s\t%d\t%s\t%s' % (name, distance, found, source)).encode('utf-8'))
+
+
+if __name__ == '__main__':
+    main()
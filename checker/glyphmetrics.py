@@ -0,0 +1,133 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Glyph bounding boxes and advance widths as NumPy arrays.
+
+Every glyph record in `glyf` table starts with a header that already
+contains its bounding box, so there is no need to decompile outlines:
+bbox values are read straight from raw table bytes at `loca` offsets.
+Empty glyphs (no outline) have no bounding box and are skipped.
+
+Example:
+
+    from fontTools import ttLib
+    metrics = glyph_metrics(ttLib.TTFont('Font-Regular.ttf'))
+    print(metrics.max('yMax'), metrics.min('yMin'))
+
+"""
+import numpy as np
+
+BBOX_FIELDS = ('xMin', 'yMin', 'xMax', 'yMax')
+
+
+class GlyphMetrics(object):
+    """ Per glyph metrics of the font.
+
+        xMin, yMin, xMax, yMax - int16 arrays with bounding boxes of
+                                 non-empty glyphs
+        advanceWidth - uint16 array with advance widths of all glyphs
+    """
+
+    def __init__(self, xMin, yMin, xMax, yMax, advanceWidth):
+        self.xMin = xMin
+        self.yMin = yMin
+        self.xMax = xMax
+        self.yMax = yMax
+        self.advanceWidth = advanceWidth
+
+    def min(self, field, default=0):
+        values = getattr(self, field)
+        if not len(values):
+            return default
+        return int(values.min())
+
+    def max(self, field, default=0):
+        values = getattr(self, field)
+        if not len(values):
+            return default
+        return int(values.max())
+
+    def percentile(self, field, q, default=0):
+        values = getattr(self, field)
+        if not len(values):
+            return default
+        return float(np.percentile(values, q))
+
+
+def read_int16(data, offsets):
+    """ Big-endian int16 values at byte offsets, offsets may be unaligned """
+    hi = data[offsets].astype(np.uint16)
+    lo = data[offsets + 1].astype(np.uint16)
+    return ((hi << 8) | lo).view(np.int16)
+
+
+def raw_loca(font, num_glyphs):
+    if 'loca' in font.tables:
+        return np.array(font['loca'].locations[:num_glyphs + 1], dtype=np.int64)
+    data = font.reader['loca']
+    if font['head'].indexToLocFormat:
+        return np.frombuffer(data, dtype='>u4', count=num_glyphs + 1).astype(np.int64)
+    return np.frombuffer(data, dtype='>u2', count=num_glyphs + 1).astype(np.int64) * 2
+
+
+def raw_bboxes(font):
+    """ Read glyph headers from undecompiled `glyf` table """
+    num_glyphs = font['maxp'].numGlyphs
+    loca = raw_loca(font, num_glyphs)
+    offsets = loca[:-1][loca[1:] > loca[:-1]]
+    data = np.frombuffer(font.reader['glyf'], dtype=np.uint8)
+    # glyph header: numberOfContours, xMin, yMin, xMax, yMax
+    return [read_int16(data, offsets + 2 * (i + 1)) for i in range(4)]
+
+
+def decompiled_bboxes(font):
+    """ Fallback for fonts without raw data, e.g. imported from TTX """
+    glyf = font['glyf']
+    boxes = [[], [], [], []]
+    for name in font.getGlyphOrder():
+        glyph = glyf[name]
+        if not hasattr(glyph, 'yMax'):
+            continue
+        for i, field in enumerate(BBOX_FIELDS):
+            boxes[i].append(getattr(glyph, field))
+    return [np.array(x, dtype=np.int16) for x in boxes]
+
+
+def advance_widths(font):
+    num_glyphs = font['maxp'].numGlyphs
+    if 'hmtx' in font.tables or font.reader is None:
+        hmtx = font['hmtx']
+        return np.array([hmtx[x][0] for x in font.getGlyphOrder()], dtype=np.uint16)
+    count = font['hhea'].numberOfHMetrics
+    widths = np.frombuffer(font.reader['hmtx'], dtype='>u2', count=count * 2)[::2]
+    if count < num_glyphs:
+        # monospaced tail repeats the last advance width
+        widths = np.concatenate([widths, np.repeat(widths[-1:], num_glyphs - count)])
+    return widths.astype(np.uint16)
+
+
+def glyph_metrics(font):
+    """ Return `GlyphMetrics` for fontTools TTFont object """
+    if 'glyf' not in font:
+        empty = np.array([], dtype=np.int16)
+        boxes = [empty] * 4
+    elif 'glyf' in font.tables or font.reader is None:
+        # table is already decompiled and can be modified in memory
+        boxes = decompiled_bboxes(font)
+    else:
+        boxes = raw_bboxes(font)
+    return GlyphMetrics(*(boxes + [advance_widths(font)]))
@@ -0,0 +1,466 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Parallel checking engine. Each (path, target) pair is checked in a pool
+of worker processes, results are returned in the same shape `run_set`
+produces after serialization with `serialize_result`.
+
+With `jobs=1` files are checked in current (warm) process, optionally in
+`threads` threads, which overlaps I/O bound tests without paying memory
+cost of a process per font.
+
+Workers are recycled after `max_tasks` checked files or when their
+resident memory grows over `max_rss` megabytes, because fontforge leaks.
+Worker that checks one file longer than `timeout` seconds is killed and
+the file gets error result, the same as when worker crashes.
+
+Workers are new interpreters started with `subprocess`, never forks of
+the caller. Pools are used from threads (bake task graph, daemon
+request handlers, web views), and a process forked from a threaded one
+may inherit locks held by other threads at the moment of fork.
+
+Example:
+
+    from checker.parallel import run_sets
+    result = run_sets([('Font-Regular.ttf', '/path/Font-Regular.ttf', 'result')])
+
+"""
+import json
+import multiprocessing
+import os
+import resource
+import select
+import socket
+import subprocess
+import sys
+import time
+import traceback
+from _multiprocessing import Connection
+from functools import partial
+from multiprocessing.pool import ThreadPool
+
+from .base import Sandbox, env_int, serialize_result
+
+# folder with `checker` package, workers import it from there
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def default_jobs():
+    """ Number of workers, CHECKER_JOBS or number of CPUs """
+    return env_int('CHECKER_JOBS') or multiprocessing.cpu_count()
+
+
+def current_rss():
+    """ Resident memory of current process in megabytes """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except (IOError, OSError, IndexError, ValueError):
+        # ru_maxrss is peak value in kilobytes, but better than nothing
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def check_one(path, target, fail_fast=False, sandbox=None):
+    """ Run tests set and return serialized result """
+    from . import run_set
+    return serialize_result(run_set(path, target, fail_fast=fail_fast,
+                                    sandbox=sandbox))
+
+
+def check_item(item, fail_fast=False, sandbox=None):
+    key, path, target = item
+    try:
+        return key, check_one(path, target, fail_fast, sandbox)
+    except Exception:
+        return key, failed_result(traceback.format_exc())
+
+
+def failed_result(message):
+    """ Result for file that can't be checked at all """
+    return {
+        'success': [],
+        'failure': [],
+        'skipped': [],
+        'error': [{
+            'methodDoc': message,
+            'tool': 'Checker',
+            'name': __name__,
+            'methodName': 'run_set',
+            'className': 'CheckerPool',
+            'targets': [],
+            'tags': ['required'],
+            'err_msg': message,
+            'duration': 0
+        }],
+        'sum': 1,
+        'passed': False
+    }
+
+
+def is_failed(result):
+    """ True if result is made by `failed_result` """
+    return any(x.get('tool') == 'Checker' for x in result.get('error', []))
+
+
+def worker(conn, max_tasks, max_rss, fail_fast=False, memory_limit=0):
+    if memory_limit:
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    done = 0
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        key, path, target = task
+        try:
+            value, error = check_one(path, target, fail_fast), None
+        except Exception:
+            value, error = None, traceback.format_exc()
+        done += 1
+        # tell supervisor in the same message that this worker is going
+        # to retire, so it never sends a task into a closed pipe
+        retire = bool(max_tasks and done >= max_tasks
+                      or max_rss and current_rss() > max_rss)
+        conn.send((key, value, error, retire))
+        if retire:
+            break
+    conn.close()
+
+
+def worker_main(argv=None):
+    """ Entry point of process started by `Worker`, its stdin is socket
+    connected to supervisor """
+    argv = sys.argv[1:] if argv is None else argv
+    max_tasks, max_rss, fail_fast, memory_limit, preload = json.loads(argv[0])
+    conn = Connection(os.dup(0))
+    # tests must never read tasks as their input
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    if preload:
+        # import all tests modules with their backends before first task
+        from .registry import load_modules
+        try:
+            load_modules()
+        except Exception:
+            # broken module gives error results of its target, as it
+            # does without preload
+            traceback.print_exc()
+    worker(conn, max_tasks, max_rss, fail_fast, memory_limit)
+
+
+class Worker(object):
+    """ Worker process with its own pipe, so supervisor always knows which
+    file each worker is checking """
+
+    def __init__(self, max_tasks, max_rss, fail_fast=False, memory_limit=0,
+                 preload=False):
+        conn, child_conn = socket.socketpair()
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [ROOT] + filter(None, [env.get('PYTHONPATH')]))
+        args = json.dumps([max_tasks, max_rss, fail_fast, memory_limit, preload])
+        self.process = subprocess.Popen(
+            [sys.executable, '-c',
+             'from checker.parallel import worker_main; worker_main()', args],
+            stdin=child_conn.fileno(), close_fds=True, env=env)
+        child_conn.close()
+        self.conn = Connection(os.dup(conn.fileno()))
+        conn.close()
+        self.task = None
+        self.started = None
+
+    def fileno(self):
+        return self.conn.fileno()
+
+    def send(self, task):
+        self.task = task
+        self.started = time.time()
+        self.conn.send(task)
+
+    @property
+    def exitcode(self):
+        return self.process.poll()
+
+    def kill(self):
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+        self.process.wait()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (IOError, OSError):
+            pass
+        deadline = time.time() + 1
+        while self.process.poll() is None and time.time() < deadline:
+            time.sleep(0.01)
+        if self.process.poll() is None:
+            self.kill()
+        self.conn.close()
+
+
+class CheckerPool(object):
+    """ Pool of worker processes running checker tests sets
+
+        :param jobs: number of workers, CHECKER_JOBS or CPU count by default
+        :param max_tasks: recycle worker after this number of files,
+                          CHECKER_MAX_TASKS or 10 by default
+        :param max_rss: recycle worker when its resident memory is bigger
+                        than this value in megabytes, CHECKER_MAX_RSS
+                        or 1024 by default. 0 means no limit
+        :param threads: with jobs=1, number of threads checking files
+                        in current process, CHECKER_THREADS or 1
+        :param cache: `checker.cache.ResultCache` instance, files with
+                      cached results are not checked again
+        :param fail_fast: run `required` tests first and stop checking
+                          file on first failed one, see `run_set`
+        :param timeout: seconds worker may spend on one file,
+                        CHECKER_TIMEOUT or 300 by default. 0 means no limit
+        :param memory_limit: address space limit of worker in megabytes,
+                             CHECKER_MEMORY_LIMIT or no limit
+        :param sandbox: with jobs=1, run each test class in its own child
+                        process with the same timeout and memory limit,
+                        see `checker.base.Sandbox`. Can't be used with
+                        threads, children are forked
+        :param address: Unix socket of `checker.server` daemon, CHECKER_SOCKET
+                        by default. When daemon is running files are checked
+                        by it instead of new workers. False disables it
+        :param keep_workers: keep idle workers between `imap` calls, they
+                             are stopped by `close`
+        :param preload: workers import all tests modules when they start,
+                        not when their first file needs them
+
+    """
+
+    def __init__(self, jobs=None, max_tasks=None, max_rss=None, threads=None,
+                 cache=None, fail_fast=False, timeout=None, memory_limit=None,
+                 sandbox=False, address=None, keep_workers=False,
+                 preload=False):
+        self.jobs = jobs or default_jobs()
+        if address is None:
+            address = os.environ.get('CHECKER_SOCKET')
+        self.address = address
+        self.cache = cache
+        self.fail_fast = fail_fast
+        if timeout is None:
+            timeout = env_int('CHECKER_TIMEOUT', 300)
+        if memory_limit is None:
+            memory_limit = env_int('CHECKER_MEMORY_LIMIT')
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.sandbox = sandbox
+        self.threads = threads or env_int('CHECKER_THREADS', 1)
+        if sandbox and self.jobs == 1 and self.threads > 1:
+            raise ValueError('Sandbox forks tests processes, it can not '
+                             'be used with threads')
+        if max_tasks is None:
+            max_tasks = env_int('CHECKER_MAX_TASKS', 10)
+        if max_rss is None:
+            max_rss = env_int('CHECKER_MAX_RSS', 1024)
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        self.keep_workers = keep_workers
+        self.preload = preload
+        self.workers = []
+
+    def start(self):
+        """ Start all workers before first check """
+        while len(self.workers) < self.jobs:
+            self.spawn()
+
+    def spawn(self):
+        w = Worker(self.max_tasks, self.max_rss, self.fail_fast,
+                   self.memory_limit, self.preload)
+        self.workers.append(w)
+        return w
+
+    def retire(self, w):
+        self.workers.remove(w)
+        w.close()
+
+    def imap(self, items):
+        """ Check every (key, path, target) item, yield (key, result) pairs
+        in order of completion """
+        if self.cache is None:
+            for key, value in self.check(items):
+                yield key, value
+            return
+
+        todo = []
+        cache_keys = {}
+        # partial fail fast results are cached apart from full ones
+        suffix = '/fail-fast' if self.fail_fast else ''
+        for key, path, target in items:
+            if not self.cache.cacheable(target):
+                todo.append((key, path, target))
+                continue
+            try:
+                cache_key = self.cache.key(path, target + suffix)
+            except (IOError, OSError):
+                cache_key = None
+            value = cache_key and self.cache.load(cache_key)
+            if value is None:
+                todo.append((key, path, target))
+                cache_keys[key] = cache_key
+            else:
+                yield key, value
+
+        for key, value in self.check(todo):
+            # crashed workers are not cached, next run can be luckier
+            if cache_keys.get(key) and not is_failed(value):
+                try:
+                    self.cache.store(cache_keys[key], value)
+                except (IOError, OSError):
+                    # cache is optional, file is just checked again
+                    # next time
+                    pass
+            yield key, value
+        self.cache.evict()
+
+    def check(self, items):
+        queue = list(items)
+        queue.reverse()
+        if not queue:
+            return
+
+        conn = self.connect()
+        if conn is not None:
+            from .server import submit
+            for key, value in submit(queue, fail_fast=self.fail_fast, conn=conn):
+                yield key, value
+            return
+
+        if self.jobs == 1:
+            queue.reverse()
+            sandbox = None
+            if self.sandbox:
+                sandbox = Sandbox(self.timeout, self.memory_limit)
+            check = partial(check_item, fail_fast=self.fail_fast,
+                            sandbox=sandbox)
+            if self.threads > 1:
+                threads = ThreadPool(min(self.threads, len(queue)))
+                try:
+                    for key, value in threads.imap_unordered(check, queue):
+                        yield key, value
+                finally:
+                    threads.close()
+                    threads.join()
+            else:
+                for item in queue:
+                    yield check(item)
+            return
+
+        try:
+            while queue or any(w.task for w in self.workers):
+                # keep all workers busy
+                for w in list(self.workers):
+                    if w.task is None and queue:
+                        self.dispatch(w, queue)
+                while queue and len(self.workers) < self.jobs:
+                    if not self.dispatch(self.spawn(), queue):
+                        # try again after select, don't spin on spawning
+                        break
+
+                ready, _, _ = select.select(self.workers, [], [], 1)
+                for w in ready:
+                    try:
+                        key, value, error, retire = w.conn.recv()
+                    except (EOFError, IOError, OSError):
+                        # worker died without saying goodbye (segfault
+                        # in backend library)
+                        task = w.task
+                        self.retire(w)
+                        if task is not None:
+                            yield task[0], failed_result('Worker exited with code %s'
+                                                         % w.exitcode)
+                        continue
+
+                    w.task = None
+                    if retire:
+                        self.retire(w)
+                    if error:
+                        yield key, failed_result(error)
+                    else:
+                        yield key, value
+
+                for key, value in self.expire():
+                    yield key, value
+        finally:
+            if self.keep_workers:
+                # answers of busy workers belong to abandoned check, they
+                # must not come to the next one
+                for w in [x for x in self.workers if x.task is not None]:
+                    w.kill()
+                    self.retire(w)
+            else:
+                self.close()
+
+    def dispatch(self, w, queue):
+        """ Send next item of queue to worker. Worker which died while
+        idle is retired and item goes back to queue """
+        item = queue.pop()
+        try:
+            w.send(item)
+            return True
+        except (IOError, OSError):
+            w.task = None
+            self.retire(w)
+            queue.append(item)
+            return False
+
+    def connect(self):
+        """ Socket connected to checker daemon or None """
+        if not self.address or not os.path.exists(self.address):
+            return None
+        from .server import connect
+        try:
+            return connect(self.address)
+        except socket.error:
+            return None
+
+    def expire(self):
+        """ Kill workers checking their file longer than timeout """
+        if not self.timeout:
+            return
+        now = time.time()
+        for w in list(self.workers):
+            if w.task is not None and now - w.started > self.timeout:
+                task = w.task
+                w.kill()
+                self.retire(w)
+                yield task[0], failed_result('Timeout, file was not checked in %s seconds'
+                                             % self.timeout)
+
+    def close(self):
+        for w in list(self.workers):
+            self.retire(w)
+
+
+def run_sets(items, jobs=None, max_tasks=None, max_rss=None, threads=None,
+             cache=None, fail_fast=False, timeout=None, memory_limit=None,
+             sandbox=False):
+    """ Check all (key, path, target) items in parallel and return
+    dictionary with serialized results by key """
+    pool = CheckerPool(jobs=jobs, max_tasks=max_tasks, max_rss=max_rss,
+                       threads=threads, cache=cache, fail_fast=fail_fast,
+                       timeout=timeout, memory_limit=memory_limit,
+                       sandbox=sandbox)
+    return dict(pool.imap(items))
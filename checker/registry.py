@@ -0,0 +1,210 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Manifest of checker tests: test class, module, targets, tool, tags and
+docstrings of test methods. It is built by parsing `checker/tests/*.py`
+sources, not by importing them, so listing tests or finding modules for
+a target never imports fontforge, fontaine or other backends.
+
+The manifest is stored as JSON in CHECKER_MANIFEST_DIR (system temporary
+folder by default) and rebuilt when checker sources change.
+
+Example:
+
+    from checker.registry import load_manifest, load_modules
+    print(load_manifest()['index']['metadata'])
+    load_modules('metadata')  # imports only checker.tests.metadata_test
+
+"""
+import ast
+import glob
+import importlib
+import json
+import os
+import tempfile
+import threading
+
+from .cache import CHECKER_ROOT, tests_hash
+
+TESTS_ROOT = os.path.join(CHECKER_ROOT, 'tests')
+TESTS_PACKAGE = 'checker.tests'
+# names `BakeryTestCase` is imported with in tests modules
+BASE_NAMES = ('TestCase', 'BakeryTestCase')
+# bump when manifest format changes
+MANIFEST_VERSION = 1
+
+_manifest = None
+_loaded = set()
+_lock = threading.RLock()
+
+
+class Unknown(object):
+    """ Marker for class attribute that is not a literal """
+
+
+def literal(node, default=Unknown):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return default
+
+
+def node_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def method_tags(node):
+    """ Arguments of `@tags(...)` decorator, same default as `MetaTest` """
+    for decorator in node.decorator_list:
+        if isinstance(decorator, ast.Call) and node_name(decorator.func) == 'tags':
+            return [literal(x, '') for x in decorator.args]
+    return ['note']
+
+
+def scan_module(filename):
+    """ Return manifest entries for all test classes defined in file """
+    module = '%s.%s' % (TESTS_PACKAGE, os.path.splitext(os.path.basename(filename))[0])
+    with open(filename) as f:
+        tree = ast.parse(f.read(), filename)
+
+    classes = {}
+    result = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = [node_name(x) for x in node.bases]
+        parents = [classes[x] for x in bases if x in classes]
+        if not parents and not any(x in BASE_NAMES for x in bases):
+            continue
+
+        entry = {'class': node.name, 'module': module,
+                 'targets': [], 'tool': '', 'tests': []}
+        methods = {}
+        for parent in reversed(parents):
+            entry['targets'] = parent['targets']
+            entry['tool'] = parent['tool']
+            methods.update((x['methodName'], x) for x in parent['tests'])
+
+        abstract = False
+        for item in node.body:
+            if isinstance(item, ast.Assign):
+                for name in map(node_name, item.targets):
+                    if name == 'targets':
+                        value = literal(item.value)
+                        # None makes module loaded for any target
+                        entry['targets'] = None if value is Unknown else list(value)
+                    elif name == 'tool':
+                        entry['tool'] = literal(item.value, '')
+                    elif name == '__abstract__':
+                        abstract = bool(literal(item.value, True))
+            elif isinstance(item, ast.FunctionDef) and item.name.startswith('test'):
+                methods[item.name] = {
+                    'methodName': item.name,
+                    'tags': method_tags(item),
+                    'doc': ast.get_docstring(item, clean=False)
+                }
+
+        entry['tests'] = [methods[x] for x in sorted(methods)]
+        classes[node.name] = entry
+        if not abstract:
+            result.append(entry)
+    return result
+
+
+def build_manifest():
+    """ Parse tests modules and return manifest dictionary """
+    tests = []
+    for filename in sorted(glob.glob(os.path.join(TESTS_ROOT, '*.py'))):
+        if os.path.basename(filename).startswith('__'):
+            continue
+        tests.extend(scan_module(filename))
+
+    index = {}
+    for entry in tests:
+        for target in entry['targets'] or []:
+            index.setdefault(target, []).append('%s.%s' % (entry['module'], entry['class']))
+    return {'hash': tests_hash(), 'version': MANIFEST_VERSION,
+            'tests': tests, 'index': index}
+
+
+def manifest_filename():
+    folder = os.environ.get('CHECKER_MANIFEST_DIR') or tempfile.gettempdir()
+    return os.path.join(folder, 'fontbakery-checker-%s-%s.json'
+                        % (MANIFEST_VERSION, tests_hash()[:16]))
+
+
+def read_manifest(filename):
+    try:
+        with open(filename) as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if manifest.get('hash') != tests_hash() \
+            or manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def write_manifest(filename, manifest):
+    tmp = '%s.%s.tmp' % (filename, os.getpid())
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.rename(tmp, filename)
+    except (IOError, OSError):
+        # manifest is only a cache, can be built again next time
+        pass
+
+
+def load_manifest():
+    """ Return tests manifest, built once per checker sources version """
+    global _manifest
+    with _lock:
+        if _manifest is None:
+            filename = manifest_filename()
+            _manifest = read_manifest(filename)
+            if _manifest is None:
+                _manifest = build_manifest()
+                write_manifest(filename, _manifest)
+    return _manifest
+
+
+def modules(target=None):
+    """ Names of modules with tests for target, all modules if target
+    is None """
+    manifest = load_manifest()
+    names = []
+    for entry in manifest['tests']:
+        if target is None or entry['targets'] is None \
+                or target in entry['targets']:
+            if entry['module'] not in names:
+                names.append(entry['module'])
+    return names
+
+
+def load_modules(target=None):
+    """ Import tests modules needed for target, so test classes register
+    themselves in `TestRegistry` """
+    with _lock:
+        for name in modules(target):
+            if name not in _loaded:
+                importlib.import_module(name)
+                _loaded.add(name)
@@ -0,0 +1,161 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Long-lived checker daemon. It checks files sent over a local Unix
+socket in a pool of workers started once with the daemon. Workers
+import all tests modules with their backends when they start and stay
+between requests, so a check doesn't pay for importing fontTools,
+fontforge and pyfontaine again. Workers are replaced only when their
+memory grows over CHECKER_MAX_RSS, not after some number of files.
+Requests are checked one at a time, each of them uses all workers.
+
+Protocol is JSON lines. Client sends one request per line:
+
+    {"path": "/abs/path/Font-Regular.ttf", "target": "result"}
+
+optional keys are "key" (returned back as is, path by default) and
+"fail_fast". Empty line or end of input (shutdown of the writing side)
+starts checking, and the daemon answers with one line per file as soon
+as the file is checked:
+
+    {"key": "...", "path": "...", "target": "result", "result": {...}}
+
+Example:
+
+    # checker-cli.py serve --socket /tmp/checker.sock
+    from checker.server import submit
+    for key, result in submit([(path, path, 'result')], '/tmp/checker.sock'):
+        print(key, result['passed'])
+
+"""
+import json
+import os
+import socket
+import SocketServer
+import threading
+
+from .parallel import CheckerPool
+from .registry import load_modules
+
+DEFAULT_SOCKET = '/tmp/fontbakery-checker.sock'
+
+
+def default_socket():
+    return os.environ.get('CHECKER_SOCKET') or DEFAULT_SOCKET
+
+
+class CheckerHandler(SocketServer.StreamRequestHandler):
+
+    def read_requests(self):
+        requests = []
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                break
+            try:
+                request = json.loads(line)
+                requests.append((request.get('key', request['path']),
+                                 request['path'], request['target'],
+                                 bool(request.get('fail_fast'))))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self.write({'error': 'Bad request: %s' % line.strip()})
+        return requests
+
+    def write(self, data):
+        self.wfile.write(json.dumps(data) + '\n')
+        self.wfile.flush()
+
+    def handle(self):
+        requests = self.read_requests()
+        for fail_fast in (True, False):
+            items = [x[:3] for x in requests if x[3] == fail_fast]
+            if not items:
+                continue
+            paths = dict((x[0], x[1:]) for x in items)
+            with self.server.lock:
+                for key, result in self.server.pools[fail_fast].imap(items):
+                    path, target = paths[key]
+                    self.write({'key': key, 'path': path, 'target': target,
+                                'result': result})
+
+
+class CheckerServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, address, jobs=None):
+        self.jobs = jobs
+        # address=False, daemon must never forward checks to itself
+        self.pools = dict((x, CheckerPool(jobs=jobs, fail_fast=x, address=False,
+                                          max_tasks=0, keep_workers=True,
+                                          preload=True))
+                          for x in (True, False))
+        self.lock = threading.Lock()
+        if os.path.exists(address):
+            os.remove(address)
+        SocketServer.UnixStreamServer.__init__(self, address, CheckerHandler)
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        for pool in self.pools.values():
+            pool.close()
+
+
+def serve(address=None, jobs=None):
+    """ Start workers and serve checks until interrupted """
+    address = address or default_socket()
+    # only validates tests modules, workers import them on their own;
+    # broken module fails here, not in the first request
+    load_modules()
+    server = CheckerServer(address, jobs=jobs)
+    # fail fast checks are rare, their workers start on demand
+    server.pools[False].start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(address):
+            os.remove(address)
+
+
+def connect(address=None):
+    """ Return socket connected to daemon, raises `socket.error` if
+    daemon is not running """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(address or default_socket())
+    except socket.error:
+        conn.close()
+        raise
+    return conn
+
+
+def submit(items, address=None, fail_fast=False, conn=None):
+    """ Send (key, path, target) items to daemon, yield (key, result)
+    pairs in order of completion. `conn` is socket made by `connect` """
+    conn = conn or connect(address)
+    try:
+        for key, path, target in items:
+            conn.sendall(json.dumps({'key': key, 'path': os.path.abspath(path),
+                                     'target': target,
+                                     'fail_fast': fail_fast}) + '\n')
+        conn.shutdown(socket.SHUT_WR)
+        for line in conn.makefile('r'):
+            data = json.loads(line)
+            if 'error' in data:
+                raise ValueError(data['error'])
+            yield data['key'], data['result']
+    finally:
+        conn.close()
@@ -0,0 +1,134 @@
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+In-process subsetting with fontTools, used by bakery instead of running
+`scripts/subset.py` twice for every font and subset.
+
+Font is parsed once, every subset is cut from a copy of the parsed font.
+Code points come from `checker.tools.get_subset`, so subsets have same
+characters as `scripts/subset.py` makes. Glyph closure covers composite
+glyph components and, for OpenType variant, GSUB substitutions.
+
+Each subset is written in two variants like `scripts/subset.py` does:
+
+    <name>.<subset>            without OpenType layout tables
+    <name>.<subset>-opentype   with GSUB, GPOS and GDEF of kept glyphs
+
+Example:
+
+    from checker.subsetter import subset_font
+    subset_font('out/Font-Regular.ttf', ['menu', 'latin', 'latin-ext+latin'])
+    # ['out/Font-Regular.menu', 'out/Font-Regular.menu-opentype', ...]
+
+"""
+import copy
+import os
+
+from fontTools import subset as ftsubset
+from fontTools import ttLib
+
+from .coverage import name_record
+from .tools import get_subset
+
+# tables fontforge does not write without 'opentype' flag
+LAYOUT_TABLES = ['GSUB', 'GPOS', 'GDEF', 'BASE', 'JSTF']
+
+# glyphs added by `--null --nmr` options of `scripts/subset.py`
+EXTRA_GLYPHS = ['.null', 'nonmarkingreturn']
+
+OPENTYPE_SUFFIX = '-opentype'
+
+
+def subset_options(opentype):
+    """ fontTools options matching `scripts/subset.py --null --nmr
+    --roundtrip --script [--opentype-features]` """
+    options = ftsubset.Options()
+    # keep all names and hinting, like fontforge does
+    options.name_IDs = ['*']
+    options.name_languages = ['*']
+    options.name_legacy = True
+    options.glyph_names = True
+    options.notdef_outline = True
+    options.legacy_kern = True
+    options.recalc_bounds = True
+    if opentype:
+        options.layout_features = ['*']
+    else:
+        options.layout_features = []
+        options.drop_tables = options.drop_tables + LAYOUT_TABLES
+    return options
+
+
+def load_font(path):
+    """ Parse font once, all tables are decompiled so copies do not read
+    the file again """
+    font = ttLib.TTFont(path)
+    for tag in font.keys():
+        font[tag]
+    font.reader.close()
+    font.reader = None
+    return font
+
+
+def family_name(font):
+    """ Family name used for 'menu' subset, name ID 1 like fontforge
+    `familyname` gives to `scripts/subset.py` """
+    return name_record(font, 1)
+
+
+def subset_filename(path, subset, opentype=False):
+    """ Output file name for subset spec, '+latin' is not part of file
+    name, 'latin-ext+latin' subset goes to 'Font-Regular.latin-ext' """
+    base = os.path.splitext(path)[0]
+    name = '%s.%s' % (base, subset.replace('+latin', ''))
+    return name + OPENTYPE_SUFFIX if opentype else name
+
+
+def cut(font, unicodes, opentype):
+    """ Copy of parsed font with glyphs for unicodes and their closure """
+    font = copy.deepcopy(font)
+    subsetter = ftsubset.Subsetter(options=subset_options(opentype))
+    glyphs = [x for x in EXTRA_GLYPHS if x in font.getGlyphOrder()]
+    subsetter.populate(unicodes=unicodes, glyphs=glyphs)
+    subsetter.subset(font)
+    return font
+
+
+def subset_font(path, subsets, log=None, opentype=(False, True)):
+    """ Write all subsets of font at path, both plain and OpenType
+    variants by default. Subsets with unknown names are logged and
+    skipped. Returns list of written files """
+    font = load_font(path)
+    familyname = family_name(font)
+    written = []
+    for subset in subsets:
+        try:
+            unicodes = list(get_subset(subset, familyname))
+        except KeyError as ex:
+            # config may come from bakery.yaml of project, not only from
+            # validated setup form
+            if log:
+                log.write('Unknown subset %s in %s, skipped\n' % (ex, subset),
+                          prefix='Error: ')
+            continue
+        for variant in opentype:
+            filename = subset_filename(path, subset, variant)
+            if log:
+                log.write('Subset %s: %s\n' % (subset, os.path.basename(filename)))
+            cut(font, unicodes, variant).save(filename)
+            written.append(filename)
+    return written
@@ -14,8 +14,7 @@
 # limitations under the License.
 #
 # See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
-
-from .result_test import *
-from .ttx_test import *
-from .upstream_test import *
-from .metadata_test import *
+"""
+Tests modules are not imported here. `TestRegistry.list(target)` imports
+only modules that have tests for the target, see `checker.registry`.
+"""
@@ -16,6 +16,8 @@
 # See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
 
 from checker.base import BakeryTestCase as TestCase, tags
+from checker.glyphmetrics import glyph_metrics
+from checker.tools import SUBSET_NAMES, get_subset, normalize_subset_name
 import fontforge
 import unicodedata
 import yaml
@@ -32,7 +34,9 @@ class FontToolsTest(TestCase):
     path = '.'
 
     def setUp(self):
-        self.font = ttLib.TTFont(self.path)
+        self.font = self.fixture('ttfont', ttLib.TTFont)
+        self.metrics = self.fixture('glyphmetrics',
+                                    lambda path: glyph_metrics(self.font))
 
     def test_tables(self):
         """ List of tables that shoud be in font file """
@@ -70,11 +74,7 @@ class FontToolsTest(TestCase):
         """ Value for ascents in 'hhea' and 'OS/2' tables should be equal
         to value of glygh with biggest yMax"""
 
-        ymax = 0
-        for g in self.font['glyf'].glyphs:
-            char = self.font['glyf'][g]
-            if hasattr(char, 'yMax') and ymax < char.yMax:
-                ymax = char.yMax
+        ymax = max(0, self.metrics.max('yMax'))
 
         self.assertEqual(self.font['hhea'].ascent, ymax)
         self.assertEqual(self.font['OS/2'].sTypoAscender, ymax)
@@ -84,11 +84,7 @@ class FontToolsTest(TestCase):
         """ Value for descents in 'hhea' and 'OS/2' tables should be equal
         to value of glygh with smallest yMin"""
 
-        ymin = 0
-        for g in self.font['glyf'].glyphs:
-            char = self.font['glyf'][g]
-            if hasattr(char, 'yMin') and ymin > char.yMin:
-                ymin = char.yMin
+        ymin = min(0, self.metrics.min('yMin'))
 
         self.assertEqual(self.font['hhea'].descent, ymin)
         self.assertEqual(self.font['OS/2'].sTypoDescender, ymin)
@@ -108,48 +104,66 @@ class FontToolsTest(TestCase):
                 self.fail("%s contain non-ascii characters" % name_record.nameID)
 
 
-from fontaine.font import Font
-import re
+from checker.coverage import font_coverage
 
 
-class FontaineTest(TestCase):
+class CharsetCoverageTest(TestCase):
     targets = ['result']
-    tool = 'pyfontaine'
+    tool = 'fontTools'
     name = __name__
     path = '.'
 
     def setUp(self):
-        self.font = Font(self.path)
-        # You can use ipdb here to interactively develop tests!
-        # Uncommand the next line, then at the iPython prompt: print(self.path)
-        # import ipdb; ipdb.set_trace()
-
-    # def test_ok(self):
-    #     """ This test succeeds """
-    #     self.assertTrue(True)
-    #
-    # def test_failure(self):
-    #     """ This test fails """
-    #     self.assertTrue(False)
-    #
-    # def test_error(self):
-    #     """ Unexpected error """
-    #     1 / 0
-    #     self.assertTrue(False)
-
-    def test_charMaker(self):
-        # import ipdb; ipdb.set_trace()
-        pattern = re.compile('[\W_]+')
-        functionTemplate = """def test_charset_%s(self, p): self.test_charset_%s.__func__.__doc__ = "Is %s covered 100%%?"; self.assertTrue(p == 100)"""
-        for orthographyTuple in self.font.get_orthographies():
-            charmap = orthographyTuple[0]
-            percent = orthographyTuple[2]
-            shortname = pattern.sub('', charmap.common_name)
-            print "TODO: This doesn't work yet..."
-            print functionTemplate % (shortname, shortname, charmap.common_name)
-            print 'test_charset_%s(self, 100)' % shortname
-            exec functionTemplate % (shortname, shortname, charmap.common_name)
-            exec 'test_charset_%s(self, 100)' % shortname
+        # cmap is read once for all charsets
+        self.coverage = self.fixture('coverage', font_coverage)
+        metadata_path = os.path.join(os.path.dirname(self.path), 'METADATA.json')
+        try:
+            metadata = self.fixture('metadata', load_metadata, metadata_path)
+        except IOError:
+            # font checked outside of family folder declares no subsets
+            metadata = {}
+        self.subsets = [normalize_subset_name(x)
+                        for x in metadata.get('subsets') or []]
+
+    def assertCovered(self, charset):
+        # family has to cover only subsets it declares
+        if charset not in self.subsets:
+            self.skipTest('%s is not in METADATA.json subsets' % charset)
+        percent, missing = self.coverage.charset(charset)
+        self.assertEqual(percent, 100, '%s is covered for %s%%, missing: %s' % (
+            charset, percent, ' '.join('U+%04X' % x for x in missing[:20])))
+
+    def test_charset_latin(self):
+        """ Is latin subset covered 100%? """
+        self.assertCovered('latin')
+
+    def test_charset_latin_ext(self):
+        """ Is latin-ext subset covered 100%? """
+        self.assertCovered('latin-ext')
+
+    def test_charset_vietnamese(self):
+        """ Is vietnamese subset covered 100%? """
+        self.assertCovered('vietnamese')
+
+    def test_charset_greek(self):
+        """ Is greek subset covered 100%? """
+        self.assertCovered('greek')
+
+    def test_charset_greek_ext(self):
+        """ Is greek-ext subset covered 100%? """
+        self.assertCovered('greek-ext')
+
+    def test_charset_cyrillic(self):
+        """ Is cyrillic subset covered 100%? """
+        self.assertCovered('cyrillic')
+
+    def test_charset_cyrillic_ext(self):
+        """ Is cyrillic-ext subset covered 100%? """
+        self.assertCovered('cyrillic-ext')
+
+    def test_charset_arabic(self):
+        """ Is arabic subset covered 100%? """
+        self.assertCovered('arabic')
 
 
 class FontForgeSimpleTest(TestCase):
@@ -159,7 +173,7 @@ class FontForgeSimpleTest(TestCase):
     path = '.'
 
     def setUp(self):
-        self.font = fontforge.open(self.path)
+        self.font = self.fixture('fontforge', fontforge.open)
         # You can use ipdb here to interactively develop tests!
         # Uncommand the next line, then at the iPython prompt: print(self.path)
         # import ipdb; ipdb.set_trace()
@@ -206,6 +220,10 @@ class FontForgeSimpleTest(TestCase):
         self.assertTrue(ord(unicodedata.lookup('EURO SIGN')) in self.font)
 
 
+def load_metadata(path):
+    return yaml.load(open(path, 'r').read())
+
+
 class MetadataJSONTest(TestCase):
     targets = ['result']
     tool = 'FontForge'
@@ -214,10 +232,10 @@ class MetadataJSONTest(TestCase):
     longMessage = True
 
     def setUp(self):
-        self.font = fontforge.open(self.path)
+        self.font = self.fixture('fontforge', fontforge.open)
         #
         medatata_path = os.path.join(os.path.dirname(self.path), 'METADATA.json')
-        self.metadata = yaml.load(open(medatata_path, 'r').read())
+        self.metadata = self.fixture('metadata', load_metadata, medatata_path)
         self.fname = os.path.splitext(self.path)[0]
 
     @tags('required',)
@@ -414,14 +432,14 @@ class MetadataJSONTest(TestCase):
         """ METADATA.json shoyld have 'subsets' property """
         self.assertTrue(self.metadata.get('subsets', None))
 
-    subset_list = ['menu', 'latin', 'latin_ext', 'vietnamese', 'greek',
-                    'cyrillic', 'cyrillic_ext', 'arabic']
+    subset_list = SUBSET_NAMES
 
     def test_metadata_subsets_names_are_correct(self):
         """ METADATA.json 'subset' property can have only allowed values from list:
-        ['menu', 'latin','latin_ext', 'vietnamese', 'greek', 'cyrillic',
-        'cyrillic_ext', 'arabic'] """
-        self.assertTrue(all([x in self.subset_list for x in self.metadata.get('subsets', None)]))
+        ['menu', 'latin', 'latin-ext', 'vietnamese', 'greek', 'greek-ext',
+        'cyrillic', 'cyrillic-ext', 'arabic'], 'latin_ext' is same as 'latin-ext' """
+        self.assertTrue(all([normalize_subset_name(x) in self.subset_list
+                             for x in self.metadata.get('subsets', None)]))
 
     def test_subsets_exists_font(self):
         """ Each font file should have its own set of subsets
@@ -455,12 +473,11 @@ class MetadataJSONTest(TestCase):
 
     def test_menu_have_chars(self):
         """ Test does .menu file have chars needed for METADATA family key """
-        from checker.tools import combine_subsets
         for x in self.metadata.get('subsets', None):
             name = "%s.%s" % (self.fname, x)
 
-            menu = fontforge.open(name)
-            subset_chars = combine_subsets([x, ])
+            menu = self.fixture('fontforge', fontforge.open, name)
+            subset_chars = get_subset(x, self.metadata.get('name'))
             self.assertTrue(all([i in menu for i in subset_chars]))
 
     def test_subset_file_smaller_font_file(self):
@@ -18,6 +18,14 @@
 from checker.base import BakeryTestCase as TestCase, tags
 from fontTools.ttLib import TTFont
 
+def import_ttx(path):
+    # TODO: Need somebody to check this options
+    font = TTFont(None, lazy=False, recalcBBoxes=True,
+        verbose=False, allowVID=False)
+    font.importXML(path, quiet=True)
+    return font
+
+
 class SimpleTTXTest(TestCase):
     targets = ['upstream-ttx']
     tool   = 'fontTools'
@@ -25,11 +33,7 @@ class SimpleTTXTest(TestCase):
     path   = '.'
 
     def setUp(self):
-        # TODO: Need somebody to check this options
-        font = TTFont(None, lazy=False, recalcBBoxes=True,
-            verbose=False, allowVID=False)
-        font.importXML(self.path, quiet=True)
-        self.font = font
+        self.font = self.fixture('ttx', import_ttx)
         # You can use ipdb here to interactively develop tests!
         # Uncommand the next line, then at the iPython prompt: print(self.path)
         # import ipdb; ipdb.set_trace()
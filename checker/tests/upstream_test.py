@@ -94,7 +94,7 @@ class SimpleTest(TestCase):
     path = '.'
 
     def setUp(self):
-        self.font = fontforge.open(self.path)
+        self.font = self.fixture('fontforge', fontforge.open)
         # You can use ipdb here to interactively develop tests!
         # Uncommand the next line, then at the iPython prompt: print(self.path)
         # import ipdb; ipdb.set_trace()
@@ -132,7 +132,7 @@ class UfoOpenTest(TestCase):
     path = '.'
 
     def setUp(self):
-        self.font = robofab.world.OpenFont(self.path)
+        self.font = self.fixture('robofab', robofab.world.OpenFont)
         # You can use ipdb here to interactively develop tests!
         # Uncommand the next line, then at the iPython prompt: print(self.path)
         # import ipdb; ipdb.set_trace()
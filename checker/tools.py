@@ -1,4 +1,24 @@
-__all__ = ['combine_subsets', ]
+"""
+Subset definitions shared by checker and `scripts/subset.py`.
+
+Each subset is compiled once at import into an immutable `Subset`: a
+sorted NumPy array of code points for unions and vectorized checks, and
+a frozenset for O(1) membership. Subset names use GWF spelling with
+hyphens, 'latin_ext' is accepted as 'latin-ext'. A subset spec is names
+joined with '+', like 'latin-ext+latin', each name is matched exactly.
+
+Example:
+
+    from checker.tools import get_subset
+    subset = get_subset('cyrillic-ext+latin')
+    print(0x416 in subset, len(subset))
+    print(subset.missing(font_codepoints))
+
+"""
+import numpy as np
+
+__all__ = ['Subset', 'SUBSETS', 'SUBSET_NAMES', 'normalize_subset_name',
+           'get_subset', 'combine_subsets']
 
 # Data taken from https://code.google.com/p/googlefontdirectory/source/browse/tools/subset/subset.py#184
 
@@ -60,7 +80,9 @@ vietnamese = [0x00c0, 0x00c1, 0x00c2, 0x00c3, 0x00C8, 0x00C9,
 
 # Could probably be more aggressive here and exclude archaic characters,
 # but lack data
-greek = range(0x370, 0x400) + range(0x1f00, 0x2000)
+greek = range(0x370, 0x400)
+
+greek_ext = greek + range(0x1f00, 0x2000)
 
 # Based on character frequency analysis
 cyrillic = range(0x400, 0x460) + [0x490, 0x491, 0x4b0, 0x4b1, 0x2116]
@@ -120,27 +142,85 @@ arabic = [0x000D, 0x0020, 0x0621, 0x0627, 0x062D,
     0x063b, 0x063c, 0x063d, 0x063e, 0x063f, 0x0620,
     0x0674, 0x0674, 0x06EC]
 
-subsets_dict = {
-    'quotes': quotes,
-    'empty_set': empty_set,
-    'latin': latin,
-    'latin_ext': latin_ext,
-    'vietnamese': vietnamese,
-    'greek': greek,
-    'cyrillic': cyrillic,
-    'cyrillic_ext': cyrillic_ext,
-    'arabic':arabic
-}
+class Subset(object):
+    """ Immutable set of code points """
 
-def combine_subsets(subsets, font=None):
-    subsets.append('empty_set')
-    subsets.append('quotes')
-    subsets = set(subsets)
-    result = []
-    for i in subsets:
-        result.extend(subsets_dict[i])
+    def __init__(self, name, codepoints):
+        self.name = name
+        codes = np.unique(np.array(list(codepoints), dtype=np.int32))
+        codes.flags.writeable = False
+        self.codes = codes
+        self.members = frozenset(codes.tolist())
+
+    def __contains__(self, codepoint):
+        return codepoint in self.members
+
+    def __iter__(self):
+        return iter(self.codes.tolist())
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __or__(self, other):
+        return Subset('%s+%s' % (self.name, other.name),
+                      np.union1d(self.codes, other.codes))
 
-    if 'menu' in subsets and font:
-        result.extend(set(map(ord, font.familyname)))
+    def __repr__(self):
+        return '<Subset %s: %s code points>' % (self.name, len(self))
 
-    return result
+    def missing(self, codepoints):
+        """ Sorted list of code points of subset not in `codepoints` """
+        codepoints = np.fromiter(codepoints, dtype=np.int64)
+        return self.codes[~np.in1d(self.codes, codepoints)].tolist()
+
+
+SUBSETS = dict((name, Subset(name, codepoints)) for name, codepoints in [
+    ('quotes', quotes),
+    ('empty-set', empty_set),
+    ('latin', latin),
+    ('latin-ext', latin_ext),
+    ('vietnamese', vietnamese),
+    ('greek', greek),
+    ('greek-ext', greek_ext),
+    ('cyrillic', cyrillic),
+    ('cyrillic-ext', cyrillic_ext),
+    ('arabic', arabic),
+])
+
+# names allowed in METADATA.json and bakery.yaml, 'menu' is made of
+# family name characters
+SUBSET_NAMES = ['menu', 'latin', 'latin-ext', 'vietnamese', 'greek',
+                'greek-ext', 'cyrillic', 'cyrillic-ext', 'arabic']
+
+# compiled subset specs
+_specs = {}
+
+
+def normalize_subset_name(name):
+    return name.strip().lower().replace('_', '-')
+
+
+def get_subset(spec, familyname=None):
+    """ `Subset` for spec like 'latin-ext+latin'. Quotes and space are
+    always added, except for 'menu' subset, which has only space and
+    characters of `familyname`. Raises KeyError for unknown names """
+    names = [normalize_subset_name(x) for x in spec.split('+') if x.strip()]
+    key = ('+'.join(names), familyname if 'menu' in names else None)
+    if key not in _specs:
+        if 'menu' in names:
+            base = Subset('menu', map(ord, familyname or '') + empty_set)
+        else:
+            base = SUBSETS['quotes'] | SUBSETS['empty-set']
+        result = base
+        for name in names:
+            if name != 'menu':
+                result = result | SUBSETS[name]
+        result.name = key[0]
+        _specs[key] = result
+    return _specs[key]
+
+
+def combine_subsets(subsets, font=None):
+    """ Sorted code points of subsets list, `font` is fontforge font
+    used for 'menu' subset """
+    return list(get_subset('+'.join(subsets), font.familyname if font else None))
@@ -24,7 +24,9 @@ Usage: $ ./famchar.py directory/
 """
 
 import sys, os, glob, pprint
-from fontaine.font import Font
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from checker.coverage import family_coverage
 
 # Need 1 arg 
 if len(sys.argv) < 2:
@@ -32,42 +34,13 @@ if len(sys.argv) < 2:
     sys.exit()
 # Check the arg is a directory
 workingDir = sys.argv[1]
-if os.path.exists(workingDir):
-    # If it is a directory, change context to it
-    os.chdir(workingDir)
-else:
+if not os.path.exists(workingDir):
     print __doc__
     sys.exit()
 
-# Run pyFontaine on all the TTF fonts
-fonts = {}
-for filename in glob.glob("*.*tf"):
-    fontaine = Font(filename)
-    fonts[filename] = fontaine
-
-# Make a plain dictionary 
-family = {}
-for fontfilename, fontaine in fonts.iteritems():
-    # Use the font file name as a key to a dictionary of char sets
-    family[fontfilename] = {}
-    #print fontfilename
-    for charset, coverage, percentcomplete, missingchars in fontaine.get_orthographies():
-        # Use each char set name as a key to a dictionary of this font's coverage details
-        charsetname = charset.common_name
-        family[fontfilename][charsetname] = {}
-        family[fontfilename][charsetname]['coverage'] = coverage # unsupport, fragmentary, partial, full
-        family[fontfilename][charsetname]['percentcomplete'] = percentcomplete # int
-        family[fontfilename][charsetname]['missingchars'] = missingchars # list of ord numbers
-        # Use the char set name as a key to a list of the family's average coverage
-        if not family.has_key(charsetname):
-            family[charsetname] = []
-        # Append the char set percentage of each font file to the list
-        family[charsetname].append(percentcomplete) # [10, 32, 40, 40] etc
-        # And finally, if the list now has all the font files, make it the mean average percentage
-        if len(family[charsetname]) == len(fonts.items()):
-            family[charsetname] = sum(family[charsetname]) / len(fonts.items())
-        #print charsetname + ":", percentcomplete, "  "
-    #print '\n' 
+# Make a plain dictionary: font file name to char set name to coverage
+# details, and char set name to the family average percentage
+family = family_coverage(glob.glob(os.path.join(workingDir, "*.*tf")))
 
 
 # # pprint the full dict, could be yaml/json/etc
@@ -83,6 +56,9 @@ for fontfilename, fontaine in fonts.iteritems():
 # Print just the bits we want on the dashboard
 print "Family Averages:"
 charsets = [u'GWF latin', u'Adobe Latin 3', u'Basic Cyrillic', u'GWF vietnamese', ]
+# without pyFontaine only checker.tools subsets are known
+charsets = [x for x in charsets if x in family] or \
+    sorted(k for k in family if not k.endswith('tf'))
 for charset in charsets:
     print charset + ":", str(family[charset])
 
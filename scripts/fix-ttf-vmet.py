@@ -17,8 +17,12 @@
 # See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
 
 import os
+import sys
 from fontTools import ttLib
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from checker.glyphmetrics import glyph_metrics
+
 
 def set_metrics(filename, ascents, descents, linegaps):
     font = ttLib.TTFont(filename)
@@ -35,14 +39,9 @@ def set_metrics(filename, ascents, descents, linegaps):
 
 def fix_metrics(filename):
     font = ttLib.TTFont(filename)
-    ymin = 0
-    ymax = 0
-    for g in font['glyf'].glyphs:
-        char = font['glyf'][g]
-        if hasattr(char, 'yMin') and ymin > char.yMin:
-            ymin = char.yMin
-        if hasattr(char, 'yMax') and ymax < char.yMax:
-            ymax = char.yMax
+    metrics = glyph_metrics(font)
+    ymin = min(0, metrics.min('yMin'))
+    ymax = max(0, metrics.max('yMax'))
 
     font['hhea'].ascent = ymax
     font['OS/2'].sTypoAscender = ymax
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# coding: utf-8
+# Copyright 2013 The Font Bakery Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# See AUTHORS.txt for the list of Authors and LICENSE.txt for the License.
+"""
+Generate synthetic font families for scaling tests of checker, fixers
+and scripts.
+
+Examples:
+
+    # one family, 4 styles, 5000 glyphs with 1000 of them in cmap
+    gencorpus.py /tmp/corpus --glyphs 5000 --cmap 1000 --styles 4
+
+    # families with 1, 10, 100, ... 65535 glyphs, TTF only
+    gencorpus.py /tmp/scaling --scale 1,10,100,1000,10000,65535 --formats ttf
+
+"""
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from checker.corpus import (CHARSETS, FORMATS, LICENSES, MAX_GLYPHS,
+                            OPTIONAL_TABLES, STYLES, charset, make_corpus,
+                            make_family)
+
+
+def comma_list(value):
+    return [x for x in value.split(',') if x]
+
+
+def generate(args):
+    unicodes = charset(args.charset)
+    if args.cmap is not None:
+        unicodes = unicodes[:args.cmap]
+    # 'cvt' is accepted for 'cvt ' table tag
+    tables = [x.ljust(4) if x == 'cvt' else x for x in args.tables]
+    options = dict(styles=args.styles, names=args.names, tables=tables,
+                   formats=args.formats, license=args.license or None,
+                   metadata=not args.no_metadata)
+    if args.scale:
+        families = {}
+        for count in args.scale:
+            family = '%sG%s' % (args.family, count)
+            families[family] = make_family(os.path.join(args.folder, family),
+                                           family, unicodes, glyphs=count,
+                                           **options)
+        return families
+    path = os.path.join(args.folder, args.family)
+    return {args.family: make_family(path, args.family, unicodes,
+                                     glyphs=args.glyphs, **options)}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folder', help="Output folder, family is written to its subfolder")
+    parser.add_argument('--benchmark', action='store_true',
+        help="Make fixed corpus used by checker benchmark and ignore other options")
+    parser.add_argument('--family', default='Synthetic', help="Family name")
+    parser.add_argument('--charset', default='latin', choices=sorted(CHARSETS),
+        help="Code points to map glyphs to")
+    parser.add_argument('--glyphs', type=int,
+        help="Number of glyphs up to %s, default is one per code point" % MAX_GLYPHS)
+    parser.add_argument('--cmap', type=int,
+        help="Number of mapped code points, rest of glyphs are unencoded")
+    parser.add_argument('--scale', type=lambda x: [int(i) for i in comma_list(x)],
+        help="Comma separated glyph counts, a family <family>G<count> is made for each")
+    parser.add_argument('--styles', type=int, default=1,
+        help="Number of styles, up to %s: %s..." % (len(STYLES), ', '.join(STYLES[:4])))
+    parser.add_argument('--names', type=int, default=0,
+        help="Number of extra name table records")
+    parser.add_argument('--tables', type=comma_list, default=['gasp'],
+        help="Comma separated optional tables: %s" % ', '.join(
+            sorted(x.strip() for x in OPTIONAL_TABLES)))
+    parser.add_argument('--formats', type=comma_list, default=list(FORMATS),
+        help="Comma separated output formats: %s" % ', '.join(FORMATS))
+    parser.add_argument('--license', default='OFL', choices=sorted(LICENSES) + [''],
+        help="License file to write, empty for none")
+    parser.add_argument('--no-metadata', action='store_true',
+        help="Do not write METADATA.json")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        families = make_corpus(args.folder)
+    else:
+        try:
+            families = generate(args)
+        except ValueError as ex:
+            parser.error(str(ex))
+    for family, path in sorted(families.items()):
+        print('%s: %s' % (family, path))
@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from checker import cache as checker_cache
+from checker.cache import ResultCache, checker_files
+from checker.parallel import CheckerPool, failed_result
+
+
+RESULT = {'success': [], 'failure': [], 'error': [], 'skipped': [],
+          'sum': 0, 'passed': True}
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.root, 'cache'))
+        self.font = os.path.join(self.root, 'Font-Regular.ttf')
+        self.write(self.font, 'glyphs')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, path, data):
+        with open(path, 'w') as f:
+            f.write(data)
+
+    def test_set_then_get(self):
+        self.assertEqual(self.cache.get(self.font, 'result'), None)
+        self.cache.set(self.font, 'result', RESULT)
+        self.assertEqual(self.cache.get(self.font, 'result'), RESULT)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_key_depends_on_file_and_target(self):
+        key = self.cache.key(self.font, 'result')
+        self.assertEqual(key, self.cache.key(self.font, 'result'))
+        self.assertNotEqual(key, self.cache.key(self.font, 'upstream'))
+        self.write(self.font, 'other glyphs')
+        self.assertNotEqual(key, self.cache.key(self.font, 'result'))
+
+    def test_key_depends_on_neighbours(self):
+        # tests of font read METADATA.json and subsets next to it
+        key = self.cache.key(self.font, 'result')
+        self.write(os.path.join(self.root, 'METADATA.json'), '{}')
+        self.assertNotEqual(key, self.cache.key(self.font, 'result'))
+
+    def test_key_depends_on_checker(self):
+        key = self.cache.key(self.font, 'result')
+        saved = checker_cache._tests_hash
+        checker_cache._tests_hash = 'changed checker'
+        try:
+            self.assertNotEqual(key, self.cache.key(self.font, 'result'))
+        finally:
+            checker_cache._tests_hash = saved
+
+    def test_checker_files(self):
+        names = [os.path.relpath(x, checker_cache.CHECKER_ROOT)
+                 for x in checker_files()]
+        for name in ['base.py', 'tools.py', 'coverage.py', 'familynames.py',
+                     os.path.join('tests', 'result_test.py')]:
+            self.assertIn(name, names)
+        self.assertTrue(any(x.endswith('.json') for x in names))
+
+    def test_metadata_is_not_cached(self):
+        metadata = os.path.join(self.root, 'METADATA.json')
+        self.write(metadata, '{}')
+        self.cache.set(metadata, 'metadata', RESULT)
+        self.assertEqual(self.cache.get(metadata, 'metadata'), None)
+
+    def test_store_from_threads(self):
+        keys = [self.cache.key(self.font, 'result/%s' % i) for i in range(20)]
+        errors = []
+
+        def store():
+            try:
+                for key in keys:
+                    self.cache.store(key, RESULT)
+            except Exception as ex:
+                errors.append(ex)
+        threads = [threading.Thread(target=store) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(all(self.cache.load(x) == RESULT for x in keys))
+
+    def test_evict(self):
+        self.cache.set(self.font, 'result', RESULT)
+        self.cache.max_size = 0
+        self.cache.evict()
+        self.assertEqual(self.cache.get(self.font, 'result'), None)
+
+
+class PoolCacheTest(unittest.TestCase):
+    """ `CheckerPool.imap` stores only results worth keeping """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.root, 'cache'))
+        self.font = os.path.join(self.root, 'Font-Regular.ttf')
+        with open(self.font, 'w') as f:
+            f.write('glyphs')
+        self.checked = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def pool(self, result):
+        pool = CheckerPool(jobs=1, cache=self.cache, address=False)
+
+        def check(items):
+            for key, path, target in items:
+                self.checked.append(key)
+                yield key, result
+        pool.check = check
+        return pool
+
+    def test_results_are_reused(self):
+        items = [('font', self.font, 'result')]
+        self.assertEqual(dict(self.pool(RESULT).imap(items)), {'font': RESULT})
+        self.assertEqual(dict(self.pool(RESULT).imap(items)), {'font': RESULT})
+        self.assertEqual(self.checked, ['font'])
+
+    def test_failed_results_are_not_cached(self):
+        items = [('font', self.font, 'result')]
+        list(self.pool(failed_result('Worker exited with code -11')).imap(items))
+        list(self.pool(RESULT).imap(items))
+        self.assertEqual(self.checked, ['font', 'font'])
+
+    def test_fail_fast_results_are_apart(self):
+        items = [('font', self.font, 'result')]
+        list(self.pool(RESULT).imap(items))
+        pool = self.pool(RESULT)
+        pool.fail_fast = True
+        list(pool.imap(items))
+        self.assertEqual(self.checked, ['font', 'font'])
+
+    def test_failed_store_is_ignored(self):
+        def store(key, result):
+            raise IOError(28, 'No space left on device')
+        self.cache.store = store
+        items = [('font', self.font, 'result')]
+        self.assertEqual(dict(self.pool(RESULT).imap(items)), {'font': RESULT})
+
+    def test_metadata_results_are_not_cached(self):
+        metadata = os.path.join(self.root, 'METADATA.json')
+        with open(metadata, 'w') as f:
+            f.write('{}')
+        items = [('metadata', metadata, 'metadata')]
+        list(self.pool(RESULT).imap(items))
+        list(self.pool(RESULT).imap(items))
+        self.assertEqual(self.checked, ['metadata', 'metadata'])
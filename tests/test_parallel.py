@@ -0,0 +1,30 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from checker.parallel import CheckerPool
+
+
+class CheckerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.pool = CheckerPool(jobs=2, keep_workers=True, address=False)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.root)
+
+    def test_worker_died_while_idle(self):
+        self.pool.start()
+        for w in self.pool.workers:
+            w.process.kill()
+            w.process.wait()
+        items = [(str(i), self.root, 'upstream-bulk') for i in range(4)]
+        result = dict(self.pool.imap(items))
+        self.assertEqual(sorted(result), ['0', '1', '2', '3'])
+        # files went to new workers, not reported as crashes
+        for value in result.values():
+            for error in value['error']:
+                self.assertNotIn('Worker exited', error['err_msg'])
@@ -0,0 +1,113 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from bakery import runner
+from bakery.runner import run_command
+
+
+class ListLog(object):
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, data, prefix=''):
+        self.lines.append(prefix + data)
+
+
+class RunCommandTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.log = ListLog()
+        self.pidfile = os.path.join(self.root, 'pid')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_command(self, command, **kwargs):
+        # stderr is copied to worker console too
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            return run_command(command, self.root, self.log, **kwargs)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    def assertChildKilled(self):
+        with open(self.pidfile) as f:
+            pid = int(f.read())
+        for i in range(50):
+            try:
+                os.kill(pid, 0)
+            except OSError:
+                return
+            time.sleep(0.1)
+        self.fail('Child %s of command is still running' % pid)
+
+    def test_output_and_exit_code(self):
+        result = self.run_command("printf 'a\\nb'; printf 'x' >&2; exit 3")
+        self.assertEqual(result.status, 'exited')
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual((result.stdout_size, result.stderr_size), (3, 1))
+        # pipes are read in order their data comes
+        self.assertEqual(sorted(self.log.lines), ['Error: x\n', 'a\n', 'b\n'])
+
+    def test_stderr_flood(self):
+        # tool writing a lot to stderr must not block on full pipe
+        result = self.run_command('seq 1 200000 >&2; echo done', timeout=30)
+        self.assertEqual(result.status, 'exited')
+        self.assertEqual(self.log.lines[-1], 'done\n')
+
+    def test_timeout_kills_children(self):
+        started = time.time()
+        result = self.run_command('sleep 30 & echo $! > pid; wait', timeout=0.5)
+        self.assertEqual(result.status, 'timeout')
+        self.assertLess(time.time() - started, 10)
+        self.assertChildKilled()
+
+    def test_cancel_kills_children(self):
+        cancel = threading.Event()
+        timer = threading.Timer(0.5, cancel.set)
+        timer.start()
+        started = time.time()
+        try:
+            result = self.run_command('echo started; sleep 30 & echo $! > pid; wait',
+                                      cancel=cancel)
+        finally:
+            timer.cancel()
+        self.assertEqual(result.status, 'cancelled')
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual(self.log.lines, ['started\n'])
+        self.assertChildKilled()
+
+    def test_timeout_after_output_is_closed(self):
+        started = time.time()
+        result = self.run_command('exec >&- 2>&-; sleep 30', timeout=0.5)
+        self.assertEqual(result.status, 'timeout')
+        self.assertLess(time.time() - started, 10)
+
+    def test_cancel_after_output_is_closed(self):
+        cancel = threading.Event()
+        timer = threading.Timer(0.5, cancel.set)
+        timer.start()
+        started = time.time()
+        try:
+            result = self.run_command('exec >&- 2>&-; sleep 30', cancel=cancel)
+        finally:
+            timer.cancel()
+        self.assertEqual(result.status, 'cancelled')
+        self.assertLess(time.time() - started, 10)
+
+    def test_without_setsid_program(self):
+        saved, runner.SETSID = runner.SETSID, None
+        try:
+            result = self.run_command('sleep 30 & echo $! > pid; wait', timeout=0.5)
+        finally:
+            runner.SETSID = saved
+        self.assertEqual(result.status, 'timeout')
+        self.assertChildKilled()
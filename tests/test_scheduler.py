@@ -0,0 +1,103 @@
+import threading
+import unittest
+
+from bakery.scheduler import TaskGraph, TaskLog
+
+
+class ListLog(object):
+
+    def __init__(self):
+        self.lines = []
+        self.lock = threading.Lock()
+
+    def write(self, data, prefix=''):
+        with self.lock:
+            self.lines.append(prefix + data)
+
+
+class TaskGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = TaskGraph()
+        self.log = ListLog()
+        self.order = []
+        self.lock = threading.Lock()
+
+    def task(self, name):
+        def task(log):
+            with self.lock:
+                self.order.append(name)
+        return task
+
+    def fail(self, log):
+        raise ValueError('broken font')
+
+    def test_dependencies_run_first(self):
+        self.graph.add('ttf:A', self.task('ttf:A'))
+        self.graph.add('ttf:B', self.task('ttf:B'))
+        self.graph.add('hint:A', self.task('hint:A'), ['ttf:A'])
+        self.graph.add('metadata', self.task('metadata'), ['hint:A', 'ttf:B'])
+        self.graph.run(self.log, jobs=4)
+        self.assertEqual(sorted(self.order), ['hint:A', 'metadata', 'ttf:A', 'ttf:B'])
+        self.assertLess(self.order.index('ttf:A'), self.order.index('hint:A'))
+        self.assertEqual(self.order[-1], 'metadata')
+
+    def test_independent_tasks_run_at_once(self):
+        # each task waits for the other, so they finish only when both
+        # run in the same time
+        events = [threading.Event(), threading.Event()]
+
+        def meet(me, other):
+            def task(log):
+                events[me].set()
+                if not events[other].wait(5):
+                    raise RuntimeError('Tasks did not run at once')
+            return task
+        self.graph.add('A', meet(0, 1))
+        self.graph.add('B', meet(1, 0))
+        self.graph.run(self.log, jobs=2)
+
+    def test_failure_is_raised_and_stops_dependents(self):
+        self.graph.add('ttf:A', self.fail)
+        self.graph.add('hint:A', self.task('hint:A'), ['ttf:A'])
+        self.assertRaises(ValueError, self.graph.run, self.log, jobs=2)
+        self.assertEqual(self.order, [])
+        errors = [x for x in self.log.lines if x.startswith('Error: [ttf:A]')]
+        self.assertTrue(any('broken font' in x for x in errors))
+
+    def test_failure_cancels_running_tasks(self):
+        started = threading.Event()
+        cancelled = []
+
+        def slow(log):
+            started.set()
+            cancelled.append(log.cancel.wait(5))
+
+        def fail(log):
+            started.wait(5)
+            raise ValueError('broken font')
+        self.graph.add('slow', slow)
+        self.graph.add('fail', fail)
+        self.graph.add('after', self.task('after'), ['slow'])
+        self.assertRaises(ValueError, self.graph.run, self.log, jobs=2)
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(self.order, [])
+
+    def test_bad_dependencies(self):
+        self.graph.add('A', self.task('A'))
+        self.assertRaises(ValueError, self.graph.add, 'A', self.task('A'))
+        self.assertRaises(ValueError, self.graph.add, 'B', self.task('B'), ['C'])
+
+
+class TaskLogTest(unittest.TestCase):
+
+    def test_whole_lines_with_task_name(self):
+        log = ListLog()
+        task_log = TaskLog(log, 'ttx:A')
+        task_log.write('Dumping ')
+        task_log.write('"head" table\nDone', prefix='')
+        task_log.write('bad glyph\n', prefix='Error: ')
+        task_log.flush()
+        self.assertEqual(log.lines, ['[ttx:A] Dumping "head" table\n',
+                                     '[ttx:A] Done\n',
+                                     'Error: [ttx:A] bad glyph\n'])
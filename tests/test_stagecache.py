@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from bakery.stagecache import StageCache
+
+
+class StageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = StageCache(os.path.join(self.root, 'cache'))
+        self.source = os.path.join(self.root, 'Font.ufo')
+        self.output = os.path.join(self.root, 'Font.ttf')
+        self.write(self.source, 'outlines')
+        self.calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, path, data):
+        with open(path, 'w') as f:
+            f.write(data)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def stage(self, log):
+        self.calls += 1
+        with open(self.source) as f:
+            self.write(self.output, 'compiled %s' % f.read())
+
+    def run_stage(self, params=()):
+        self.cache.run('compile', self.stage, NullLog(), inputs=[self.source],
+                       outputs=[self.output], params=params)
+
+    def files(self, folder):
+        return [os.path.join(root, x)
+                for root, dirs, files in os.walk(os.path.join(self.cache.root, folder))
+                for x in files]
+
+    def test_miss_then_hit(self):
+        self.run_stage()
+        os.remove(self.output)
+        self.run_stage()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.read(self.output), 'compiled outlines')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_changed_input_is_miss(self):
+        self.run_stage()
+        self.write(self.source, 'new outlines')
+        self.run_stage()
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.read(self.output), 'compiled new outlines')
+
+    def test_changed_params_is_miss(self):
+        self.run_stage(params=['-l 7'])
+        self.run_stage(params=['-l 8'])
+        self.assertEqual(self.calls, 2)
+
+    def test_missing_object_is_miss(self):
+        self.run_stage()
+        for path in self.files('objects'):
+            os.remove(path)
+        self.run_stage()
+        self.assertEqual(self.calls, 2)
+
+    def test_evict_removes_stages_with_objects(self):
+        self.run_stage()
+        self.assertEqual(len(self.files('stages')), 1)
+        self.cache.max_size = 0
+        self.cache.evict()
+        self.assertEqual(self.files('objects'), [])
+        self.assertEqual(self.files('stages'), [])
+
+    def test_evict_keeps_cache_under_limit(self):
+        self.run_stage()
+        self.cache.evict()
+        self.assertEqual(len(self.files('objects')), 1)
+        self.assertEqual(len(self.files('stages')), 1)
+
+
+class NullLog(object):
+
+    def write(self, data, prefix=''):
+        pass
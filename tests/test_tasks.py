@@ -0,0 +1,230 @@
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+from fontTools import ttLib
+
+from bakery import tasks
+from checker.corpus import charset, make_family
+
+
+class FakeProject(object):
+
+    def __init__(self, login, family):
+        self.login = login
+        self.id = 1
+        self.family = family
+        self.config = {'local': {'setup': True},
+                       'state': {'subset': ['menu', 'latin']}}
+
+    def __getitem__(self, name):
+        # tasks format paths with project as mapping
+        return getattr(self, name)
+
+
+class FakeBuild(object):
+    revision = 'abc'
+    id = 1
+
+
+class ParallelBuildsTest(unittest.TestCase):
+    """ Two builds baked at once in threads of one process must not see
+    each other's files """
+
+    families = {'alice': 'Alpha', 'bob': 'Beta'}
+    styles = ('Regular', 'Bold', 'Italic', 'BoldItalic')
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.patched = {}
+        self.patch('DATA_ROOT', self.root)
+        # external tools are replaced with in process equivalents, the
+        # rest of the graph runs as in a real bake
+        self.patch('ufo2ttf_font', self.ufo2ttf_font)
+        self.patch('ttx_font', self.ttx_font)
+        self.patch('generate_metadata_process', self.listing('metadata'))
+        self.patch('fontaine_process', self.listing('fontaine'))
+        self.patch('result_tests', self.listing('result_tests'))
+        self.patch('result_fixes', lambda project, build: None)
+        self.listings = {}
+
+        self.fonts = os.path.join(self.root, 'fonts')
+        for login, family in self.families.items():
+            make_family(os.path.join(self.fonts, family), family,
+                        charset('latin'), styles=self.styles,
+                        formats=('ttf',), license=None, metadata=False)
+            _out_src = self.out(login, 'sources')
+            os.makedirs(_out_src)
+            for style in self.styles:
+                os.makedirs(os.path.join(_out_src, '%s-%s.ufo' % (family, style)))
+
+    def tearDown(self):
+        for name, value in self.patched.items():
+            setattr(tasks, name, value)
+        shutil.rmtree(self.root)
+
+    def patch(self, name, value):
+        self.patched[name] = getattr(tasks, name)
+        setattr(tasks, name, value)
+
+    def out(self, login, *parts):
+        return os.path.join(self.root, login, '1.out', '1.abc', *parts)
+
+    def ufo2ttf_font(self, _out, _out_src, name, log):
+        family = name.split('-')[0]
+        shutil.copy(os.path.join(self.fonts, family, '%s.ttf' % name), _out)
+
+    def ttx_font(self, _out, _out_src, name, log):
+        font = ttLib.TTFont(os.path.join(_out, '%s.ttf' % name))
+        font.saveXML(os.path.join(_out_src, '%s.ttx' % name))
+
+    def listing(self, task):
+        def listing(project, build, log=None):
+            files = glob.glob(self.out(project.login, '*'))
+            self.listings[(project.login, task)] = sorted(os.path.basename(x) for x in files)
+        return listing
+
+    def bake(self, project, errors):
+        try:
+            graph = tasks.bake_graph(project, FakeBuild())
+            graph.run(NullLog(), jobs=4)
+        except Exception as ex:
+            errors.append(ex)
+
+    def test_parallel_builds(self):
+        projects = [FakeProject(login, family)
+                    for login, family in sorted(self.families.items())]
+        errors = []
+        threads = [threading.Thread(target=self.bake, args=(x, errors))
+                   for x in projects]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        for project in projects:
+            expected = []
+            for style in self.styles:
+                name = '%s-%s' % (project.family, style)
+                expected += ['%s.ttf' % name,
+                             '%s.menu' % name, '%s.menu-opentype' % name,
+                             '%s.latin' % name, '%s.latin-opentype' % name]
+            files = sorted(os.path.basename(x)
+                           for x in glob.glob(self.out(project.login, '*.*')))
+            self.assertEqual(files, sorted(expected))
+            ttx = glob.glob(self.out(project.login, 'sources', '*.ttx'))
+            self.assertEqual(len(ttx), len(self.styles))
+            for task in ('metadata', 'fontaine', 'result_tests'):
+                self.assertEqual(self.listings[(project.login, task)],
+                                 sorted(expected + ['sources']))
+
+            # menu subset has only characters of its own family name
+            menu = ttLib.TTFont(self.out(project.login, '%s-Regular.menu' % project.family))
+            self.assertEqual(set(menu['cmap'].getcmap(3, 1).cmap),
+                             set(map(ord, project.family + ' ')))
+
+
+class UpstreamRevisionTestsTest(unittest.TestCase):
+    """ Upstream tests of several revisions run at once must each see
+    files of their own revision and leave project repository alone """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.patched = {}
+        self.patch('DATA_ROOT', self.root)
+        self.patch('run_sets', self.run_sets)
+        self.patch('checker_cache', lambda: None)
+        self.project = FakeProject('alice', 'Alpha')
+        self._in = os.path.join(self.root, 'alice', '1.in')
+        os.makedirs(os.path.join(self._in, 'Alpha-Regular.ufo'))
+        self.git('init', '-q')
+        self.revisions = {}
+        for name in ('first', 'second'):
+            self.write('Alpha-Regular.ufo/fontinfo.plist', name)
+            self.write('METADATA.json', name)
+            self.write('Old.ttx' if name == 'first' else 'New.ttx', name)
+            if name == 'second':
+                self.git('rm', '-q', 'Old.ttx')
+            self.git('add', '.')
+            self.git('commit', '-q', '-m', name)
+            self.revisions[name] = self.git('rev-parse', 'HEAD').strip()
+
+    def tearDown(self):
+        for name, value in self.patched.items():
+            setattr(tasks, name, value)
+        shutil.rmtree(self.root)
+
+    def patch(self, name, value):
+        self.patched[name] = getattr(tasks, name)
+        setattr(tasks, name, value)
+
+    def git(self, *args):
+        env = dict(os.environ, GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@example.com',
+                   GIT_COMMITTER_NAME='test', GIT_COMMITTER_EMAIL='test@example.com')
+        return subprocess.check_output(('git',) + args, cwd=self._in, env=env)
+
+    def write(self, name, data):
+        with open(os.path.join(self._in, name), 'w') as f:
+            f.write(data)
+
+    def run_sets(self, checks, cache=None):
+        """ Result of every test set is content of file it tests """
+        result = {}
+        for key, path, target in checks:
+            if target == 'upstream':
+                path = os.path.join(path, 'fontinfo.plist')
+            if target == 'upstream-bulk':
+                result[key] = sorted(os.listdir(path))
+            else:
+                with open(path) as f:
+                    result[key] = f.read()
+            # let other revision run in the meantime
+            time.sleep(0.05)
+        return result
+
+    def expected(self, name):
+        ttx = 'Old.ttx' if name == 'first' else 'New.ttx'
+        return {'Alpha-Regular.ufo': name, 'METADATA.json': name, ttx: name,
+                'Properties tests': sorted(['Alpha-Regular.ufo', 'METADATA.json', ttx])}
+
+    def test_parallel_revisions(self):
+        results = {}
+        errors = []
+
+        def test(name):
+            try:
+                results[name] = tasks.upstream_revision_tests(self.project, self.revisions[name])
+            except Exception as ex:
+                errors.append(ex)
+        threads = [threading.Thread(target=test, args=(x,)) for x in self.revisions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        for name in self.revisions:
+            self.assertEqual(results[name], self.expected(name))
+
+        # repository is still on its branch, without changes
+        self.assertEqual(self.git('rev-parse', 'HEAD').strip(), self.revisions['second'])
+        self.assertEqual(self.git('status', '--porcelain'), '')
+        utests = os.listdir(os.path.join(self.root, 'alice', '1.out', 'utests'))
+        self.assertEqual(sorted(utests), sorted('%s.yaml' % x for x in self.revisions.values()))
+
+    def test_changes_since_tested_ancestor(self):
+        tasks.upstream_revision_tests(self.project, self.revisions['first'])
+        result = tasks.upstream_revision_tests(self.project, self.revisions['second'])
+        # result of removed Old.ttx is not carried forward
+        self.assertEqual(result, self.expected('second'))
+
+
+class NullLog(object):
+
+    def write(self, data, prefix=''):
+        pass